@@ -0,0 +1,258 @@
+"""
+Batch conversions: several statements uploaded together, as separate files
+or inside ZIP archives. Each statement becomes an ordinary job converted by
+process_bank_statement; the batch record only lists its jobs. This module
+unpacks ZIP uploads, aggregates the jobs' status and builds the combined
+downloads from their finished outputs.
+"""
+import hashlib
+import os
+import re
+import zipfile
+from collections import Counter
+from uploads import UploadTooLargeError
+from writers import get_writer, read_output, write_output, WRITERS
+
+# Batch limits (override via environment)
+MAX_BATCH_FILES = int(os.environ.get("MAX_BATCH_FILES", "50"))
+MAX_BATCH_BYTES = int(os.environ.get("MAX_BATCH_MB", "500")) * 1024 * 1024
+
+# zip: every output as its own file; sheets: one workbook, a sheet per statement;
+# ledger: all statements' rows in one table, with the source file in the first column;
+# merged: like ledger, for overlapping statements of one account, duplicates removed
+BATCH_MODES = ("zip", "sheets", "ledger", "merged")
+
+SUPPORTED_EXTENSIONS = (".pdf", ".rpt", ".jpg", ".jpeg", ".png")
+
+ZIP_MEDIA_TYPE = "application/zip"
+SOURCE_COLUMN = "Source File"
+
+# Excel sheet titles: at most 31 characters, none of []:*?/\
+SHEET_TITLE_INVALID = re.compile(r"[\[\]:*?/\\]")
+SHEET_TITLE_MAX = 31
+
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+class BatchTooLargeError(Exception):
+    """The batch's files and unpacked archive members add up to more than MAX_BATCH_BYTES."""
+
+
+def zip_members(zip_path):
+    """(filename, member name) for each statement in the archive, in archive order."""
+    with zipfile.ZipFile(zip_path) as zf:
+        members = []
+        for info in zf.infolist():
+            # Only the base name is used, so entries can't write outside the upload dir
+            filename = os.path.basename(info.filename)
+            if info.is_dir() or not filename or filename.startswith(".") or "__MACOSX" in info.filename:
+                continue
+            if os.path.splitext(filename)[1].lower() in SUPPORTED_EXTENSIONS:
+                members.append((filename, info.filename))
+        return members
+
+
+def extract_member(zip_path, member, dest_path, max_bytes, batch_bytes_left=None):
+    """
+    Copies one archive member to dest_path, hashing as it goes. Returns
+    (size_bytes, sha256_hex). The size is counted from the data itself, not
+    the archive's declared size, so a crafted archive can't get past max_bytes
+    (UploadTooLargeError) or the batch_bytes_left the batch has room for
+    (BatchTooLargeError).
+    """
+    digest = hashlib.sha256()
+    size = 0
+    with zipfile.ZipFile(zip_path) as zf, zf.open(member) as src, open(dest_path, "wb") as dest:
+        try:
+            while True:
+                chunk = src.read(COPY_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if batch_bytes_left is not None and size > batch_bytes_left:
+                    raise BatchTooLargeError(f"The unpacked batch exceeds the {MAX_BATCH_BYTES // (1024 * 1024)} MB limit")
+                if size > max_bytes:
+                    raise UploadTooLargeError(f"{os.path.basename(member)} exceeds the {max_bytes // (1024 * 1024)} MB upload limit")
+                digest.update(chunk)
+                dest.write(chunk)
+        except BaseException:
+            dest.close()
+            os.remove(dest_path)
+            raise
+    return size, digest.hexdigest()
+
+
+def batch_status(batch_id, batch, jobs):
+    """Aggregate status of a batch with one sub-status per file."""
+    files = []
+    for job_id, filename in zip(batch["job_ids"], batch["filenames"]):
+        job = jobs.get(job_id) or {"status": "failed", "message": "Job expired"}
+        files.append({
+            "job_id": job_id,
+            "filename": filename,
+            "status": job.get("status"),
+            "progress": job.get("progress", 0),
+            "message": job.get("message"),
+            "row_count": job.get("row_count"),
+            "detected_type": job.get("detected_type"),
+        })
+    for rejected in batch.get("rejected", []):
+        files.append({"job_id": None, "filename": rejected["filename"], "status": "failed",
+                      "progress": 0, "message": rejected["message"], "row_count": None})
+
+    counts = Counter(f["status"] for f in files)
+    if counts["processing"]:
+        status = "processing"
+    elif counts["completed"] == len(files):
+        status = "completed"
+    elif counts["completed"]:
+        status = "partial"
+    else:
+        status = "failed"
+
+    return {
+        "batch_id": batch_id,
+        "status": status,
+        "progress": round(sum(f["progress"] or 0 for f in files) / len(files)) if files else 100,
+        "total": len(files),
+        "completed": counts["completed"],
+        "failed": counts["failed"],
+        "output_format": batch.get("output_format"),
+        "files": files,
+    }
+
+
+def batch_output_name(mode, output_format):
+    """(extension, media type) of a batch download."""
+    if mode == "zip":
+        return ".zip", ZIP_MEDIA_TYPE
+    writer = WRITERS["xlsx"] if mode == "sheets" else get_writer(output_format)
+    return writer.extension, writer.media_type
+
+
+def _unique(name, used):
+    base, ext = os.path.splitext(name)
+    candidate, n = name, 1
+    while candidate.lower() in used:
+        n += 1
+        candidate = f"{base} ({n}){ext}"
+    used.add(candidate.lower())
+    return candidate
+
+
+def _sheet_title(filename, used):
+    title = SHEET_TITLE_INVALID.sub("_", os.path.splitext(filename)[0]).strip("'") or "Sheet"
+    title = title[:SHEET_TITLE_MAX]
+    candidate, n = title, 1
+    while candidate.lower() in used:
+        n += 1
+        suffix = f" ({n})"
+        candidate = title[:SHEET_TITLE_MAX - len(suffix)] + suffix
+    used.add(candidate.lower())
+    return candidate
+
+
+def _member_rows(member):
+    return read_output(member["output_file"], member["output_format"], member.get("output_header", False),
+                       member.get("output_columns"), member.get("profile"))
+
+
+def _ledger_columns(members):
+    # Union of the statements' columns in first-seen order, matched ignoring
+    # case ("Date" / "DATE"); headerless outputs (generic PDF, OCR) are keyed
+    # by position like the JSONL/Parquet writers do
+    columns = {}
+    for member in members:
+        for name in member["columns"]:
+            columns.setdefault(name.casefold(), name)
+    return list(columns.values())
+
+
+def _ledger_rows(members, columns):
+    position = {name.casefold(): i for i, name in enumerate(columns)}
+    for member in members:
+        index = [position[name.casefold()] for name in member["columns"]]
+        for row in _member_rows(member):
+            out = [None] * len(columns)
+            for i, value in zip(index, row):
+                out[i] = value
+            yield [member["filename"]] + out
+
+
+def _positional_columns(member):
+    if member.get("output_columns"):
+        return list(member["output_columns"])
+    first = next(iter(_member_rows(member)), ())
+    return [str(i) for i in range(len(first))]
+
+
+def build_batch_output(members, dest_path, mode, output_format="xlsx"):
+    """
+    Combines the finished outputs of a batch into dest_path. members are the
+    completed jobs' {"filename", "output_file", "output_format",
+    "output_columns", "output_header"} in upload order. Returns the row count
+    (0 for zip).
+    """
+    if mode == "zip":
+        used = set()
+        with zipfile.ZipFile(dest_path, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+            for member in members:
+                ext = os.path.splitext(member["output_file"])[1]
+                arcname = _unique(f"{os.path.splitext(member['filename'])[0]}_converted{ext}", used)
+                zf.write(member["output_file"], arcname)
+        return 0
+
+    if mode == "sheets":
+        used = set()
+        sheets = [
+            (_sheet_title(m["filename"], used), _member_rows(m), m.get("output_columns"), bool(m.get("output_columns")))
+            for m in members
+        ]
+        return sum(WRITERS["xlsx"].write_sheets(sheets, dest_path))
+
+    if mode == "merged":
+        return build_merged_output(members, dest_path)["merged_rows"]
+
+    if mode == "ledger":
+        members = [dict(m, columns=_positional_columns(m)) for m in members]
+        columns = _ledger_columns(members)
+        return write_output(_ledger_rows(members, columns), dest_path, columns=[SOURCE_COLUMN] + columns)
+
+    raise ValueError(f"Unsupported batch mode '{mode}'. Use one of: {', '.join(BATCH_MODES)}")
+
+
+def build_merged_output(members, dest_path):
+    """
+    Writes the merged, de-duplicated ledger of the batch's statements to
+    dest_path and returns the merge report. Statements from layouts without
+    column roles (generic PDF, OCR) can't be matched up and are left out. An
+    xlsx output gets the seam checks as a second sheet.
+    """
+    # pandas and the profiles load in the pool worker that builds the download
+    import pandas as pd
+    from merge import merge_statements, statement_frame, MERGED_COLUMNS
+    from profiles import PROFILES
+
+    statements = []
+    unmerged = []
+    for member in members:
+        profile = PROFILES.get(member.get("profile") or "")
+        if profile is None or not profile.roles:
+            unmerged.append(member["filename"])
+            continue
+        columns = member.get("output_columns") or profile.columns
+        df = pd.DataFrame(list(_member_rows(member)), columns=columns)
+        statements.append((member["filename"], statement_frame(df, profile.roles)))
+
+    merged, report = merge_statements(statements)
+    report["unmerged"] = unmerged
+    rows = merged.itertuples(index=False, name=None)
+
+    if dest_path.endswith(WRITERS["xlsx"].extension):
+        seam_columns = ["Previous", "Next", "Overlap Rows", "Previous Balance", "First Balance", "Continuous"]
+        seam_rows = ([s["previous"], s["next"], s["overlap_rows"], s["previous_balance"], s["first_balance"],
+                      "yes" if s["continuous"] else "NO"] for s in report["seams"])
+        WRITERS["xlsx"].write_sheets([("Merged", rows, MERGED_COLUMNS, True), ("Seams", seam_rows, seam_columns, True)], dest_path)
+    else:
+        write_output(rows, dest_path, columns=MERGED_COLUMNS)
+    return report
@@ -0,0 +1,90 @@
+"""
+Benchmark: garbage-line filtering cost as the phrase list grows.
+
+Pads the rpt_pdf profile's phrases with synthetic ones (up to hundreds) and
+times, per line, the previous `any(phrase in line)` loop against the
+trie-regex PhraseMatcher over a synthetic mix of transaction and garbage
+lines, checking both drop the same lines. Given PDFs, also prints which
+phrases fired how often on them, to spot dead rules.
+
+    python bench_garbage_filter.py [pdf ...]
+"""
+import random
+import sys
+import time
+from phrases import PhraseMatcher
+from rpt_pdf_processor import PROFILE, iter_pdf_rpt_transactions
+
+PHRASE_COUNTS = [23, 100, 300, 1000]
+LINE_COUNT = 20000
+WORDS = ["Branch", "Account", "Statement", "Summary", "Total", "Opening", "Closing", "Interest",
+         "Nominee", "Customer", "Address", "Period", "Report", "Printed", "Ledger", "Cheque"]
+
+
+def synthetic_phrases(count, rng):
+    phrases = list(PROFILE.garbage_phrases)
+    while len(phrases) < count:
+        phrase = " ".join(rng.sample(WORDS, rng.randint(2, 3))) + f" {rng.randint(0, 99999):05d}"
+        if phrase not in phrases:
+            phrases.append(phrase)
+    return phrases
+
+
+def synthetic_lines(phrases, count, rng):
+    lines = []
+    for _ in range(count):
+        if rng.random() < 0.1:
+            lines.append(f"{rng.choice(WORDS)} {rng.choice(phrases)} {rng.randint(1, 9999)}")
+        else:
+            lines.append(f"{rng.randint(1, 28):02d}-04-2025 IMPS/{rng.randint(10 ** 11, 10 ** 12 - 1)}/PAYEE "
+                         f"{rng.uniform(1, 50000):,.2f} {rng.uniform(1, 900000):,.2f}Cr")
+    return lines
+
+
+def per_line_cost(fn, lines):
+    start = time.perf_counter()
+    dropped = [fn(line) for line in lines]
+    return (time.perf_counter() - start) / len(lines) * 1e6, dropped
+
+
+def benchmark():
+    rng = random.Random(7)
+    print(f"{'phrases':>8} {'loop us/line':>14} {'trie us/line':>14}")
+    trie_costs = []
+    for count in PHRASE_COUNTS:
+        phrases = synthetic_phrases(count, rng)
+        lines = synthetic_lines(phrases, LINE_COUNT, rng)
+        matcher = PhraseMatcher(phrases)
+        loop_cost, expected = per_line_cost(lambda line: any(p in line for p in phrases), lines)
+        trie_cost, got = per_line_cost(lambda line: matcher.search(line) is not None, lines)
+        if got != expected:
+            print(f"FAILURE: matcher and loop disagree with {count} phrases")
+            return False
+        trie_costs.append(trie_cost)
+        print(f"{count:>8} {loop_cost:>14.2f} {trie_cost:>14.2f}")
+
+    growth = trie_costs[-1] / trie_costs[0]
+    print(f"Trie cost growth {PHRASE_COUNTS[0]} -> {PHRASE_COUNTS[-1]} phrases: {growth:.1f}x")
+    if growth > 3:
+        print("FAILURE: per-line cost grows with the phrase count")
+        return False
+    return True
+
+
+def report(pdf_paths):
+    PROFILE.garbage.reset()
+    for path in pdf_paths:
+        for _ in iter_pdf_rpt_transactions(path):
+            pass
+    print(f"Garbage phrase hits over {len(pdf_paths)} file(s):")
+    for phrase, hits in PROFILE.garbage.report():
+        print(f"{hits:>8}  {phrase}{'   (never fired)' if not hits else ''}")
+
+
+if __name__ == "__main__":
+    ok = benchmark()
+    if sys.argv[1:]:
+        report(sys.argv[1:])
+    if not ok:
+        sys.exit(1)
+    print("SUCCESS: garbage filter per-line cost stays flat as phrases grow")
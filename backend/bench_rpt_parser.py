@@ -0,0 +1,98 @@
+"""
+Benchmark: per-row vs vectorised amount/text normalisation in rpt_parser.
+
+Generates a synthetic RPT report (1M lines by default), assembles the raw
+transactions once, then times normalising them the old way (parse_amount /
+re.sub per field) against normalize_transactions(), and checks both agree.
+
+    python bench_rpt_parser.py [line_count]
+"""
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+import pandas as pd
+from rpt_parser import COLUMNS, iter_raw_transactions, normalize_transactions, parse_amount, iter_rpt_rows
+from writers import iter_chunks
+
+HEADER = "      DATE     PARTICULARS       CHQ.NO./REF.NO.   WITHDRAWALS   DEPOSITS        BALANCE\n"
+
+
+def amount_text(value, rng):
+    text = f"{value:,.2f}" if rng.random() < 0.5 else f"{value:.2f}"
+    return text + rng.choice(["", "Cr", "Dr"])
+
+
+def make_synthetic_rpt(path, line_count, seed=7):
+    rng = random.Random(seed)
+    balance = 500000.0
+    written = 0
+    with open(path, "w") as f:
+        f.write(HEADER)
+        written += 1
+        while written < line_count:
+            amount = round(rng.uniform(1, 50000), 2)
+            balance += amount if rng.random() < 0.5 else -amount
+            ref = str(rng.randint(10 ** 11, 10 ** 12 - 1))
+            withdrawal = amount_text(amount, rng)
+            if rng.random() < 0.5:
+                f.write(f"  {rng.randint(1, 28):02d}-04-2025  TRF{' ' * 48}{amount_text(amount, rng):>15}{amount_text(balance, rng):>15}\n")
+                written += 1
+            else:
+                f.write(f"  {rng.randint(1, 28):02d}-04-2025  IMPS/{ref}/\n")
+                f.write(f"              PAYEE  NAME/SBIN001 {ref}  {withdrawal:>15}{' ' * 15}{amount_text(balance, rng):>15}\n")
+                written += 2
+
+
+def per_row_normalize(raw_transactions):
+    """The previous implementation: one regex pass per field per transaction."""
+    rows = []
+    for tx in raw_transactions:
+        rows.append({
+            'Date': tx['Date'],
+            'Particulars': re.sub(r'\s+', ' ', str(tx['Particulars'])).strip() if tx['Particulars'] else "",
+            'Chq/Ref No.': re.sub(r'\s+', ' ', str(tx['Chq/Ref No.'])).strip() if tx['Chq/Ref No.'] else "",
+            'Withdrawals': sum(parse_amount(v) for v in tx['Withdrawals']),
+            'Deposits': sum(parse_amount(v) for v in tx['Deposits']),
+            'Balance': parse_amount(tx['Balance'])
+        })
+    return pd.DataFrame(rows, columns=COLUMNS)
+
+
+def timed(label, fn):
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {elapsed:8.2f}s")
+    return result, elapsed
+
+
+def main():
+    line_count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    fd, path = tempfile.mkstemp(suffix=".rpt")
+    os.close(fd)
+    try:
+        make_synthetic_rpt(path, line_count)
+        print(f"Synthetic report: {line_count} lines, {os.path.getsize(path) / 1e6:.1f} MB")
+
+        raw, _ = timed("assemble (shared)", lambda: list(iter_raw_transactions(path)))
+        print(f"Transactions: {len(raw)}")
+
+        old, old_time = timed("normalise per-row", lambda: per_row_normalize(raw))
+        new, new_time = timed("normalise vectorised", lambda: pd.concat(
+            [normalize_transactions(chunk) for chunk in iter_chunks(raw)], ignore_index=True))
+        timed("end-to-end iter_rpt_rows", lambda: sum(1 for _ in iter_rpt_rows(path)))
+
+        print(f"Speed-up: {old_time / new_time:.1f}x")
+        pd.testing.assert_frame_equal(old, new)
+        signed = normalize_transactions(raw[:1000], signed=True)
+        assert (signed['Balance'] < 0).any(), "signed=True produced no negative Dr balances"
+        print("SUCCESS: vectorised output matches the per-row implementation")
+    finally:
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
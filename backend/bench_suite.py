@@ -0,0 +1,304 @@
+"""
+Benchmark suite: every converter on synthetic statements (synthetic.py) of
+10, 1k and 100k transactions, with machine-readable results to diff
+between releases.
+
+Each (converter, size) case runs in a fresh process, so its peak RSS is its
+own. The case first times the converter end to end:
+
+    rpt      parse_rpt_file
+    jk       convert_pdf_to_excel
+    rpt_pdf  convert_rpt_pdf_to_excel
+    generic  process_generic_pdf
+
+then runs its stages again one at a time, each materialised, to time them
+separately (extract, detect, assemble, clean, write; as the metrics.py spans).
+The staged pass holds every intermediate in memory, so peak RSS is read
+before it. Stage times add up to roughly the end-to-end time; the
+difference is the overlap lost by not streaming.
+
+    python bench_suite.py [--sizes 10,1000,100000] [--converters rpt,jk,rpt_pdf,generic]
+                          [--format xlsx] [--output results.json] [--baseline old.json]
+
+--baseline prints each case's time and peak RSS against an earlier run's
+results file. Inputs are generated once per run and cached in --workdir
+(a temporary directory by default).
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from functools import partial
+from itertools import islice
+import synthetic
+
+CONVERTERS = ("rpt", "jk", "rpt_pdf", "generic")
+SIZES = (10, 1000, 100000)
+
+# Which synthetic layout each converter reads; generic runs on the JK layout
+INPUTS = {
+    "rpt": ("rpt", ".rpt", synthetic.make_rpt),
+    "jk": ("jk", ".pdf", synthetic.make_jk_pdf),
+    "rpt_pdf": ("rpt_pdf", ".pdf", synthetic.make_rpt_pdf),
+    "generic": ("jk", ".pdf", synthetic.make_jk_pdf),
+}
+
+RESULTS_VERSION = 1
+
+
+def peak_rss_mb(who=resource.RUSAGE_SELF):
+    # ru_maxrss is in KiB on Linux, bytes on macOS
+    peak = resource.getrusage(who).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+class Stages:
+    """Times named stages: stages.run("extract", fn, *args)."""
+
+    def __init__(self):
+        self.seconds = {}
+
+    def run(self, name, fn, *args, **kwargs):
+        start = time.perf_counter()
+        result = fn(*args, **kwargs)
+        self.seconds[name] = round(self.seconds.get(name, 0.0) + time.perf_counter() - start, 4)
+        return result
+
+
+def _balance_validator(profile):
+    from validation import BalanceValidator
+    return BalanceValidator.for_profile(profile)
+
+
+def run_rpt(input_path, output_path, output_format):
+    from rpt_parser import PROFILE, parse_rpt_file, iter_raw_transactions, normalize_transactions
+    from writers import iter_chunks
+
+    start = time.perf_counter()
+    rows = len(parse_rpt_file(input_path))
+    seconds = time.perf_counter() - start
+    rss = peak_rss_mb()
+
+    stages = Stages()
+    raw = stages.run("assemble", list, iter_raw_transactions(input_path))
+    stages.run("clean", lambda: [normalize_transactions(chunk, profile=PROFILE) for chunk in iter_chunks(raw)])
+    return rows, seconds, rss, stages.seconds, None
+
+
+def run_jk(input_path, output_path, output_format):
+    from jk_processor import PROFILE, convert_pdf_to_excel, iter_raw_rows, iter_transactions
+    from validation import write_checked
+
+    validator = _balance_validator(PROFILE)
+    start = time.perf_counter()
+    rows = convert_pdf_to_excel(input_path, output_path, validator=validator)
+    seconds = time.perf_counter() - start
+    rss = peak_rss_mb()
+    balance_check = validator.summary() if validator else None
+
+    stages = Stages()
+    raw = stages.run("extract", list, iter_raw_rows(input_path))
+    transactions = stages.run("assemble", list, iter_transactions(raw))
+    validator = _balance_validator(PROFILE)
+    if validator:
+        transactions = stages.run("clean", list, validator.check(transactions))
+    stages.run("write", write_checked, transactions, output_path, columns=PROFILE.columns, validator=validator)
+    return rows, seconds, rss, stages.seconds, balance_check
+
+
+def run_rpt_pdf(input_path, output_path, output_format):
+    from pdf_extract import iter_page_lines
+    from rpt_pdf_processor import PROFILE, convert_rpt_pdf_to_excel, page_lines, iter_page_transactions, iter_clean_rows
+    from validation import write_checked
+
+    validator = _balance_validator(PROFILE)
+    start = time.perf_counter()
+    rows = convert_rpt_pdf_to_excel(input_path, output_path, validator=validator)
+    seconds = time.perf_counter() - start
+    rss = peak_rss_mb()
+    balance_check = validator.summary() if validator else None
+
+    stages = Stages()
+    pages = stages.run("extract", list, iter_page_lines(input_path, partial(page_lines, PROFILE)))
+    transactions = stages.run("assemble", list, iter_page_transactions(pages))
+    validator = _balance_validator(PROFILE)
+    clean = stages.run("clean", list, iter_clean_rows(transactions, validator=validator))
+    stages.run("write", write_checked, clean, output_path, columns=PROFILE.columns, validator=validator)
+    return rows, seconds, rss, stages.seconds, balance_check
+
+
+def run_generic(input_path, output_path, output_format):
+    from pdf_extract import iter_page_lines
+    from processor import DETECT_PAGES, layout_page, process_generic_pdf, detect_pdf_columns, iter_generic_rows
+    from writers import write_output
+
+    job_id = "bench"
+    jobs = {job_id: {}}
+    start = time.perf_counter()
+    process_generic_pdf(input_path, job_id, jobs, os.path.dirname(output_path), output_format=output_format)
+    seconds = time.perf_counter() - start
+    rss = peak_rss_mb()
+
+    stages = Stages()
+    pages = stages.run("extract", list, iter_page_lines(input_path, layout_page))
+    detected = stages.run("detect", detect_pdf_columns, [lines.words for _, lines in islice(pages, DETECT_PAGES)])
+    rows = stages.run("assemble", list, iter_generic_rows(pages, detected["bounds"]))
+    stages.run("write", write_output, rows, output_path, header=False)
+    return jobs[job_id]["row_count"], seconds, rss, stages.seconds, None
+
+
+RUNNERS = {"rpt": run_rpt, "jk": run_jk, "rpt_pdf": run_rpt_pdf, "generic": run_generic}
+
+
+def run_case(converter, input_path, output_format, result_path):
+    """Child process: runs one case and writes its measurements to result_path as JSON."""
+    from writers import get_writer
+
+    output_dir = tempfile.mkdtemp()
+    output_path = os.path.join(output_dir, f"out{get_writer(output_format).extension}")
+    try:
+        rows, seconds, rss, stages, balance_check = RUNNERS[converter](input_path, output_path, output_format)
+    finally:
+        shutil.rmtree(output_dir)
+    with open(result_path, "w") as f:
+        json.dump({
+            "rows": rows,
+            "seconds": round(seconds, 4),
+            "rows_per_second": round(rows / seconds) if seconds else None,
+            "stages": stages,
+            "peak_rss_mb": rss,
+            "peak_child_rss_mb": peak_rss_mb(resource.RUSAGE_CHILDREN),
+            "balance_valid": balance_check["valid"] if balance_check else None,
+        }, f)
+
+
+def make_input(converter, size, workdir):
+    """Path of the synthetic input for a case, generated on first use; also returns the generation time."""
+    layout, extension, make = INPUTS[converter]
+    path = os.path.join(workdir, f"{layout}_{size}{extension}")
+    if os.path.exists(path):
+        return path, 0.0
+    start = time.perf_counter()
+    make(path, size)
+    return path, time.perf_counter() - start
+
+
+def run_suite(converters, sizes, output_format, workdir):
+    results = []
+    for size in sizes:
+        for converter in converters:
+            input_path, generated = make_input(converter, size, workdir)
+            if generated:
+                print(f"Generated {os.path.basename(input_path)} in {generated:.1f}s")
+
+            result_path = os.path.join(workdir, "case.json")
+            proc = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--case", converter, input_path, output_format, result_path],
+                cwd=os.path.dirname(os.path.abspath(__file__)), stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True,
+            )
+            if proc.returncode != 0:
+                print(f"FAILURE: {converter} x{size} exited with {proc.returncode}:\n{proc.stderr[-2000:]}")
+                results.append({"converter": converter, "transactions": size, "output_format": output_format, "error": proc.stderr[-2000:]})
+                continue
+
+            with open(result_path) as f:
+                result = json.load(f)
+            os.remove(result_path)
+            result = dict(converter=converter, transactions=size, output_format=output_format,
+                          input_bytes=os.path.getsize(input_path), **result)
+            results.append(result)
+            stages = " ".join(f"{name}={seconds:.2f}s" for name, seconds in result["stages"].items())
+            print(f"{converter:<8} {size:>7} tx {result['rows']:>7} rows {result['seconds']:>8.2f}s "
+                  f"{result['peak_rss_mb']:>7.1f} MB  {stages}")
+    return results
+
+
+def _case_key(result):
+    return result["converter"], result["transactions"], result["output_format"]
+
+
+def compare(results, baseline):
+    """Prints time and peak RSS of each case against the baseline run's."""
+    previous = {_case_key(r): r for r in baseline["results"] if "error" not in r}
+    print(f"\nAgainst {baseline.get('created', 'baseline')} (parser {baseline.get('parser_version')}):")
+    print(f"{'case':<24} {'seconds':>20} {'peak RSS MB':>20}")
+    matched = 0
+    for result in results:
+        old = previous.get(_case_key(result))
+        if old is None or "error" in result:
+            continue
+        matched += 1
+        name = f"{result['converter']} x{result['transactions']}"
+        print(f"{name:<24} {old['seconds']:>8.2f} -> {result['seconds']:<8.2f}"
+              f"{result['seconds'] / old['seconds'] if old['seconds'] else 0:>5.2f}x "
+              f"{old['peak_rss_mb']:>6.1f} -> {result['peak_rss_mb']:<6.1f}")
+    if not matched:
+        print("No cases in common (converter, size and output format must match)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark every converter on synthetic statements.")
+    parser.add_argument("--sizes", default=",".join(map(str, SIZES)), help="transaction counts, comma separated")
+    parser.add_argument("--converters", default=",".join(CONVERTERS), help="converters to run, comma separated")
+    parser.add_argument("--format", default="xlsx", help="output format of the converters that write one")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--baseline", help="results JSON of an earlier run to compare against")
+    parser.add_argument("--workdir", help="directory for the synthetic inputs (kept between runs)")
+    parser.add_argument("--case", nargs=4, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        run_case(*args.case)
+        return
+
+    from result_cache import parser_version
+    from writers import get_writer
+
+    converters = args.converters.split(",")
+    unknown = [c for c in converters if c not in RUNNERS]
+    if unknown:
+        parser.error(f"unknown converter(s) {', '.join(unknown)}; use {', '.join(CONVERTERS)}")
+    get_writer(args.format)
+    sizes = [int(size) for size in args.sizes.split(",")]
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="bench_suite_")
+    os.makedirs(workdir, exist_ok=True)
+    try:
+        results = run_suite(converters, sizes, args.format, workdir)
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir)
+
+    report = {
+        "version": RESULTS_VERSION,
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "parser_version": parser_version(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(results, json.load(f))
+
+    failed = [r for r in results if "error" in r or r.get("balance_valid") is False]
+    if failed:
+        print(f"FAILURE: {len(failed)} case(s) failed or did not balance")
+        sys.exit(1)
+    print(f"SUCCESS: {len(results)} cases benchmarked")
+
+
+if __name__ == "__main__":
+    main()
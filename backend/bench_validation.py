@@ -0,0 +1,96 @@
+"""
+Benchmark: cost of the running-balance check (validation.py) in a conversion.
+
+Converts a synthetic RPT report whose balances run correctly (1M lines by
+default) end to end, parse to output file, with and without the balance
+check, and times the check itself. Fails if it costs 1% or more of the job.
+
+    python bench_validation.py [line_count] [output_format]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from rpt_parser import iter_rpt_rows, PROFILE
+from validation import BalanceValidator, write_checked
+from writers import get_writer
+
+MAX_OVERHEAD = 0.01
+
+
+def make_balanced_rpt(path, line_count, seed=7):
+    """A report in the parser's column layout, with continuation lines, whose balances add up."""
+    rng = random.Random(seed)
+    balance = 500000.0
+    written = 0
+    with open(path, "w") as f:
+        f.write(f"{'DATE':<12}{'PARTICULARS':<34}{'CHQ.NO':<20}{'WITHDRAWALS':>20}{'DEPOSITS':>20}{'BALANCE':>20}\n")
+        written += 1
+        while written < line_count:
+            amount = round(rng.uniform(1, 50000), 2)
+            if rng.random() < 0.5:
+                balance += amount
+                withdrawal, deposit = "", f"{amount:,.2f}"
+            else:
+                balance -= amount
+                withdrawal, deposit = f"{amount:,.2f}", ""
+            date = f"{rng.randint(1, 28):02d}-04-2025"
+            ref = str(rng.randint(10 ** 11, 10 ** 12 - 1))
+            f.write(f"{date:<12}{'IMPS/' + ref:<34}{ref:<20}{withdrawal:>20}{deposit:>20}{balance:>20,.2f}\n")
+            written += 1
+            if rng.random() < 0.5:
+                f.write(f"{'':<12}{'PAYEE NAME/SBIN001':<34}\n")
+                written += 1
+
+
+class TimedValidator(BalanceValidator):
+    """Adds up the time spent in the check itself."""
+
+    elapsed = 0.0
+
+    def check_frame(self, df):
+        start = time.perf_counter()
+        super().check_frame(df)
+        self.elapsed += time.perf_counter() - start
+
+
+def convert(path, output_path, validator=None):
+    start = time.perf_counter()
+    rows = iter_rpt_rows(path, validator=validator)
+    row_count = write_checked(rows, output_path, columns=PROFILE.columns, header=False, validator=validator)
+    return time.perf_counter() - start, row_count
+
+
+def main():
+    line_count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    writer = get_writer(sys.argv[2] if len(sys.argv) > 2 else "xlsx")
+    tmp_dir = tempfile.mkdtemp()
+    path = os.path.join(tmp_dir, "synthetic.rpt")
+    output_path = os.path.join(tmp_dir, f"out{writer.extension}")
+    try:
+        make_balanced_rpt(path, line_count)
+        plain, row_count = convert(path, output_path)
+        validator = TimedValidator(PROFILE.columns, PROFILE.roles)
+        checked, _ = convert(path, output_path, validator)
+
+        summary = validator.summary()
+        share = validator.elapsed / plain
+        print(f"{row_count} rows to {writer.name}: job {plain:.2f}s, with check {checked:.2f}s")
+        print(f"Check {validator.elapsed:.3f}s = {share:.2%} of the job "
+              f"({summary['checked_rows']} rows checked, {summary['mismatched_rows']} mismatched)")
+        if summary["mismatched_rows"]:
+            print("FAILURE: balanced synthetic report reported as mismatched")
+            sys.exit(1)
+        if share >= MAX_OVERHEAD:
+            print(f"FAILURE: balance check adds {MAX_OVERHEAD:.0%} or more to the job")
+            sys.exit(1)
+        print("SUCCESS: balance check stays under 1% of job time")
+    finally:
+        for name in os.listdir(tmp_dir):
+            os.remove(os.path.join(tmp_dir, name))
+        os.rmdir(tmp_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Picks the converter for an upload from a quick look at its content: the first
+page's text layer for PDFs, the first few KB for text reports. Used when the
+conversion type is "auto".
+
+Every layout profile is a candidate (PDF engines for PDFs, text engines for
+anything else), scored on what its "fingerprint" lists: header markers, date
+lines and phrases. A new profile is detected without changes here.
+"""
+import os
+import pypdfium2 as pdfium
+from profiles import PROFILES
+
+# Bytes of a text report inspected
+SNIFF_BYTES = 8192
+
+# Below this score no specialised converter is trusted and the generic one is used
+MIN_CONFIDENCE = 0.5
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+# Engines whose layouts are read from PDFs; the others read text reports
+PDF_ENGINES = ("pdf_columns", "pdf_report")
+
+
+def first_page_text(pdf_path):
+    # pdfium's text layer is an order of magnitude faster than pdfplumber's
+    # word extraction, which is what keeps detection in the milliseconds
+    pdf = pdfium.PdfDocument(pdf_path)
+    try:
+        if len(pdf) == 0:
+            return ""
+        page = pdf[0]
+        textpage = page.get_textpage()
+        try:
+            return textpage.get_text_range()
+        finally:
+            textpage.close()
+            page.close()
+    finally:
+        pdf.close()
+
+
+def report_head(file_path):
+    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+        return f.read(SNIFF_BYTES)
+
+
+def score_profile(profile, text):
+    """Score (0-1) of how well a sample of the document's text fits profile."""
+    lines = text.splitlines()
+    markers = profile.detect_markers
+    header = bool(markers) and any(
+        sum(1 for m in markers if m in line) >= profile.detect_min_markers for line in lines)
+    dates = sum(1 for line in lines if profile.date_pattern.search(line))
+    phrases = profile.detect_phrases
+    hits = sum(1 for phrase in phrases if phrase in text)
+    # Two phrases (or the only one) are enough for the full phrase share
+    phrase_share = min(hits / min(len(phrases), 2), 1.0) if phrases else 0.0
+    return round(0.6 * header + 0.3 * (dates >= 3) + 0.1 * phrase_share, 2)
+
+
+def score_text(text, pdf=True):
+    """Score (0-1) per specialised layout (PDF or text report) for a sample of the document's text."""
+    return {name: score_profile(profile, text) for name, profile in PROFILES.items()
+            if (profile.engine in PDF_ENGINES) == pdf}
+
+
+def detect_conversion_type(file_path):
+    """
+    Returns {"conversion_type", "confidence", "reason"}: the converter to use
+    for file_path and how sure the fingerprint is about it.
+    """
+    ext = os.path.splitext(file_path)[1].lower()
+
+    if ext in IMAGE_EXTENSIONS:
+        return {"conversion_type": "generic", "confidence": 1.0, "reason": "image (OCR)"}
+
+    if ext == ".pdf":
+        text = first_page_text(file_path)
+        if not text.strip():
+            return {"conversion_type": "generic", "confidence": 1.0, "reason": "no text layer (OCR)"}
+        scores = score_text(text)
+    else:
+        scores = score_text(report_head(file_path), pdf=False)
+        for name in scores:
+            if ext in PROFILES[name].detect_extensions:
+                scores[name] = min(scores[name] + 0.2, 1.0)
+    if not scores:
+        return {"conversion_type": "generic", "confidence": 1.0, "reason": "no layout profile for this file type"}
+
+    best = max(scores, key=scores.get)
+    if scores[best] < MIN_CONFIDENCE:
+        return {"conversion_type": "generic", "confidence": round(1 - scores[best], 2), "reason": "no specialised layout matched"}
+    return {"conversion_type": best, "confidence": scores[best], "reason": f"{best} layout matched"}
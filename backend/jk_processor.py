@@ -1,117 +1,100 @@
-import pdfplumber
-import pandas as pd
-import re
+from functools import partial
+import layout
+import metrics
+from pdf_extract import iter_page_lines
+from profiles import get_profile
+from progress import no_progress
+from validation import write_checked
 
-def convert_pdf_to_excel(pdf_path, excel_path):
-    print(f"Processing {pdf_path}...")
-    
-    all_rows = []
-    
-    # Define Column Boundaries (X-coords)
-    # Date < 120
-    # 120 < Part < 460
-    # 460 < With < 580
-    # 580 < Dep < 690
-    # 690 < Bal
-    COL_BOUNDS = [120, 460, 580, 690]
-    
-    with pdfplumber.open(pdf_path) as pdf:
-        for page in pdf.pages:
-            words = page.extract_words()
-            
-            # Group words by line (vertical alignment)
-            # Sort by 'top' first
-            words.sort(key=lambda w: w['top'])
-            
-            lines = []
-            current_line = []
-            last_top = 0
-            
-            for word in words:
-                if not current_line:
-                    current_line.append(word)
-                    last_top = word['top']
-                else:
-                    # Check if on same line (tolerance 10px to handle slight misalignments)
-                    if abs(word['top'] - last_top) < 10:
-                        current_line.append(word)
-                    else:
-                        lines.append(current_line)
-                        current_line = [word]
-                        last_top = word['top']
-            if current_line:
-                lines.append(current_line)
+# "pdf_columns" engine. Columns are found by their role; any besides date and
+# the amounts are text, joined over continuation lines. The JK Bank layout
+# (profiles/jk_bank.json) is the default.
+PROFILE = get_profile("jk_bank")
+
+COLUMNS = PROFILE.columns
+
+# Column Boundaries (X-coords): Date < 120 < Part < 460 < With < 580 < Dep < 690 < Bal
+COL_BOUNDS = PROFILE.column_bounds
+
+# Transaction dates look like 01-Apr-2025
+date_pattern = PROFILE.date_pattern
+
+def page_rows(profile, words):
+    # Group words by line (vertical alignment)
+    # JK uses a 10px tolerance to handle slight misalignments
+    lines = layout.group_lines(words, profile.line_tolerance)
+    # A word belongs to the column its left edge (x0) falls in
+    columns = layout.assign_columns(lines.words, profile.column_bounds, edge=profile.column_edge, side="right")
+    return layout.line_rows(lines, columns, len(profile.columns))
+
+def is_header_row(cols, profile):
+    return bool(profile.header_markers) and all(marker in col for marker, col in zip(profile.header_markers, cols))
+
+def iter_raw_rows(pdf_path, progress=None, profile=PROFILE):
+    """Yields the bucketed text columns of every non-empty, non-header line."""
+    raw_count = 0
+    for page_index, rows in iter_page_lines(pdf_path, partial(page_rows, profile), progress=progress):
+        # Process each line
+        for cols in rows:
+            # Filter headers
+            if is_header_row(cols, profile):
+                continue
             
-            # Process each line
-            for line_words in lines:
-                # 5 Buckets
-                cols = ["", "", "", "", ""]
-                
-                for word in line_words:
-                    x = word['x0']
-                    text = word['text']
-                    
-                    # Assign to bucket
-                    if x < COL_BOUNDS[0]: # Date
-                        cols[0] += text + " "
-                    elif x < COL_BOUNDS[1]: # Particulars
-                        cols[1] += text + " "
-                    elif x < COL_BOUNDS[2]: # Withdrawals
-                        cols[2] += text + " "
-                    elif x < COL_BOUNDS[3]: # Deposits
-                        cols[3] += text + " "
-                    else: # Balance
-                        cols[4] += text + " "
-                
-                # Strip spaces
-                cols = [c.strip() for c in cols]
-                
-                # Filter headers
-                if "Date" in cols[0] and "Particulars" in cols[1]:
-                    continue
-                
-                # Filter empty rows (ignore strictly empty)
-                if not any(cols):
-                    continue
-
-                all_rows.append(cols)
-
-    print(f"DEBUG: First 20 raw rows:")
-    for i, r in enumerate(all_rows[:20]):
-        print(f"Row {i}: {r}")
-
-    # Post-processing
-    def clean_currency(val):
-        if not val:
-            return 0.0
-        # Remove chars that are not digits or dot or minus
-        # Keep it simple: remove spaces and commas
-        clean_val = val.replace(" ", "").replace(",", "")
-        try:
-            return float(clean_val)
-        except ValueError:
-            return 0.0 # Or return val if we want to debug text leakage
-
-    cleaned_rows = []
+            # Filter empty rows (ignore strictly empty)
+            if not any(cols):
+                continue
+
+            if raw_count == 0:
+                print(f"DEBUG: First 20 raw rows:")
+            if raw_count < 20:
+                print(f"Row {raw_count}: {cols}")
+            raw_count += 1
+
+            yield cols
+
+# Post-processing
+def clean_currency(val):
+    if not val:
+        return 0.0
+    # Remove chars that are not digits or dot or minus
+    # Keep it simple: remove spaces and commas
+    clean_val = val.replace(" ", "").replace(",", "")
+    try:
+        return float(clean_val)
+    except ValueError:
+        return 0.0 # Or return val if we want to debug text leakage
+
+def iter_transactions(raw_rows, profile=PROFILE):
+    """Merges raw rows into one row per transaction, in the profile's column order."""
     current_row = None
+    opening_marker = profile.opening_balance_marker
+    index = {role: profile.columns.index(name) for role, name in profile.roles.items()}
+    date_i, part_i = index["date"], index["particulars"]
+    with_i, dep_i, bal_i = index["withdrawals"], index["deposits"], index["balance"]
+    text_i = [i for i in range(len(profile.columns)) if i not in (date_i, with_i, dep_i, bal_i)]
 
-    for row in all_rows:
-        date_col = row[0]
-        part_col = row[1]
-        with_col = clean_currency(row[2])
-        dep_col = clean_currency(row[3])
-        bal_col = clean_currency(row[4])
+    for row in raw_rows:
+        row = list(row)
+        date_col = row[date_i]
+        part_col = row[part_i]
+        with_col = row[with_i] = clean_currency(row[with_i])
+        dep_col = row[dep_i] = clean_currency(row[dep_i])
+        bal_col = row[bal_i] = clean_currency(row[bal_i])
 
         # New Txn Logic
         is_new_txn = False
         # Regex for date
-        if re.search(r'\d{1,2}[-.\s][A-Za-z]{3}[-.\s]\d{4}', date_col):
+        if profile.date_pattern.search(date_col):
             is_new_txn = True
         
         # Opening Balance Case
-        if "Opening Balance" in part_col:
+        if opening_marker and opening_marker in part_col:
              # Handle Opening Balance explicitly
-             cleaned_rows.append(["", "Opening Balance", 0.0, 0.0, float(bal_col or with_col or dep_col or 0)]) 
+             opening = [""] * len(row)
+             opening[part_i] = opening_marker
+             opening[with_i] = opening[dep_i] = 0.0
+             opening[bal_i] = float(bal_col or with_col or dep_col or 0)
+             yield opening
              # Note: Opening balance might end up in a wrong column if logic is weird, but usually it's in Bal.
              # Wait, row 1 example: Open Bal was part_col, and Amount was... where?
              # In debug Row 1: `..., '5,030.18'` -> it was in last column?
@@ -120,24 +103,37 @@ def convert_pdf_to_excel(pdf_path, excel_path):
 
         if is_new_txn:
             if current_row:
-                cleaned_rows.append(current_row)
-            current_row = [date_col, part_col, with_col, dep_col, bal_col]
+                yield current_row
+            current_row = row
         else:
             if current_row:
-                if part_col:
-                    current_row[1] += " " + part_col
+                for i in text_i:
+                    if row[i]:
+                        current_row[i] += " " + row[i]
                 # If numbers appear on continuation lines, accumulating them is risky?
                 # Usually they shouldn't.
                 # If they do, maybe check if current_row has 0?
                 # For safety, let's just merge text.
     
     if current_row:
-        cleaned_rows.append(current_row)
+        yield current_row
+
+def convert_pdf_to_excel(pdf_path, excel_path, progress=None, profile=PROFILE, validator=None):
+    """
+    The output format follows excel_path's extension (.xlsx, .csv, .jsonl, .parquet).
+    A validation.BalanceValidator, if given, checks the rows on the way (see write_checked).
+    """
+    progress = progress or no_progress
+    print(f"Processing {pdf_path} ({profile.name} layout)...")
 
-    df = pd.DataFrame(cleaned_rows, columns=["Date", "Particulars", "Withdrawals", "Deposits", "Balance"])
-    excel_file = "JK_Bank_Statement_v3.xlsx"
-    df.to_excel(excel_path, index=False)
-    print(f"Saved to {excel_path} with {len(df)} rows.")
+    # Rows stream from page extraction straight into the output file
+    rows = metrics.timed("assemble", iter_transactions(iter_raw_rows(pdf_path, progress, profile), profile))
+    if validator:
+        rows = metrics.timed("validate", validator.check(rows))
+    with metrics.span("write"):
+        row_count = write_checked(rows, excel_path, columns=profile.columns, progress=progress, validator=validator)
+    print(f"Saved to {excel_path} with {row_count} rows.")
+    return row_count
 
 if __name__ == "__main__":
     pdf_file = "AccountStmt_1761195605574.pdf"
@@ -0,0 +1,222 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections.abc import MutableMapping
+
+# Job store configuration (override via environment)
+JOB_STORE = os.environ.get("JOB_STORE", "sqlite")  # sqlite / memory
+JOB_DB_PATH = os.environ.get("JOB_DB_PATH", "jobs.db")
+JOB_TTL = float(os.environ.get("JOB_TTL_SECONDS", str(24 * 3600)))
+
+
+class JobRecord(MutableMapping):
+    """
+    Live view of one job. Reads go to the store, writes are applied atomically,
+    so existing code like jobs[job_id]["progress"] = 50 keeps working.
+    Use .update({...}) to change several fields in one write.
+    """
+
+    def __init__(self, store, job_id):
+        self._store = store
+        self._job_id = job_id
+
+    def _data(self):
+        data = self._store.get(self._job_id)
+        if data is None:
+            raise KeyError(self._job_id)
+        return data
+
+    def __getitem__(self, key):
+        return self._data()[key]
+
+    def __setitem__(self, key, value):
+        self._store.update(self._job_id, {key: value})
+
+    def __delitem__(self, key):
+        raise TypeError("Job fields cannot be deleted")
+
+    def __iter__(self):
+        return iter(self._data())
+
+    def __len__(self):
+        return len(self._data())
+
+    def update(self, fields=(), **kwargs):
+        fields = dict(fields, **kwargs)
+        self._store.update(self._job_id, fields)
+
+
+class JobStore:
+    """
+    Interface for job state storage. Records are plain JSON-serialisable dicts
+    keyed by job_id and expire `ttl` seconds after their last update.
+    The mapping methods let a store stand in for the old `jobs` dict.
+    """
+
+    # Whether pool worker processes see updates made through a pickled copy
+    multiprocess = False
+
+    def __init__(self, ttl=None):
+        self.ttl = JOB_TTL if ttl is None else ttl
+
+    def create(self, job_id, record):
+        raise NotImplementedError
+
+    def get(self, job_id):
+        raise NotImplementedError
+
+    def update(self, job_id, fields):
+        raise NotImplementedError
+
+    def delete(self, job_id):
+        raise NotImplementedError
+
+    def purge_expired(self):
+        raise NotImplementedError
+
+    def __contains__(self, job_id):
+        return self.get(job_id) is not None
+
+    def __getitem__(self, job_id):
+        if job_id not in self:
+            raise KeyError(job_id)
+        return JobRecord(self, job_id)
+
+    def __setitem__(self, job_id, record):
+        self.create(job_id, record)
+
+    def __delitem__(self, job_id):
+        self.delete(job_id)
+
+
+class InMemoryJobStore(JobStore):
+    """Process-local store for tests and single-process development."""
+
+    def __init__(self, ttl=None):
+        super().__init__(ttl)
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def create(self, job_id, record):
+        with self._lock:
+            self._jobs[job_id] = (dict(record), time.time() + self.ttl)
+
+    def get(self, job_id):
+        with self._lock:
+            entry = self._jobs.get(job_id)
+            if entry is None or entry[1] <= time.time():
+                return None
+            return dict(entry[0])
+
+    def update(self, job_id, fields):
+        with self._lock:
+            entry = self._jobs.get(job_id)
+            if entry is None:
+                raise KeyError(job_id)
+            entry[0].update(fields)
+            self._jobs[job_id] = (entry[0], time.time() + self.ttl)
+
+    def delete(self, job_id):
+        with self._lock:
+            self._jobs.pop(job_id, None)
+
+    def purge_expired(self):
+        now = time.time()
+        with self._lock:
+            expired = [job_id for job_id, (_, expires_at) in self._jobs.items() if expires_at <= now]
+            for job_id in expired:
+                del self._jobs[job_id]
+        return len(expired)
+
+
+class SQLiteJobStore(JobStore):
+    """
+    SQLite store in WAL mode. Safe to share between uvicorn workers and pool
+    processes on the same host (or a shared volume): each process/thread opens
+    its own connection, and updates are read-modify-write inside BEGIN IMMEDIATE.
+    """
+
+    multiprocess = True
+
+    def __init__(self, path=None, ttl=None):
+        super().__init__(ttl)
+        self.path = path or JOB_DB_PATH
+        self._local = threading.local()
+        self._init_schema()
+
+    def __getstate__(self):
+        # Connections don't survive pickling into pool workers; reopen by path
+        return {"path": self.path, "ttl": self.ttl}
+
+    def __setstate__(self, state):
+        self.path = state["path"]
+        self.ttl = state["ttl"]
+        self._local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _init_schema(self):
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "job_id TEXT PRIMARY KEY, data TEXT NOT NULL, "
+            "updated_at REAL NOT NULL, expires_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS jobs_expires_at ON jobs (expires_at)")
+
+    def create(self, job_id, record):
+        now = time.time()
+        self._conn().execute(
+            "INSERT OR REPLACE INTO jobs (job_id, data, updated_at, expires_at) VALUES (?, ?, ?, ?)",
+            (job_id, json.dumps(record), now, now + self.ttl),
+        )
+
+    def get(self, job_id):
+        row = self._conn().execute(
+            "SELECT data FROM jobs WHERE job_id = ? AND expires_at > ?", (job_id, time.time())
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def update(self, job_id, fields):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT data FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+            if row is None:
+                raise KeyError(job_id)
+            data = json.loads(row[0])
+            data.update(fields)
+            now = time.time()
+            conn.execute(
+                "UPDATE jobs SET data = ?, updated_at = ?, expires_at = ? WHERE job_id = ?",
+                (json.dumps(data), now, now + self.ttl, job_id),
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def delete(self, job_id):
+        self._conn().execute("DELETE FROM jobs WHERE job_id = ?", (job_id,))
+
+    def purge_expired(self):
+        cursor = self._conn().execute("DELETE FROM jobs WHERE expires_at <= ?", (time.time(),))
+        return cursor.rowcount
+
+
+def get_job_store():
+    if JOB_STORE == "memory":
+        return InMemoryJobStore()
+    if JOB_STORE == "sqlite":
+        return SQLiteJobStore()
+    raise ValueError(f"Unknown JOB_STORE '{JOB_STORE}'")
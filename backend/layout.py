@@ -0,0 +1,125 @@
+"""
+Shared page layout engine for the PDF converters: groups a page's words into
+lines and assigns each word to a column. Words are held as parallel arrays
+(Words) instead of one dict per word, so sorting, line splitting and column
+bucketing are whole-page NumPy operations.
+"""
+from bisect import bisect_left
+import numpy as np
+
+
+class Words:
+    """Array-backed word records for one page: text plus x0/x1/top coordinates."""
+
+    __slots__ = ("text", "x0", "x1", "top")
+
+    def __init__(self, text, x0, x1, top):
+        self.text = np.asarray(text, dtype=object)
+        self.x0 = np.asarray(x0, dtype=float)
+        self.x1 = np.asarray(x1, dtype=float)
+        self.top = np.asarray(top, dtype=float)
+
+    @classmethod
+    def from_dicts(cls, words):
+        """From pdfplumber's extract_words() output."""
+        return cls(
+            [w["text"] for w in words],
+            [w["x0"] for w in words],
+            [w["x1"] for w in words],
+            [w["top"] for w in words],
+        )
+
+    def __len__(self):
+        return len(self.text)
+
+    def take(self, index):
+        return Words(self.text[index], self.x0[index], self.x1[index], self.top[index])
+
+    @property
+    def mid(self):
+        # Midpoints are less sensitive to slightly leaning text than x0
+        return (self.x0 + self.x1) / 2
+
+
+class Lines:
+    """
+    A page's words in line order. Line i is words[starts[i]:starts[i + 1]];
+    within a line, words keep the order the grouping sort put them in.
+    """
+
+    __slots__ = ("words", "starts")
+
+    def __init__(self, words, starts):
+        self.words = words
+        self.starts = starts
+
+    def __len__(self):
+        return len(self.starts) - 1
+
+    def __iter__(self):
+        for start, end in zip(self.starts, self.starts[1:]):
+            yield slice(start, end)
+
+
+def group_lines(words, tolerance, anchor="first", order="top"):
+    """
+    Groups words into lines with one sort and a sweep.
+
+    order="top" sorts by top (stable); order="top_x0" sorts by (round(top), x0).
+    anchor="first" starts a new line once a word is `tolerance` or more below
+    the line's first word; anchor="previous" compares with the word before it.
+    """
+    if order == "top_x0":
+        index = np.lexsort((words.x0, np.round(words.top)))
+    else:
+        index = np.argsort(words.top, kind="stable")
+    words = words.take(index)
+    n = len(words)
+
+    if n == 0:
+        return Lines(words, [0])
+
+    if anchor == "previous":
+        breaks = np.flatnonzero(np.abs(np.diff(words.top)) >= tolerance) + 1
+        return Lines(words, [0] + breaks.tolist() + [n])
+
+    # Sorted by top, so a line runs up to the first word at or past its first
+    # word's top + tolerance: one binary search per line. The edges are
+    # re-checked with the subtraction itself so float rounding can't move them.
+    top = words.top.tolist()
+    starts = [0]
+    start = 0
+    while start < n:
+        first = top[start]
+        end = max(bisect_left(top, first + tolerance, start), start + 1)
+        while end > start + 1 and not top[end - 1] - first < tolerance:
+            end -= 1
+        while end < n and top[end] - first < tolerance:
+            end += 1
+        starts.append(end)
+        start = end
+    return Lines(words, starts)
+
+
+def assign_columns(words, bounds, edge="x0", side="right"):
+    """
+    Column index of every word, by binary search over sorted boundaries.
+    edge picks the coordinate ("x0" or "mid"). side="right" puts a word that
+    sits exactly on a boundary in the column to its right, side="left" in the
+    column to its left.
+    """
+    x = words.mid if edge == "mid" else words.x0
+    return np.searchsorted(np.asarray(bounds, dtype=float), x, side=side)
+
+
+def line_rows(lines, columns, column_count):
+    """Per line, the words' text joined with spaces per column: a list of column_count strings."""
+    text = lines.words.text.tolist()
+    columns = columns.tolist()
+    rows = []
+    for span in lines:
+        cells = [[] for _ in range(column_count)]
+        for t, c in zip(text[span], columns[span]):
+            cells[c].append(t)
+        rows.append([" ".join(cell).strip() for cell in cells])
+    return rows
@@ -1,12 +1,56 @@
-from fastapi import FastAPI, UploadFile, File, BackgroundTasks, HTTPException, Form
+from typing import List
+from fastapi import FastAPI, UploadFile, File, HTTPException, Form, Header, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
-import shutil
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse, Response
+from contextlib import asynccontextmanager
+import asyncio
+import json
 import os
 import uuid
-from processor import process_bank_statement
+import zipfile
+from starlette.concurrency import run_in_threadpool
+from worker_pool import ConversionPool, QueueFullError
+from job_store import get_job_store
+from uploads import save_upload, UploadTooLargeError, MAX_UPLOAD_BYTES
+import result_cache
+from writers import get_writer, convert_output, OUTPUT_FORMATS
+import batch
+import metrics
+import profiling
+import retention
 
-app = FastAPI()
+# Job status, shared by API workers and conversion processes (SQLite by default)
+jobs = get_job_store()
+
+# Conversions run in a process pool so CPU-bound parsing never blocks the event loop.
+# A process-local job store can't see worker updates, so fall back to threads for it.
+pool = ConversionPool(use_threads=not jobs.multiprocess)
+metrics.add_pool_gauges(pool)
+
+async def run_retention():
+    """Every RETENTION_INTERVAL: deletes expired and over-quota uploads/outputs (retention.py) and expired job records."""
+    while True:
+        try:
+            summary = await run_in_threadpool(retention.sweep, [UPLOAD_DIR, OUTPUT_DIR], jobs)
+            purged = await run_in_threadpool(jobs.purge_expired)
+            metrics.observe_sweep(summary)
+            if summary["deleted_files"] or purged:
+                print(f"Retention: deleted {summary['deleted_files']} files ({summary['deleted_bytes'] // 1024} KB), "
+                      f"expired {summary['expired_jobs']} jobs, purged {purged} job records, {summary['kept_bytes'] // 1024} KB kept")
+        except Exception as e:
+            print(f"Retention sweep failed: {e}")
+        await asyncio.sleep(retention.RETENTION_INTERVAL)
+
+@asynccontextmanager
+async def lifespan(app):
+    pool.start()
+    cleanup = asyncio.ensure_future(run_retention()) if retention.RETENTION_INTERVAL > 0 else None
+    yield
+    if cleanup:
+        cleanup.cancel()
+    await pool.shutdown()
+
+app = FastAPI(lifespan=lifespan)
 
 # CORS configuration
 app.add_middleware(
@@ -17,65 +61,473 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def limit_upload_size(request: Request, call_next):
+    # Reject oversized uploads from the declared length, before the body is read.
+    # The multipart envelope adds a little on top of the file itself.
+    content_length = request.headers.get("content-length")
+    if request.method == "POST" and content_length and content_length.isdigit():
+        limit = batch.MAX_BATCH_BYTES if request.url.path == "/batch" else MAX_UPLOAD_BYTES
+        if int(content_length) > limit + 64 * 1024:
+            return JSONResponse(status_code=413, content={"detail": "File too large"})
+    return await call_next(request)
+
 # Directories
 UPLOAD_DIR = "uploads"
 OUTPUT_DIR = "outputs"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
-# In-memory job status (replace with database for production)
-jobs = {}
+def check_output_format(output_format):
+    output_format = output_format.lower()
+    if output_format not in OUTPUT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported output format. Use one of: {', '.join(OUTPUT_FORMATS)}")
+    return output_format
 
-@app.post("/upload")
-async def upload_file(
-    background_tasks: BackgroundTasks, 
-    file: UploadFile = File(...),
-    conversion_type: str = Form("generic")
-):
-    job_id = str(uuid.uuid4())
-    file_path = os.path.join(UPLOAD_DIR, f"{job_id}_{file.filename}")
-    
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    
+def require_admin(token):
+    if not profiling.is_admin(token):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+async def start_conversion(job_id, file_path, filename, size_bytes, sha256, conversion_type, output_format, batch_id=None, profile_job=False):
+    """
+    Creates the job record and either restores a cached result or queues the
+    conversion. Raises QueueFullError (job record removed) if the pool is full.
+    profile_job=True skips the cache and runs the conversion under the
+    profilers (see profiling.py); PROFILE_SAMPLE_RATE picks other jobs at random.
+    """
     jobs[job_id] = {
         "status": "processing", 
         "progress": 0, 
         "message": "File uploaded",
-        "original_filename": file.filename
+        "original_filename": filename,
+        "size_bytes": size_bytes,
+        "sha256": sha256,
+        "output_format": output_format,
+        "batch_id": batch_id
     }
+
+    # Same bytes, same conversion, same parser code: reuse the previous output
+    key = result_cache.cache_key(sha256, conversion_type, os.path.splitext(filename)[1], output_format)
+    cached = None if profile_job else result_cache.lookup(key)
+    if cached is not None:
+        output_path = os.path.join(OUTPUT_DIR, f"{job_id}{get_writer(output_format).extension}")
+        try:
+            report_path = await run_in_threadpool(result_cache.restore, key, output_path, None, cached.get("balance_report_suffix"))
+        except OSError as e:
+            # Evicted (by another worker) since the lookup: convert it as on a miss
+            print(f"Result cache restore failed for job {job_id}: {e}")
+            cached = None
+    if cached is not None:
+        jobs.update(job_id, {
+            "status": "completed",
+            "progress": 100,
+            "message": "Conversion complete (cached result)",
+            "output_file": output_path,
+            "row_count": cached.get("row_count"),
+            "output_columns": cached.get("output_columns"),
+            "output_header": cached.get("output_header", False),
+            "profile": cached.get("profile"),
+            "detected_type": cached.get("detected_type"),
+            "detection_confidence": cached.get("detection_confidence"),
+            "balance_check": cached.get("balance_check"),
+            "balance_report_file": report_path,
+            "cache_hit": True
+        })
+        metrics.observe_job(jobs.get(job_id), conversion_type)
+        retention.remove_file(file_path)
+        return
+
+    def mark_failed(message):
+        jobs.update(job_id, {"status": "failed", "message": message})
+
+    args = (result_cache.convert_with_cache, file_path, job_id, jobs, OUTPUT_DIR, conversion_type, key, output_format)
+    if profiling.should_profile(profile_job):
+        args = (profiling.profile_job, job_id, jobs, OUTPUT_DIR) + args
+    try:
+        task = pool.submit(*args, on_error=mark_failed)
+    except QueueFullError:
+        del jobs[job_id]
+        raise
+    def finished(_):
+        # The worker leaves its stage timings in the job record. A converted
+        # upload isn't needed any more; failed ones stay until retention removes them.
+        job = jobs.get(job_id)
+        metrics.observe_job(job, conversion_type)
+        if job and job.get("status") == "completed":
+            retention.remove_file(file_path)
+
+    task.add_done_callback(finished)
+
+@app.post("/upload")
+async def upload_file(
+    file: UploadFile = File(...),
+    conversion_type: str = Form("auto"),
+    output_format: str = Form("xlsx"),
+    profile: bool = Form(False),
+    x_admin_token: str = Header(None)
+):
+    """profile=true (admin only) profiles the conversion; see /admin/profile/{job_id}."""
+    output_format = check_output_format(output_format)
+    if profile:
+        require_admin(x_admin_token)
+    if pool.is_full:
+        raise HTTPException(status_code=503, detail="Conversion queue is full, please retry shortly")
+
+    job_id = str(uuid.uuid4())
+    file_path = os.path.join(UPLOAD_DIR, f"{job_id}_{os.path.basename(file.filename)}")
     
-    background_tasks.add_task(process_bank_statement, file_path, job_id, jobs, OUTPUT_DIR, conversion_type)
+    try:
+        size_bytes, sha256 = await save_upload(file, file_path)
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
+    try:
+        await start_conversion(job_id, file_path, file.filename, size_bytes, sha256, conversion_type, output_format, profile_job=profile)
+    except QueueFullError as e:
+        os.remove(file_path)
+        raise HTTPException(status_code=503, detail=str(e))
     
     return {"job_id": job_id}
 
+async def save_batch_files(files):
+    """
+    Saves a batch upload to UPLOAD_DIR, unpacking ZIP archives. Returns the
+    statements as (job_id, file_path, filename, size_bytes, sha256) plus the
+    rejected files as {"filename", "message"}. Gives up, keeping nothing, as
+    soon as the statements (counted after unpacking) pass batch.MAX_BATCH_FILES
+    (HTTPException 400) or batch.MAX_BATCH_BYTES (BatchTooLargeError). This way an archive of
+    highly compressible members can't fill the disk before it's refused.
+    """
+    saved = []
+    rejected = []
+    total_bytes = 0
+    try:
+        for file in files:
+            filename = os.path.basename(file.filename or "")
+            ext = os.path.splitext(filename)[1].lower()
+            if ext not in batch.SUPPORTED_EXTENSIONS and ext != ".zip":
+                rejected.append({"filename": filename, "message": "Unsupported file format"})
+                continue
+
+            job_id = str(uuid.uuid4())
+            file_path = os.path.join(UPLOAD_DIR, f"{job_id}_{filename}")
+            try:
+                size_bytes, sha256 = await save_upload(file, file_path)
+            except UploadTooLargeError as e:
+                rejected.append({"filename": filename, "message": str(e)})
+                continue
+            if ext != ".zip":
+                saved.append((job_id, file_path, filename, size_bytes, sha256))
+                total_bytes += size_bytes
+                if len(saved) > batch.MAX_BATCH_FILES:
+                    raise HTTPException(status_code=400, detail=f"A batch can hold at most {batch.MAX_BATCH_FILES} statements")
+                if total_bytes > batch.MAX_BATCH_BYTES:
+                    raise batch.BatchTooLargeError(f"The unpacked batch exceeds the {batch.MAX_BATCH_BYTES // (1024 * 1024)} MB limit")
+                continue
+
+            # Each statement inside the archive becomes its own job
+            try:
+                members = await run_in_threadpool(batch.zip_members, file_path)
+                if len(saved) + len(members) > batch.MAX_BATCH_FILES:
+                    raise HTTPException(status_code=400, detail=f"A batch can hold at most {batch.MAX_BATCH_FILES} statements")
+                for member_name, member in members:
+                    member_id = str(uuid.uuid4())
+                    member_path = os.path.join(UPLOAD_DIR, f"{member_id}_{member_name}")
+                    try:
+                        size_bytes, sha256 = await run_in_threadpool(batch.extract_member, file_path, member, member_path,
+                                                                     MAX_UPLOAD_BYTES, batch.MAX_BATCH_BYTES - total_bytes)
+                    except UploadTooLargeError as e:
+                        rejected.append({"filename": member_name, "message": str(e)})
+                        continue
+                    saved.append((member_id, member_path, member_name, size_bytes, sha256))
+                    total_bytes += size_bytes
+            except zipfile.BadZipFile:
+                rejected.append({"filename": filename, "message": "Not a valid ZIP archive"})
+            finally:
+                os.remove(file_path)
+    except BaseException:
+        for _, file_path, *_ in saved:
+            os.remove(file_path)
+        raise
+    return saved, rejected
+
+@app.post("/batch")
+async def upload_batch(
+    files: List[UploadFile] = File(...),
+    conversion_type: str = Form("auto"),
+    output_format: str = Form("xlsx")
+):
+    """Converts several statements (files and/or ZIP archives of them) as one batch."""
+    output_format = check_output_format(output_format)
+    if pool.is_full:
+        raise HTTPException(status_code=503, detail="Conversion queue is full, please retry shortly")
+
+    try:
+        saved, rejected = await save_batch_files(files)
+    except batch.BatchTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    if not saved:
+        raise HTTPException(status_code=400, detail="No supported statements in the upload")
+    # Queue the whole batch or none of it, so a batch is never half-submitted
+    if len(saved) > batch.MAX_BATCH_FILES or len(saved) > pool.free_slots:
+        for _, file_path, *_ in saved:
+            os.remove(file_path)
+        if len(saved) > batch.MAX_BATCH_FILES:
+            raise HTTPException(status_code=400, detail=f"A batch can hold at most {batch.MAX_BATCH_FILES} statements")
+        raise HTTPException(status_code=503, detail="Conversion queue is full, please retry shortly")
+
+    batch_id = str(uuid.uuid4())
+    jobs[batch_id] = {
+        "kind": "batch",
+        "job_ids": [job_id for job_id, *_ in saved],
+        "filenames": [filename for _, _, filename, *_ in saved],
+        "rejected": rejected,
+        "output_format": output_format
+    }
+    for job_id, file_path, filename, size_bytes, sha256 in saved:
+        await start_conversion(job_id, file_path, filename, size_bytes, sha256, conversion_type, output_format, batch_id)
+
+    return {"batch_id": batch_id, "job_ids": jobs[batch_id]["job_ids"], "rejected": rejected}
+
+def get_job(job_id):
+    # Batch records share the job store but aren't jobs (no status, output or events)
+    record = jobs.get(job_id)
+    if record is None or record.get("kind") == "batch":
+        raise HTTPException(status_code=404, detail="Job not found")
+    return record
+
+def get_batch(batch_id):
+    record = jobs.get(batch_id)
+    if record is None or record.get("kind") != "batch":
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return record
+
+@app.get("/batch/{batch_id}")
+async def get_batch_status(batch_id: str):
+    record = get_batch(batch_id)
+    status = batch.batch_status(batch_id, record, jobs)
+    if record.get("merge"):
+        status["merge"] = record["merge"]
+    return status
+
+@app.get("/batch/{batch_id}/download")
+async def download_batch(batch_id: str, mode: str = "zip", format: str = None):
+    """
+    mode=zip: every converted statement in one archive; mode=sheets: one
+    workbook, a sheet per statement; mode=ledger: all transactions in one
+    table (in `format`, default the batch's) with the source file name;
+    mode=merged: the same for overlapping statements of one account, with
+    repeated transactions removed and the balance checked at each seam (the
+    report is added to the batch status as "merge").
+    """
+    record = get_batch(batch_id)
+    if mode not in batch.BATCH_MODES:
+        raise HTTPException(status_code=400, detail=f"Unsupported batch mode. Use one of: {', '.join(batch.BATCH_MODES)}")
+    output_format = check_output_format(format or record.get("output_format", "xlsx"))
+
+    status = batch.batch_status(batch_id, record, jobs)
+    if status["status"] == "processing":
+        raise HTTPException(status_code=400, detail="Batch not completed")
+    members = []
+    for job_id in record["job_ids"]:
+        job = jobs.get(job_id)
+        if job and job["status"] == "completed" and os.path.exists(job["output_file"]):
+            members.append({
+                "filename": job["original_filename"],
+                "output_file": job["output_file"],
+                "output_format": job.get("output_format", "xlsx"),
+                "output_columns": job.get("output_columns"),
+                "output_header": job.get("output_header", False),
+                "profile": job.get("profile")
+            })
+    if not members:
+        if any((jobs.get(job_id) or {}).get("status") == "expired" for job_id in record["job_ids"]):
+            raise HTTPException(status_code=410, detail=retention.EXPIRED_MESSAGE)
+        raise HTTPException(status_code=404, detail="No converted statements in this batch")
+
+    extension, media_type = batch.batch_output_name(mode, output_format)
+    dest_path = os.path.join(OUTPUT_DIR, f"{batch_id}_{mode}{extension}")
+    if not os.path.exists(dest_path):
+        # Write under a temporary name so a concurrent download never serves a partial file
+        # (keeping the extension, which picks the ledger's writer)
+        tmp_path = f"{dest_path}.{uuid.uuid4().hex}{extension}"
+        errors = []
+        try:
+            if mode == "merged":
+                report = await pool.submit(batch.build_merged_output, members, tmp_path, on_error=errors.append)
+            else:
+                await pool.submit(batch.build_batch_output, members, tmp_path, mode, output_format, on_error=errors.append)
+        except QueueFullError as e:
+            raise HTTPException(status_code=503, detail=str(e))
+        if errors:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise HTTPException(status_code=500, detail=f"Batch output failed: {errors[0]}")
+        os.replace(tmp_path, dest_path)
+        if mode == "merged":
+            jobs.update(batch_id, {"merge": report})
+
+    retention.touch(dest_path)
+    return FileResponse(dest_path, filename=f"statements_{mode}{extension}", media_type=media_type)
+
+@app.get("/metrics")
+async def get_metrics():
+    """Conversion metrics of this API process, in the Prometheus text format."""
+    return Response(metrics.REGISTRY.render(), media_type=metrics.METRICS_CONTENT_TYPE)
+
+@app.get("/admin/profile/{job_id}")
+async def download_profile(job_id: str, kind: str = "collapsed", x_admin_token: str = Header(None)):
+    """A profiled job's cProfile stats (kind=pstats) or sampled stacks for flame graphs (kind=collapsed)."""
+    require_admin(x_admin_token)
+    if kind not in profiling.PROFILE_KINDS:
+        raise HTTPException(status_code=400, detail=f"Unsupported profile kind. Use one of: {', '.join(profiling.PROFILE_KINDS)}")
+    job = get_job(job_id)
+    path = (job.get("profiling") or {}).get(kind)
+    if not path or not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="No profile for this job")
+    extension, media_type = profiling.PROFILE_KINDS[kind]
+    return FileResponse(path, filename=f"{job_id}{extension}", media_type=media_type)
+
 @app.get("/status/{job_id}")
 async def get_status(job_id: str):
-    if job_id not in jobs:
-        raise HTTPException(status_code=404, detail="Job not found")
-    return jobs[job_id]
+    job = get_job(job_id)
+    return job
+
+# How often the event stream re-reads the job record, and how often it sends a keep-alive
+EVENT_POLL_INTERVAL = float(os.environ.get("EVENT_POLL_INTERVAL", "0.25"))
+EVENT_HEARTBEAT_INTERVAL = 15.0
+
+def sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def job_events(job_id, request):
+    last_progress = None
+    last_message = None
+    idle = 0.0
+    while True:
+        job = jobs.get(job_id)
+        if job is None:
+            yield sse("failed", {"message": "Job not found"})
+            return
+
+        if job.get("progress") != last_progress:
+            last_progress = job.get("progress")
+            idle = 0.0
+            yield sse("progress", {"progress": last_progress, "stage": job.get("stage")})
+        if job.get("message") != last_message:
+            last_message = job.get("message")
+            idle = 0.0
+            yield sse("message", {"message": last_message})
+
+        if job["status"] == "completed":
+            yield sse("complete", {
+                "message": job.get("message"),
+                "row_count": job.get("row_count"),
+                "download_url": f"/download/{job_id}"
+            })
+            return
+        if job["status"] in ("failed", "expired"):
+            yield sse("failed", {"message": job.get("message")})
+            return
+
+        if await request.is_disconnected():
+            return
+        if idle >= EVENT_HEARTBEAT_INTERVAL:
+            # Comment line keeps proxies from closing an idle stream
+            idle = 0.0
+            yield ": keep-alive\n\n"
+        await asyncio.sleep(EVENT_POLL_INTERVAL)
+        idle += EVENT_POLL_INTERVAL
+
+@app.get("/events/{job_id}")
+async def stream_events(job_id: str, request: Request):
+    """Server-Sent Events stream of progress/message updates, ending with complete or failed."""
+    get_job(job_id)
+    return StreamingResponse(
+        job_events(job_id, request),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+async def converted_output(job_id, job, output_format):
+    """Path of the job's output in output_format, re-encoding the stored file on first request."""
+    source_format = job.get("output_format", "xlsx")
+    if output_format == source_format:
+        return job["output_file"]
+
+    dest_path = os.path.join(OUTPUT_DIR, f"{job_id}{get_writer(output_format).extension}")
+    if os.path.exists(dest_path):
+        return dest_path
+
+    # Write under a temporary name so a concurrent download never serves a partial file
+    tmp_path = f"{dest_path}.{uuid.uuid4().hex}.tmp"
+    errors = []
+    try:
+        await pool.submit(
+            convert_output, job["output_file"], source_format, tmp_path, output_format,
+            job.get("output_columns"), job.get("output_header", False), job.get("profile"),
+            on_error=errors.append
+        )
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    if errors:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise HTTPException(status_code=500, detail=f"Format conversion failed: {errors[0]}")
+    os.replace(tmp_path, dest_path)
+    return dest_path
 
 @app.get("/download/{job_id}")
-async def download_file(job_id: str):
-    if job_id not in jobs:
-        raise HTTPException(status_code=404, detail="Job not found")
+async def download_file(job_id: str, format: str = None):
+    job = get_job(job_id)
+    if job["status"] == "expired":
+        raise HTTPException(status_code=410, detail=job.get("message") or retention.EXPIRED_MESSAGE)
     
-    job = jobs[job_id]
     if job["status"] != "completed":
         raise HTTPException(status_code=400, detail="Job not completed")
     
-    file_path = job["output_file"]
-    if not os.path.exists(file_path):
-        raise HTTPException(status_code=404, detail="File not found")
+    output_format = (format or job.get("output_format", "xlsx")).lower()
+    if output_format not in OUTPUT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported output format. Use one of: {', '.join(OUTPUT_FORMATS)}")
+
+    if not os.path.exists(job["output_file"]):
+        # Deleted by retention (or another API worker's sweep) before the record was marked
+        raise HTTPException(status_code=410, detail=retention.EXPIRED_MESSAGE)
+    file_path = await converted_output(job_id, job, output_format)
+    retention.touch(file_path)
+    writer = get_writer(output_format)
     
     # Construct a friendly filename
     original_name = job.get("original_filename", "statement")
-    # Remove extension from original and add _converted.xlsx
+    # Remove extension from original and add _converted.<ext>
     clean_name = os.path.splitext(original_name)[0]
-    download_name = f"{clean_name}_converted.xlsx"
+    download_name = f"{clean_name}_converted{writer.extension}"
     
     return FileResponse(
         file_path, 
         filename=download_name, 
-        media_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        media_type=writer.media_type
     )
+
+@app.get("/download/{job_id}/balance-check")
+async def download_balance_report(job_id: str):
+    """Rows that break the running balance, for outputs without a Balance Check sheet (csv, jsonl, parquet)."""
+    job = get_job(job_id)
+    if job["status"] == "expired":
+        raise HTTPException(status_code=410, detail=job.get("message") or retention.EXPIRED_MESSAGE)
+    if job["status"] != "completed":
+        raise HTTPException(status_code=400, detail="Job not completed")
+
+    report_path = job.get("balance_report_file")
+    if not report_path:
+        if job.get("output_format", "xlsx") == "xlsx" and not (job.get("balance_check") or {}).get("valid", True):
+            detail = "Mismatched rows are on the Balance Check sheet of the xlsx output"
+        else:
+            detail = "No balance check report: every checked row follows the running balance, or the layout isn't checked"
+        raise HTTPException(status_code=404, detail=detail)
+    if not os.path.exists(report_path):
+        raise HTTPException(status_code=410, detail=retention.EXPIRED_MESSAGE)
+    retention.touch(report_path)
+    writer = get_writer(job.get("output_format", "xlsx"))
+    clean_name = os.path.splitext(job.get("original_filename", "statement"))[0]
+    return FileResponse(report_path, filename=f"{clean_name}_balance_check{writer.extension}", media_type=writer.media_type)
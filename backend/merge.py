@@ -0,0 +1,148 @@
+"""
+Merges converted statements of one account whose periods overlap (Jan-Mar,
+then Mar-May) into a single ledger without the repeated transactions.
+
+Every row is keyed by a 64-bit hash of (date, withdrawal, deposit, balance,
+normalised particulars). A hash index of the keys already in the ledger
+decides, per statement, which rows are new, so the merge is one pass over
+all rows. Where each statement joins the ledger, the running balance is
+checked for continuity, which catches missing statements and bad overlaps.
+"""
+import numpy as np
+import pandas as pd
+from profiles import ROLES, REQUIRED_ROLES
+from validation import BALANCE_TOLERANCE
+
+MERGED_COLUMNS = ["Source File", "Date", "Particulars", "Chq/Ref No.", "Withdrawals", "Deposits", "Balance"]
+
+
+def _amounts(values):
+    text = values.astype(str).str.replace(",", "", regex=False).str.replace("Cr", "", regex=False).str.replace("Dr", "", regex=False)
+    return pd.to_numeric(text, errors="coerce")
+
+
+def statement_frame(df, roles):
+    """
+    A converter's DataFrame (parse_rpt_file, or an output file read back)
+    reduced to the merge's ROLES columns, using its profile's roles mapping.
+    Rows without a parseable date (opening balance, B/F lines) get a NaT date.
+    """
+    missing = [role for role in REQUIRED_ROLES if role not in roles]
+    if missing:
+        raise ValueError(f"Statement columns lack {', '.join(missing)}")
+
+    frame = pd.DataFrame({
+        "date_text": df[roles["date"]].fillna("").astype(str).to_numpy(),
+        "particulars": df[roles["particulars"]].fillna("").astype(str).to_numpy(),
+        "reference": df[roles["reference"]].fillna("").astype(str).to_numpy() if "reference" in roles else "",
+        "withdrawals": _amounts(df[roles["withdrawals"]]).fillna(0.0).to_numpy(),
+        "deposits": _amounts(df[roles["deposits"]]).fillna(0.0).to_numpy(),
+        "balance": _amounts(df[roles["balance"]]).to_numpy(),
+    })
+    frame["date"] = pd.to_datetime(frame["date_text"], format="mixed", dayfirst=True, errors="coerce")
+    return frame
+
+
+def transaction_keys(frame):
+    """64-bit key per row over (date, withdrawal, deposit, balance, particulars)."""
+    cents = lambda col: (frame[col].fillna(0.0) * 100).round().astype("int64")
+    # Wrapped lines and PDF spacing differ between exports of the same entry,
+    # so particulars are compared on their letters and digits only
+    particulars = frame["particulars"].str.casefold().str.replace(r"[\W_]+", "", regex=True)
+    key_columns = pd.DataFrame({
+        "date": frame["date"].astype("int64"),
+        "withdrawals": cents("withdrawals"),
+        "deposits": cents("deposits"),
+        "balance": cents("balance"),
+        "particulars": particulars,
+    })
+    return pd.util.hash_pandas_object(key_columns, index=False)
+
+
+def _balances_continue(previous_balance, row):
+    # Either sign convention: balance = previous + deposits - withdrawals, or
+    # the reverse for overdraft / cash credit accounts shown as positive Dr balances
+    change = row["deposits"] - row["withdrawals"]
+    return (abs(previous_balance + change - row["balance"]) <= BALANCE_TOLERANCE
+            or abs(previous_balance - change - row["balance"]) <= BALANCE_TOLERANCE)
+
+
+def merge_statements(statements):
+    """
+    statements: [(name, statement_frame)] in any order. Statements are merged
+    in order of their first transaction date. A row is dropped when the
+    ledger already holds as many rows with its key as this statement has up
+    to and including it, so genuine repeats inside one statement are kept.
+
+    Returns (merged DataFrame of MERGED_COLUMNS, report dict).
+    """
+    def first_date(item):
+        dates = item[1]["date"].dropna()
+        return (dates.iloc[0] if len(dates) else pd.Timestamp.max)
+
+    ordered = sorted(statements, key=first_date)
+    index = {}
+    parts = []
+    seams = []
+    previous = None
+    input_rows = skipped_rows = 0
+
+    for name, frame in ordered:
+        input_rows += len(frame)
+        dated = frame[frame["date"].notna()].reset_index(drop=True)
+        skipped_rows += len(frame) - len(dated)
+
+        keys = transaction_keys(dated)
+        occurrence = keys.groupby(keys.to_numpy()).cumcount().to_numpy()
+        seen = np.fromiter((index.get(k, 0) for k in keys.to_numpy()), dtype=np.int64, count=len(keys))
+        new = dated[occurrence >= seen]
+        for key, count in keys.value_counts().items():
+            if count > index.get(key, 0):
+                index[key] = count
+
+        if previous is not None:
+            seam = {
+                "previous": previous[0],
+                "next": name,
+                "overlap_rows": int(len(dated) - len(new)),
+                "previous_balance": previous[1],
+                "first_balance": None,
+                "continuous": True,
+            }
+            if len(new) and previous[1] is not None:
+                first = new.iloc[0]
+                seam["first_balance"] = None if pd.isna(first["balance"]) else float(first["balance"])
+                seam["continuous"] = bool(_balances_continue(previous[1], first))
+            seams.append(seam)
+
+        if len(new):
+            last_balance = new["balance"].iloc[-1]
+            previous = (name, None if pd.isna(last_balance) else float(last_balance))
+            parts.append(new.assign(source=name))
+        elif previous is None:
+            previous = (name, None)
+
+    if parts:
+        merged = pd.concat(parts, ignore_index=True)
+    else:
+        merged = pd.DataFrame(columns=list(ROLES) + ["date_text", "source"])
+    merged = pd.DataFrame({
+        "Source File": merged["source"],
+        "Date": merged["date_text"],
+        "Particulars": merged["particulars"],
+        "Chq/Ref No.": merged["reference"],
+        "Withdrawals": merged["withdrawals"],
+        "Deposits": merged["deposits"],
+        "Balance": merged["balance"],
+    }, columns=MERGED_COLUMNS)
+
+    report = {
+        "statements": [name for name, _ in ordered],
+        "input_rows": input_rows,
+        "merged_rows": len(merged),
+        "duplicates_dropped": input_rows - skipped_rows - len(merged),
+        "undated_rows_skipped": skipped_rows,
+        "continuous": all(seam["continuous"] for seam in seams),
+        "seams": seams,
+    }
+    return merged, report
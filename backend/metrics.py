@@ -0,0 +1,254 @@
+"""
+Conversion instrumentation: per-job stage timings and process-wide metrics.
+
+Converters mark their stages with span("extract") / timed("assemble", rows).
+Spans only record while a job_timings() collector is active (process_bank_statement
+starts one per job); otherwise they are no-ops. Time is attributed to the
+innermost open span, so in a streaming pipeline, where pulling the next row
+runs the upstream stages, each stage gets only its own time.
+
+The API process aggregates finished jobs' timings (observe_job) into the
+counters, histograms and gauges that /metrics renders in the Prometheus text
+format. Each API worker process exposes its own metrics.
+"""
+import threading
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+from contextlib import contextmanager, nullcontext
+
+_current = ContextVar("job_timings", default=None)
+_noop = nullcontext()
+
+
+class Timings:
+    """Self-time per stage name, plus counts (pages), for one job."""
+
+    def __init__(self):
+        self.seconds = defaultdict(float)
+        self.counts = defaultdict(int)
+        self.started = time.perf_counter()
+        # [name, start, time spent in nested spans]
+        self._stack = []
+
+    def enter(self, name):
+        self._stack.append([name, time.perf_counter(), 0.0])
+
+    def exit(self):
+        name, start, nested = self._stack.pop()
+        elapsed = time.perf_counter() - start
+        self.seconds[name] += elapsed - nested
+        if self._stack:
+            self._stack[-1][2] += elapsed
+
+    def job_fields(self):
+        """Job record fields: {"timings": {stage: seconds, "total": seconds}} plus any counts."""
+        timings = {name: round(seconds, 4) for name, seconds in self.seconds.items()}
+        timings["total"] = round(time.perf_counter() - self.started, 4)
+        fields = {"timings": timings}
+        if "pages" in self.counts:
+            fields["page_count"] = self.counts["pages"]
+        return fields
+
+
+class _Span:
+    __slots__ = ("timings", "name")
+
+    def __init__(self, timings, name):
+        self.timings = timings
+        self.name = name
+
+    def __enter__(self):
+        self.timings.enter(self.name)
+
+    def __exit__(self, *exc):
+        self.timings.exit()
+
+
+def span(name):
+    """Context manager timing a stage of the current job."""
+    timings = _current.get()
+    return _noop if timings is None else _Span(timings, name)
+
+
+def timed(name, iterable):
+    """Iterates iterable, timing each step (whatever the upstream generator does to produce it) as stage name."""
+    timings = _current.get()
+    if timings is None:
+        yield from iterable
+        return
+    iterator = iter(iterable)
+    while True:
+        timings.enter(name)
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            timings.exit()
+        yield item
+
+
+def count(name, n=1):
+    timings = _current.get()
+    if timings is not None:
+        timings.counts[name] += n
+
+
+@contextmanager
+def job_timings():
+    """Collects the spans of one job run in this thread."""
+    timings = Timings()
+    token = _current.set(timings)
+    try:
+        yield timings
+    finally:
+        _current.reset(token)
+
+
+# Aggregated metrics
+
+# Seconds; conversions range from a few ms (cached, tiny RPTs) to the 900s timeout
+DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 900)
+PAGE_RATE_BUCKETS = (0.5, 1, 2, 5, 10, 20, 50, 100, 200)
+
+
+def _label_text(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self.values = defaultdict(float)
+
+    def inc(self, *labels, amount=1):
+        self.values[labels] += amount
+
+    def samples(self):
+        for labels, value in sorted(self.values.items()):
+            yield self.name, _label_text(self.labelnames, labels), value
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DURATION_BUCKETS):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts..., +Inf count, sum]
+        self.values = {}
+
+    def observe(self, value, *labels):
+        counts = self.values.setdefault(labels, [0] * (len(self.buckets) + 1) + [0.0])
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+        counts[len(self.buckets)] += 1
+        counts[-1] += value
+
+    def samples(self):
+        for labels, counts in sorted(self.values.items()):
+            for bound, n in zip(self.buckets + ("+Inf",), counts):
+                yield f"{self.name}_bucket", _label_text(self.labelnames, labels, [("le", bound)]), n
+            yield f"{self.name}_count", _label_text(self.labelnames, labels), counts[len(self.buckets)]
+            yield f"{self.name}_sum", _label_text(self.labelnames, labels), counts[-1]
+
+
+class Gauge:
+    """A value read when metrics are rendered: read() returns it."""
+
+    kind = "gauge"
+
+    def __init__(self, name, help, read):
+        self.name, self.help, self.read = name, help, read
+
+    def samples(self):
+        yield self.name, "", self.read()
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        self.lock = threading.Lock()
+
+    def add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+        with self.lock:
+            for metric in self.metrics:
+                lines.append(f"# HELP {metric.name} {metric.help}")
+                lines.append(f"# TYPE {metric.name} {metric.kind}")
+                for name, labels, value in metric.samples():
+                    lines.append(f"{name}{labels} {value}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+JOBS = REGISTRY.add(Counter("conversion_jobs_total", "Conversions finished, by conversion type and status (completed, failed, cached).",
+                            ("conversion_type", "status")))
+JOB_SECONDS = REGISTRY.add(Histogram("conversion_duration_seconds", "Conversion time in the worker, by conversion type.",
+                                     ("conversion_type",)))
+STAGE_SECONDS = REGISTRY.add(Histogram("conversion_stage_seconds", "Time per job spent in each conversion stage.", ("stage",)))
+PAGES = REGISTRY.add(Counter("conversion_pages_total", "PDF pages converted, by conversion type.", ("conversion_type",)))
+PAGE_RATE = REGISTRY.add(Histogram("conversion_pages_per_second", "Pages per second of each PDF conversion, by conversion type.",
+                                   ("conversion_type",), PAGE_RATE_BUCKETS))
+GARBAGE_HITS = REGISTRY.add(Counter("garbage_phrase_hits_total", "Lines dropped by each garbage phrase of a layout profile; 0 for phrases that never fired.",
+                                    ("profile", "phrase")))
+RETENTION_FILES = REGISTRY.add(Counter("retention_deleted_files_total", "Uploads and outputs deleted by the retention sweep."))
+RETENTION_BYTES = REGISTRY.add(Counter("retention_deleted_bytes_total", "Bytes of uploads and outputs deleted by the retention sweep."))
+RETENTION_EXPIRED = REGISTRY.add(Counter("retention_expired_jobs_total", "Completed jobs whose output the retention sweep deleted."))
+
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def add_pool_gauges(pool):
+    """In-flight, running and queued job gauges for a worker_pool.ConversionPool."""
+    REGISTRY.add(Gauge("conversion_jobs_in_flight", "Conversions running or waiting for a worker.", lambda: pool.in_flight))
+    REGISTRY.add(Gauge("conversion_jobs_running", "Conversions running in a worker.", lambda: pool.running))
+    REGISTRY.add(Gauge("conversion_jobs_queued", "Conversions waiting for a worker.", lambda: pool.in_flight - pool.running))
+    REGISTRY.add(Gauge("conversion_workers", "Conversion worker processes.", lambda: pool.max_workers))
+
+
+def observe_job(job, conversion_type):
+    """Adds a finished job's record (status, timings, page_count, garbage_hits) to the aggregated metrics."""
+    if job is None:
+        return
+    conversion_type = job.get("detected_type") or conversion_type
+    status = "cached" if job.get("cache_hit") else job.get("status", "failed")
+    with REGISTRY.lock:
+        JOBS.inc(conversion_type, status)
+        for phrase, hits in (job.get("garbage_hits") or {}).items():
+            GARBAGE_HITS.inc(job.get("profile"), phrase, amount=hits)
+        timings = job.get("timings")
+        if not timings:
+            return
+        total = timings.get("total", 0.0)
+        JOB_SECONDS.observe(total, conversion_type)
+        for stage, seconds in timings.items():
+            if stage != "total":
+                STAGE_SECONDS.observe(seconds, stage)
+        pages = job.get("page_count")
+        if pages:
+            PAGES.inc(conversion_type, amount=pages)
+            if total > 0:
+                PAGE_RATE.observe(pages / total, conversion_type)
+
+
+def observe_sweep(summary):
+    """Adds a retention.sweep() summary to the aggregated metrics."""
+    with REGISTRY.lock:
+        RETENTION_FILES.inc(amount=summary["deleted_files"])
+        RETENTION_BYTES.inc(amount=summary["deleted_bytes"])
+        RETENTION_EXPIRED.inc(amount=summary["expired_jobs"])
@@ -0,0 +1,172 @@
+"""
+OCR for scanned statements. Pages are rasterised (PDFs) or loaded (images),
+run through tesseract's word-level box output (image_to_data) on a bounded
+thread pool, and returned as layout.Words in PDF points, so they go through
+the same line grouping and column bucketing as text extracted by pdfplumber.
+Results are cached on disk per page image hash, up to OCR_CACHE_MAX_MB
+(least recently used pages are evicted first).
+"""
+import functools
+import hashlib
+import json
+import os
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import pdfplumber
+import pytesseract
+from PIL import Image
+import metrics
+import result_cache
+from layout import Words
+from worker_pool import CONVERSION_WORKERS
+
+# OCR settings (override via environment)
+OCR_DPI = int(os.environ.get("OCR_DPI", "300"))
+# tesseract runs as a subprocess, so threads give real parallelism here. Every
+# conversion worker may be running OCR at once, so by default they share the CPUs.
+OCR_WORKERS = int(os.environ.get("OCR_WORKERS", max(1, (os.cpu_count() or 1) // CONVERSION_WORKERS)))
+OCR_LANG = os.environ.get("OCR_LANG", "eng")
+OCR_CONFIG = os.environ.get("OCR_CONFIG", "")
+OCR_CACHE_ENABLED = os.environ.get("OCR_CACHE", "1") != "0"
+OCR_CACHE_DIR = os.environ.get("OCR_CACHE_DIR", os.path.join("cache", "ocr"))
+OCR_CACHE_MAX_BYTES = int(os.environ.get("OCR_CACHE_MAX_MB", "256")) * 1024 * 1024
+
+# Set tesseract path if needed (e.g. Windows default)
+# pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
+
+# PDF user space units per inch: image pixels are scaled to points with 72 / dpi
+POINTS_PER_INCH = 72.0
+
+
+@functools.lru_cache(maxsize=1)
+def tesseract_version():
+    return str(pytesseract.get_tesseract_version())
+
+
+def page_hash(image, dpi):
+    # Same pixels, resolution and tesseract setup always give the same words
+    digest = hashlib.sha256()
+    digest.update(f"{tesseract_version()}:{OCR_LANG}:{OCR_CONFIG}:{dpi}:{image.mode}:{image.size}".encode())
+    digest.update(image.tobytes())
+    return digest.hexdigest()
+
+
+def ocr_image(image, dpi):
+    """Word boxes for one image as {"text", "x0", "x1", "top"} lists, in points."""
+    data = pytesseract.image_to_data(image, lang=OCR_LANG, config=OCR_CONFIG, output_type=pytesseract.Output.DICT)
+    scale = POINTS_PER_INCH / dpi
+    words = {"text": [], "x0": [], "x1": [], "top": []}
+    for text, conf, left, top, width in zip(data["text"], data["conf"], data["left"], data["top"], data["width"]):
+        # Block/paragraph/line rows carry conf -1 and no text
+        if not text.strip() or float(conf) < 0:
+            continue
+        words["text"].append(text)
+        words["x0"].append(left * scale)
+        words["x1"].append((left + width) * scale)
+        words["top"].append(top * scale)
+    return words
+
+
+def cached_ocr(image, dpi):
+    if not OCR_CACHE_ENABLED:
+        return ocr_image(image, dpi)
+
+    path = os.path.join(OCR_CACHE_DIR, f"{page_hash(image, dpi)}.json")
+    try:
+        with open(path) as f:
+            words = json.load(f)
+    except (OSError, ValueError):
+        words = None
+    if words is not None:
+        # A hit refreshes the page's LRU position
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return words
+
+    words = ocr_image(image, dpi)
+    try:
+        os.makedirs(OCR_CACHE_DIR, exist_ok=True)
+        tmp = os.path.join(OCR_CACHE_DIR, f".{uuid.uuid4().hex}.tmp")
+        with open(tmp, "w") as f:
+            json.dump(words, f)
+        os.replace(tmp, path)
+        result_cache.evict_lru(OCR_CACHE_DIR, ".json", OCR_CACHE_MAX_BYTES)
+    except OSError as e:
+        print(f"OCR cache store failed: {e}")
+    return words
+
+
+def image_words(image, dpi):
+    words = cached_ocr(image, dpi)
+    return Words(words["text"], words["x0"], words["x1"], words["top"])
+
+
+def iter_ocr_lines(images, layout_page, page_count, workers=None, progress=None):
+    """
+    Yields (page_index, layout_page(words)) for (image, dpi) pairs, in order.
+    At most 2 * workers pages are rasterised or in OCR at any time, so memory
+    stays bounded however long the document is.
+    """
+    workers = workers or OCR_WORKERS
+    pending = deque()
+    done = 0
+
+    def finish():
+        with metrics.span("extract"):
+            words = pending.popleft().result()
+        if progress:
+            progress("extract", done + 1, page_count)
+        with metrics.span("layout"):
+            return done, layout_page(words)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for image, dpi in images:
+            pending.append(executor.submit(image_words, image, dpi))
+            if len(pending) >= 2 * workers:
+                yield finish()
+                done += 1
+        while pending:
+            yield finish()
+            done += 1
+
+
+def rasterize_pages(pdf_path, dpi):
+    # pdfium is not thread-safe, so pages are rendered one at a time here
+    # and only the OCR itself is spread over the pool
+    with pdfplumber.open(pdf_path) as pdf:
+        for page in pdf.pages:
+            with metrics.span("render"):
+                image = page.to_image(resolution=dpi).original
+            yield image, dpi
+
+
+def iter_pdf_ocr_lines(pdf_path, layout_page, dpi=None, workers=None, progress=None):
+    """Same contract as pdf_extract.iter_page_lines, for PDFs without a text layer."""
+    dpi = dpi or OCR_DPI
+    with pdfplumber.open(pdf_path) as pdf:
+        page_count = len(pdf.pages)
+    return iter_ocr_lines(rasterize_pages(pdf_path, dpi), layout_page, page_count, workers, progress)
+
+
+def ocr_pdf_page(pdf_path, page_index, layout_page, dpi=None):
+    """layout_page(words) for one page of a PDF, OCRed: a scanned page in a document that otherwise has text."""
+    dpi = dpi or OCR_DPI
+    with pdfplumber.open(pdf_path) as pdf:
+        with metrics.span("render"):
+            image = pdf.pages[page_index].to_image(resolution=dpi).original
+    with metrics.span("extract"):
+        words = image_words(image, dpi)
+    with metrics.span("layout"):
+        return layout_page(words)
+
+
+def iter_image_ocr_lines(image_path, layout_page, progress=None):
+    """A single scanned image as a one-page document."""
+    image = Image.open(image_path)
+    # Scans usually record their resolution; otherwise assume OCR_DPI
+    dpi = float(image.info.get("dpi", (OCR_DPI,))[0]) or OCR_DPI
+    metrics.count("pages")
+    return iter_ocr_lines([(image, dpi)], layout_page, 1, workers=1, progress=progress)
@@ -0,0 +1,102 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+import pdfplumber
+import metrics
+from layout import Words
+from worker_pool import CONVERSION_WORKERS
+
+# Page-sharded extraction settings (override via environment)
+# PDF_EXTRACT_WORKERS=1 disables sharding and walks pages in-process. Every
+# conversion worker may be extracting at once, so by default they share the CPUs.
+PDF_EXTRACT_WORKERS = int(os.environ.get("PDF_EXTRACT_WORKERS", max(1, (os.cpu_count() or 1) // CONVERSION_WORKERS)))
+PAGES_PER_SHARD = int(os.environ.get("PDF_PAGES_PER_SHARD", "20"))
+
+def page_words(page):
+    words = Words.from_dicts(page.extract_words())
+    # pdfplumber keeps each page's parsed objects until the file is closed;
+    # drop them so memory stays flat however many pages the statement has
+    page.close()
+    return words
+
+
+def count_pages(pdf_path):
+    with pdfplumber.open(pdf_path) as pdf:
+        return len(pdf.pages)
+
+
+def _extract_shard(pdf_path, start, end, layout_page):
+    # Runs in a worker process: each shard opens the file itself
+    with pdfplumber.open(pdf_path) as pdf:
+        return [layout_page(page_words(pdf.pages[i])) for i in range(start, end)]
+
+
+def _abandon(executor):
+    # Stops shards nobody will read: queued ones are cancelled, running ones
+    # killed, without waiting for them (a job timeout must take effect now)
+    processes = list((getattr(executor, "_processes", None) or {}).values())
+    executor.shutdown(wait=False, cancel_futures=True)
+    for process in processes:
+        process.terminate()
+
+
+def iter_page_lines(pdf_path, layout_page, workers=None, page_count=None, progress=None):
+    """
+    Yields (page_index, lines) for every page, in page order.
+    layout_page(words) turns one page's layout.Words into that page's lines in
+    whatever shape the converter wants (usually rows of column text). It must
+    be picklable (a module-level function or a partial of one) so it can be
+    sent to worker processes, and should return plain lists so results are
+    cheap to send back.
+
+    Long PDFs are split into contiguous page ranges extracted in parallel.
+    Results are still yielded strictly in page order, so callers that carry
+    state from one page to the next (e.g. a transaction continuing over a page
+    break) behave exactly as with a sequential walk. Closing the generator
+    early (or an exception in it, such as the pool's job timeout) stops the
+    remaining shards at once.
+
+    progress(stage, done, total) is called with "extract" as each page is handed out.
+    """
+    workers = PDF_EXTRACT_WORKERS if workers is None else workers
+    if page_count is None:
+        with metrics.span("open"):
+            page_count = count_pages(pdf_path)
+    metrics.count("pages", page_count)
+
+    shard_count = min(workers, -(-page_count // PAGES_PER_SHARD))
+    if shard_count <= 1:
+        with metrics.span("open"):
+            pdf = pdfplumber.open(pdf_path)
+        with pdf:
+            for i, page in enumerate(pdf.pages):
+                with metrics.span("extract"):
+                    words = page_words(page)
+                with metrics.span("layout"):
+                    lines = layout_page(words)
+                if progress:
+                    progress("extract", i + 1, page_count)
+                yield i, lines
+        return
+
+    shard_size = -(-page_count // shard_count)
+    ranges = [(start, min(start + shard_size, page_count)) for start in range(0, page_count, shard_size)]
+
+    executor = ProcessPoolExecutor(max_workers=shard_count)
+    finished = False
+    try:
+        futures = [executor.submit(_extract_shard, pdf_path, start, end, layout_page) for start, end in ranges]
+        for (start, _), future in zip(ranges, futures):
+            # Shards extract and lay out their pages in worker processes; this
+            # process only sees the wait for each shard
+            with metrics.span("extract"):
+                shard = future.result()
+            for offset, lines in enumerate(shard):
+                if progress:
+                    progress("extract", start + offset + 1, page_count)
+                yield start + offset, lines
+        finished = True
+    finally:
+        if finished:
+            executor.shutdown()
+        else:
+            _abandon(executor)
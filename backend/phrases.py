@@ -0,0 +1,64 @@
+"""
+Multi-phrase matching for line filters. The phrases are compiled once into a
+single regex shaped like a character trie ("Page(?: Total)?|Opening..."), so
+at each position of a line the regex engine follows one branch per character
+instead of trying every phrase in turn: the cost of a search depends on the
+line, and stays flat as the phrase list grows.
+"""
+import re
+from collections import Counter
+
+
+def trie_regex(phrases):
+    """Regex source matching any of phrases; at a shared prefix the longest phrase wins."""
+    root = {}
+    for phrase in phrases:
+        node = root
+        for ch in phrase:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+    return _node_regex(root)
+
+
+def _node_regex(node):
+    branches = [re.escape(ch) + _node_regex(child) for ch, child in sorted(node.items()) if ch]
+    if not branches:
+        return ""
+    ends_here = "" in node
+    if len(branches) == 1 and not ends_here:
+        return branches[0]
+    return "(?:" + "|".join(branches) + ")" + ("?" if ends_here else "")
+
+
+class PhraseMatcher:
+    """
+    Finds the first of a fixed set of phrases in a line and counts which
+    phrase fired, so rules that never match can be spotted and pruned.
+    The matcher is shared by every job of its profile, so a job that wants
+    its own counts passes its own Counter as hits.
+    """
+
+    def __init__(self, phrases):
+        # Empty phrases would match every line
+        self.phrases = list(dict.fromkeys(p for p in phrases if p))
+        self.pattern = re.compile(trie_regex(self.phrases)) if self.phrases else None
+        self.hits = Counter()
+
+    def search(self, text, hits=None):
+        """The phrase found in text (leftmost), or None. Counts it in hits (default self.hits)."""
+        if self.pattern is None:
+            return None
+        match = self.pattern.search(text)
+        if match is None:
+            return None
+        phrase = match.group()
+        (self.hits if hits is None else hits)[phrase] += 1
+        return phrase
+
+    def report(self, hits=None):
+        """(phrase, hits) for every phrase, most hits first; phrases with 0 hits never fired."""
+        hits = self.hits if hits is None else hits
+        return sorted(((p, hits[p]) for p in self.phrases), key=lambda item: -item[1])
+
+    def reset(self):
+        self.hits.clear()
@@ -1,196 +1,283 @@
-import pdfplumber
-import pandas as pd
-import pytesseract
-from PIL import Image
 import os
 import re
 import time
-from rpt_parser import parse_rpt_file
+from collections import Counter
+from functools import partial
+from itertools import chain, islice
+import numpy as np
+import layout
+import metrics
+import ocr
+from rpt_parser import iter_rpt_rows, PROFILE as RPT_PROFILE
+from profiles import PROFILES
+from pdf_extract import iter_page_lines
+from progress import ProgressReporter
+from writers import get_writer
+from validation import BalanceValidator, write_checked, report_path
+from fingerprint import detect_conversion_type
 
-# Set tesseract path if needed (e.g. Windows default)
-# pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
+# Generic PDF column detection: pages sampled, minimum whitespace between
+# word midpoints that counts as a column boundary, and most boundaries kept
+DETECT_PAGES = 3
+COLUMN_GAP = 15
+MAX_COLUMN_BOUNDS = 6
 
-def process_bank_statement(file_path, job_id, jobs, output_dir, conversion_type="generic"):
+def process_bank_statement(file_path, job_id, jobs, output_dir, conversion_type="generic", output_format="xlsx"):
+    """Converts one statement, recording the job's stage timings (see metrics.py) in its record."""
+    with metrics.job_timings() as timings:
+        convert_statement(file_path, job_id, jobs, output_dir, conversion_type, output_format)
+    jobs[job_id].update(timings.job_fields())
+
+def convert_statement(file_path, job_id, jobs, output_dir, conversion_type="generic", output_format="xlsx"):
     try:
-        jobs[job_id]["status"] = "processing"
-        jobs[job_id]["progress"] = 10
-        jobs[job_id]["message"] = "Starting processing..."
+        jobs[job_id].update({
+            "status": "processing",
+            "progress": 10,
+            "message": "Starting processing...",
+            "output_format": output_format
+        })
+        output_ext = get_writer(output_format).extension
+
+        if conversion_type == "auto":
+            with metrics.span("detect"):
+                detected = detect_conversion_type(file_path)
+            conversion_type = detected["conversion_type"]
+            print(f"Job {job_id}: auto-detected {conversion_type} ({detected['reason']}, confidence {detected['confidence']})")
+            jobs[job_id].update({
+                "detected_type": conversion_type,
+                "detection_confidence": detected["confidence"]
+            })
+
+        progress = ProgressReporter(jobs, job_id)
 
         filename = os.path.basename(file_path)
         ext = os.path.splitext(filename)[1].lower()
         
-        # Explicit Conversion Types
-        if conversion_type == "jk_bank":
-             jobs[job_id]["message"] = "Using JK Bank Logic..."
+        # Layout profiles (profiles/*.json) name the converter engine to use
+        profile = PROFILES.get(conversion_type)
+        engine = profile.engine if profile else None
+        if profile:
+            jobs[job_id]["profile"] = profile.name
+
+        if engine == "pdf_columns":
+             jobs[job_id]["message"] = f"Using {profile.description or profile.name} layout..."
              from jk_processor import convert_pdf_to_excel
-             output_filename = f"{job_id}.xlsx"
+             output_filename = f"{job_id}{output_ext}"
              output_path = os.path.join(output_dir, output_filename)
              
              try:
-                 convert_pdf_to_excel(file_path, output_path)
-                 jobs[job_id]["status"] = "completed"
-                 jobs[job_id]["progress"] = 100
-                 jobs[job_id]["message"] = "Conversion complete"
-                 jobs[job_id]["output_file"] = output_path
+                 validator = BalanceValidator.for_profile(profile)
+                 row_count = convert_pdf_to_excel(file_path, output_path, progress, profile=profile, validator=validator)
+                 jobs[job_id].update({
+                     "status": "completed",
+                     "progress": 100,
+                     "message": "Conversion complete",
+                     "output_file": output_path,
+                     "output_header": True,
+                     "row_count": row_count,
+                     **balance_check_fields(validator, profile.columns, output_path)
+                 })
                  return
              except Exception as e:
-                 raise ValueError(f"JK Bank Conversion Failed: {str(e)}")
+                 raise ValueError(f"{profile.name} conversion failed: {str(e)}")
 
-        elif conversion_type == "rpt_pdf":
-             jobs[job_id]["message"] = "Using RPT PDF Logic..."
+        elif engine == "pdf_report":
+             jobs[job_id]["message"] = f"Using {profile.description or profile.name} layout..."
              from rpt_pdf_processor import convert_rpt_pdf_to_excel
-             output_filename = f"{job_id}.xlsx"
+             output_filename = f"{job_id}{output_ext}"
              output_path = os.path.join(output_dir, output_filename)
              
              try:
-                 row_count = convert_rpt_pdf_to_excel(file_path, output_path)
-                 jobs[job_id]["status"] = "completed"
-                 jobs[job_id]["progress"] = 100
-                 jobs[job_id]["message"] = f"Conversion complete: captured {row_count} transactions"
-                 jobs[job_id]["output_file"] = output_path
+                 validator = BalanceValidator.for_profile(profile)
+                 garbage_hits = Counter()
+                 row_count = convert_rpt_pdf_to_excel(file_path, output_path, progress, profile=profile, validator=validator,
+                                                      garbage_hits=garbage_hits)
+                 jobs[job_id].update({
+                     "status": "completed",
+                     "progress": 100,
+                     "message": f"Conversion complete: captured {row_count} transactions",
+                     "output_file": output_path,
+                     "output_header": True,
+                     "row_count": row_count,
+                     # Lines dropped per garbage phrase, 0 for phrases that never fired
+                     "garbage_hits": dict(profile.garbage.report(garbage_hits)),
+                     **balance_check_fields(validator, profile.columns, output_path)
+                 })
                  return
              except Exception as e:
-                 raise ValueError(f"RPT PDF Conversion Failed: {str(e)}")
+                 raise ValueError(f"{profile.name} conversion failed: {str(e)}")
 
-        elif conversion_type == "rpt":
+        elif engine == "text_report":
              jobs[job_id]["message"] = "Parsing RPT file..."
-             df = parse_rpt_file(file_path)
-             save_to_excel(df, job_id, jobs, output_dir)
+             save_rpt(file_path, job_id, jobs, output_dir, progress, output_format, profile)
              return
 
         else:
             # Generic / Auto-detect
             if ext == ".pdf":
-                process_generic_pdf(file_path, job_id, jobs, output_dir)
+                process_generic_pdf(file_path, job_id, jobs, output_dir, progress, output_format)
                 return
                             
             elif ext in [".jpg", ".jpeg", ".png"]:
                 jobs[job_id]["message"] = "Processing image (OCR)..."
-                text = pytesseract.image_to_string(Image.open(file_path))
-                lines = text.split('\n')
-                data = [line.split() for line in lines if line.strip()]
-                df = pd.DataFrame(data)
-                save_to_excel(df, job_id, jobs, output_dir)
+                pages = ocr.iter_image_ocr_lines(file_path, layout_page, progress=progress)
+                save_generic_pages(pages, job_id, jobs, output_dir, progress, output_format)
                 return
                 
             elif ext == ".rpt":
-                jobs[job_id]["message"] = "Parsing RPT file..."
-                df = parse_rpt_file(file_path)
-                save_to_excel(df, job_id, jobs, output_dir)
+                jobs[job_id].update({"message": "Parsing RPT file...", "profile": RPT_PROFILE.name})
+                save_rpt(file_path, job_id, jobs, output_dir, progress, output_format)
                 return
     
             else:
                 raise ValueError("Unsupported file format")
 
     except Exception as e:
-        jobs[job_id]["status"] = "failed"
-        jobs[job_id]["message"] = str(e)
+        jobs[job_id].update({"status": "failed", "message": str(e)})
         print(f"Error processing job {job_id}: {e}")
 
-def process_generic_pdf(file_path, job_id, jobs, output_dir):
-    all_rows = []
-    
-    with pdfplumber.open(file_path) as pdf:
-        total_pages = len(pdf.pages)
-        
-        # Step 1: Detect Columns (using first few pages)
-        col_bounds = detect_pdf_columns(pdf.pages[:3])
-        
-        for i, page in enumerate(pdf.pages):
-            if i % 5 == 0 or i == total_pages - 1:
-                progress = 10 + int((i / total_pages) * 80)
-                jobs[job_id]["progress"] = progress
-                jobs[job_id]["message"] = f"Processing page {i+1} of {total_pages}"
-            
-            words = page.extract_words()
-            if not words:
-                continue
-                
-            # Group by line
-            words.sort(key=lambda w: w['top'])
-            lines = []
-            current_line = []
-            last_top = 0
-            
-            for word in words:
-                if not current_line:
-                    current_line.append(word)
-                    last_top = word['top']
-                else:
-                    if abs(word['top'] - last_top) < 5: # Tolerance for same line
-                        current_line.append(word)
-                    else:
-                        lines.append(current_line)
-                        current_line = [word]
-                        last_top = word['top']
-            if current_line:
-                lines.append(current_line)
-            
-            # Bucket words into columns
-            for line_words in lines:
-                row = [""] * (len(col_bounds) + 1)
-                for word in line_words:
-                    x = (word['x0'] + word['x1']) / 2
-                    bucket = 0
-                    for bound in col_bounds:
-                        if x > bound:
-                            bucket += 1
-                        else:
-                            break
-                    row[bucket] += word['text'] + " "
-                
-                row = [c.strip() for c in row]
-                if any(row):
-                    all_rows.append(row)
-
-    if not all_rows:
-        raise ValueError("No text found in PDF")
-
-    # Basic cleanup and Header detection
-    df = pd.DataFrame(all_rows)
-    # Filter out potential repeated headers if they are same as first row
-    if len(df) > 1:
-        header = df.iloc[0].tolist()
-        # Simple heuristic: if a row is very similar to header, it's likely a repeated header
-        # But we'll just keep everything for now and let user see.
-        pass
-
-    save_to_excel(df, job_id, jobs, output_dir)
-
-def detect_pdf_columns(pages):
-    """Detect vertical column boundaries by finding gaps in X-coordinates."""
-    x_coords = []
-    for page in pages:
-        words = page.extract_words()
-        for w in words:
-            # Use midpoints to avoid being confused by slightly leaning text
-            x_coords.append((w['x0'] + w['x1']) / 2)
-    
-    if not x_coords:
-        return [100, 200, 300, 400] # Fallbacks
-        
-    x_coords.sort()
-    
+def save_rpt(file_path, job_id, jobs, output_dir, progress=None, output_format="xlsx", profile=RPT_PROFILE):
+    # Transactions stream from the parser straight into the output file
+    validator = BalanceValidator.for_profile(profile)
+    rows = iter_rpt_rows(file_path, progress, profile=profile, validator=validator)
+    save_rows(rows, job_id, jobs, output_dir, columns=profile.columns, progress=progress, output_format=output_format, validator=validator)
+
+def balance_check_fields(validator, columns, output_path):
+    """
+    Job record fields for an output whose rows went through validator (which
+    may be None), including the report file written next to a non-xlsx output.
+    """
+    fields = {"output_columns": list(columns) if columns else None}
+    if validator is not None:
+        fields["balance_check"] = validator.summary()
+        if not fields["balance_check"]["valid"]:
+            print(f"Balance check: {validator.mismatched} of {validator.checked} rows do not follow the running balance")
+        if os.path.exists(report_path(output_path)):
+            fields["balance_report_file"] = report_path(output_path)
+    return fields
+
+def process_generic_pdf(file_path, job_id, jobs, output_dir, progress=None, output_format="xlsx"):
+    pages = iter_page_lines(file_path, layout_page, progress=progress)
+
+    # Scanned statements have no text layer: rasterise and OCR them instead
+    head = list(islice(pages, DETECT_PAGES))
+    if head and not any(len(lines.words) for _, lines in head):
+        pages.close()
+        jobs[job_id]["message"] = "No text layer found, running OCR..."
+        pages = ocr.iter_pdf_ocr_lines(file_path, layout_page, progress=progress)
+    else:
+        pages = ocr_empty_pages(file_path, chain(head, pages))
+
+    save_generic_pages(pages, job_id, jobs, output_dir, progress, output_format, empty_error="No text found in PDF")
+
+def ocr_empty_pages(pdf_path, pages):
+    """(page_index, Lines) pairs, with pages that have no text (scanned into a text PDF) OCRed one at a time."""
+    for page_index, lines in pages:
+        if not len(lines.words):
+            lines = ocr.ocr_pdf_page(pdf_path, page_index, layout_page)
+        yield page_index, lines
+
+def save_generic_pages(pages, job_id, jobs, output_dir, progress=None, output_format="xlsx", empty_error=None):
+    """Detects columns on the first pages of (page_index, Lines) pairs and saves every page's rows."""
+    # Step 1: Detect Columns (using first few pages), from the same words the rows are built from
+    head = list(islice(pages, DETECT_PAGES))
+    with metrics.span("detect"):
+        detected = detect_pdf_columns([lines.words for _, lines in head])
+    print(f"Job {job_id}: {detected['column_count']} columns detected (confidence {detected['confidence']})")
+    jobs[job_id].update({
+        "column_count": detected["column_count"],
+        "column_confidence": detected["confidence"]
+    })
+
+    rows = metrics.timed("assemble", iter_generic_rows(chain(head, pages), detected["bounds"]))
+    save_rows(rows, job_id, jobs, output_dir, progress=progress, output_format=output_format, empty_error=empty_error)
+
+# Group by line, tolerance 5px for same line
+layout_page = partial(layout.group_lines, tolerance=5)
+
+def iter_generic_rows(pages, col_bounds):
+    """Rows of column text from (page_index, Lines) pairs, skipping empty lines."""
+    for i, lines in pages:
+        # Bucket words into columns by midpoint; a word exactly on a bound stays left of it
+        columns = layout.assign_columns(lines.words, col_bounds, edge="mid", side="left")
+        for row in layout.line_rows(lines, columns, len(col_bounds) + 1):
+            if any(row):
+                yield row
+
+def detect_pdf_columns(page_words):
+    """
+    Detect vertical column boundaries from the word midpoints of a few pages
+    (a list of layout.Words). Midpoints are projected onto a 1pt histogram and
+    every empty stretch wider than COLUMN_GAP is a candidate boundary; the
+    widest MAX_COLUMN_BOUNDS are kept. Linear in the number of words.
+
+    Returns {"bounds", "column_count", "confidence"}; confidence is the share
+    of words whose extent does not straddle a boundary (0.0 for the fallback).
+    """
+    words = [w for w in page_words if len(w)]
+    if not words:
+        return {"bounds": [100, 200, 300, 400], "column_count": 5, "confidence": 0.0} # Fallbacks
+
+    # Use midpoints to avoid being confused by slightly leaning text
+    x0 = np.concatenate([w.x0 for w in words])
+    x1 = np.concatenate([w.x1 for w in words])
+    mid = (x0 + x1) / 2
+
+    # Per 1pt bin: lowest and highest midpoint in it. Gaps over COLUMN_GAP can
+    # only fall between neighbouring occupied bins, so those are all we compare.
+    origin = np.floor(mid.min())
+    bins = (mid - origin).astype(int)
+    low = np.full(bins.max() + 1, np.inf)
+    high = np.full(bins.max() + 1, -np.inf)
+    np.minimum.at(low, bins, mid)
+    np.maximum.at(high, bins, mid)
+    occupied = np.flatnonzero(np.isfinite(low))
+    gap_after = high[occupied[:-1]]
+    gap_before = low[occupied[1:]]
+    gap_sizes = gap_before - gap_after
+
     # Find gaps
-    gaps = []
-    for i in range(len(x_coords) - 1):
-        gap_size = x_coords[i+1] - x_coords[i]
-        if gap_size > 15: # Threshold for a column gap
-            gaps.append((gap_size, (x_coords[i] + x_coords[i+1]) / 2))
-    
+    wide = np.flatnonzero(gap_sizes > COLUMN_GAP)
+    gaps = [(gap_sizes[i], (gap_after[i] + gap_before[i]) / 2) for i in wide.tolist()]
     gaps.sort(reverse=True)
     # Take top N gaps (likely column boundaries)
     # usually bank statements have 4-7 columns
-    bounds = sorted([g[1] for g in gaps[:6]])
-    return bounds
+    bounds = sorted([float(g[1]) for g in gaps[:MAX_COLUMN_BOUNDS]])
+
+    if not bounds:
+        return {"bounds": bounds, "column_count": 1, "confidence": 0.0}
+    edges = np.asarray(bounds)
+    straddling = ((x0[:, None] < edges) & (x1[:, None] > edges)).any(axis=1)
+    return {
+        "bounds": bounds,
+        "column_count": len(bounds) + 1,
+        "confidence": round(1 - float(straddling.mean()), 3)
+    }
 
-def save_to_excel(df, job_id, jobs, output_dir):
-    output_filename = f"{job_id}.xlsx"
+def save_rows(rows, job_id, jobs, output_dir, columns=None, progress=None, output_format="xlsx", empty_error=None, validator=None):
+    """
+    Streams rows into {job_id}.<ext> in output_format and marks the job completed.
+    If empty_error is given and no rows were produced, raises ValueError(empty_error) instead.
+    validator is the validation.BalanceValidator the rows were already checked by, if any.
+    """
+    writer = get_writer(output_format)
+    output_filename = f"{job_id}{writer.extension}"
     output_path = os.path.join(output_dir, output_filename)
     
-    df.to_excel(output_path, index=False, header=False) # Keep header=False as we might have headers in rows
+    # Keep header=False as we might have headers in rows
+    with metrics.span("write"):
+        row_count = write_checked(rows, output_path, columns=columns, header=False, progress=progress, validator=validator)
+    if row_count == 0 and empty_error:
+        os.remove(output_path)
+        raise ValueError(empty_error)
     
-    jobs[job_id]["status"] = "completed"
-    jobs[job_id]["progress"] = 100
-    jobs[job_id]["message"] = "Conversion complete"
-    jobs[job_id]["output_file"] = output_path
+    jobs[job_id].update({
+        "status": "completed",
+        "progress": 100,
+        "message": "Conversion complete",
+        "output_file": output_path,
+        "output_header": False,
+        "row_count": row_count,
+        **balance_check_fields(validator, columns, output_path)
+    })
+    return row_count
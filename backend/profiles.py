@@ -0,0 +1,156 @@
+"""
+Layout profile registry. Each bank/report layout is described by a JSON (or
+YAML, when PyYAML is installed) file in PROFILE_DIR: column x-ranges or
+character offsets, date regex, garbage phrases and header markers, plus the
+engine that reads it. Profiles are compiled once at import into regexes and
+boundary arrays, so the converters' per-line matching costs the same as the
+hand-coded constants it replaces. A new bank with the same kind of layout
+as an existing one only needs a new profile file; its "fingerprint" section
+lets auto-detection (fingerprint.py) pick it.
+"""
+import glob
+import json
+import os
+import re
+import numpy as np
+from phrases import PhraseMatcher
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+PROFILE_DIR = os.environ.get("LAYOUT_PROFILE_DIR", os.path.join(BACKEND_DIR, "profiles"))
+
+# Engines and the profile keys each one needs:
+#   pdf_columns - PDF rows bucketed by x into columns, merged per date (JK Bank)
+#   pdf_report  - report printed to PDF, new entry at a date on the far left (RPT in PDF)
+#   text_report - fixed-width text report sliced by character offsets (.RPT)
+ENGINES = {
+    "pdf_columns": ("columns", "column_bounds", "date_regex"),
+    "pdf_report": ("columns", "column_bounds", "bucket_columns", "date_regex"),
+    "text_report": ("columns", "column_offsets", "header_markers", "date_regex"),
+}
+
+# What a column can hold ("roles" maps them to column names). The engines find
+# their columns by role, so every profile must name the required ones; any
+# other columns are carried through as text.
+ROLES = ("date", "particulars", "reference", "withdrawals", "deposits", "balance")
+REQUIRED_ROLES = ("date", "particulars", "withdrawals", "deposits", "balance")
+
+
+class Profile:
+    """A compiled layout profile. Attributes mirror the file's keys."""
+
+    def __init__(self, spec, source=None):
+        self.source = source
+        self.name = spec["name"]
+        self.description = spec.get("description", "")
+        self.engine = spec["engine"]
+        if self.engine not in ENGINES:
+            raise ValueError(f"{source}: unknown engine '{self.engine}'")
+        missing = [key for key in ENGINES[self.engine] if key not in spec]
+        if missing:
+            raise ValueError(f"{source}: missing {', '.join(missing)}")
+
+        self.columns = list(spec["columns"])
+        # What each column holds (see ROLES)
+        self.roles = dict(spec.get("roles", {}))
+        unknown = [name for name in self.roles.values() if name not in self.columns]
+        if unknown:
+            raise ValueError(f"{source}: roles name unknown columns {', '.join(unknown)}")
+        missing = [role for role in REQUIRED_ROLES if role not in self.roles]
+        if missing:
+            raise ValueError(f"{source}: roles missing {', '.join(missing)}")
+        extra = [role for role in self.roles if role not in ROLES]
+        if extra:
+            raise ValueError(f"{source}: unknown roles {', '.join(extra)}; use {', '.join(ROLES)}")
+        self.date_pattern = re.compile(spec["date_regex"])
+
+        # PDF layouts
+        self.column_bounds = np.asarray(spec.get("column_bounds", []), dtype=float)
+        if np.any(np.diff(self.column_bounds) <= 0):
+            raise ValueError(f"{source}: column_bounds must be increasing")
+        self.column_edge = spec.get("column_edge", "x0")
+        self.bucket_columns = spec.get("bucket_columns") or self.columns
+        if self.engine != "text_report" and len(self.bucket_columns) != len(self.column_bounds) + 1:
+            raise ValueError(f"{source}: {len(self.column_bounds)} column_bounds need {len(self.column_bounds) + 1} columns")
+        self.text_columns = frozenset(spec.get("text_columns", []))
+        self.line_tolerance = spec.get("line_tolerance", 5)
+        self.line_anchor = spec.get("line_anchor", "first")
+        self.line_order = spec.get("line_order", "top")
+        self.entry_max_x0 = spec.get("entry_max_x0", 100)
+        self.carry_forward_marker = spec.get("carry_forward_marker")
+        self.carry_forward_max_x0 = spec.get("carry_forward_max_x0", 180)
+        self.opening_balance_marker = spec.get("opening_balance_marker")
+
+        # Text reports
+        self.column_offsets = {name: tuple(span) for name, span in spec.get("column_offsets", {}).items()}
+        self.min_header_markers = spec.get("min_header_markers", 3)
+        self.header_lookahead = spec.get("header_lookahead", 20)
+        self.date_lookahead = spec.get("date_lookahead", 9)
+
+        # pdf_columns: text each column must contain on a header row; text_report: marker -> column
+        self.header_markers = spec.get("header_markers", [])
+
+        self.garbage_phrases = list(spec.get("garbage_phrases", []))
+        # One trie-shaped regex for all phrases; also counts which phrase dropped each line
+        self.garbage = PhraseMatcher(self.garbage_phrases)
+
+        # Auto-detection (fingerprint.py): a header line carrying min_header_markers
+        # of header_markers, lines with the profile's dates, and any of its phrases.
+        # Defaults to the header markers and garbage phrases above.
+        fingerprint = spec.get("fingerprint", {})
+        self.detect_markers = list(fingerprint.get("header_markers", self.header_markers))
+        self.detect_min_markers = fingerprint.get("min_header_markers", spec.get("min_header_markers", len(self.detect_markers)))
+        self.detect_phrases = list(fingerprint.get("phrases", self.garbage_phrases))
+        # A file with one of these extensions is likelier to be this layout
+        self.detect_extensions = [ext.lower() for ext in fingerprint.get("extensions", [])]
+
+    def column(self, role):
+        """The column holding role (see ROLES), or None if the layout has none."""
+        return self.roles.get(role)
+
+    def is_garbage(self, line_text, hits=None):
+        return self.garbage.search(line_text, hits) is not None
+
+    def __repr__(self):
+        return f"Profile({self.name!r}, engine={self.engine!r})"
+
+
+def _read_spec(path):
+    if path.endswith((".yaml", ".yml")):
+        try:
+            import yaml
+        except ImportError:
+            print(f"Skipping layout profile {path}: PyYAML is not installed")
+            return None
+        with open(path) as f:
+            return yaml.safe_load(f)
+    with open(path) as f:
+        return json.load(f)
+
+
+def profile_files(profile_dir=None):
+    profile_dir = profile_dir or PROFILE_DIR
+    patterns = ("*.json", "*.yaml", "*.yml")
+    return sorted(p for pattern in patterns for p in glob.glob(os.path.join(profile_dir, pattern)))
+
+
+def load_profiles(profile_dir=None):
+    profiles = {}
+    for path in profile_files(profile_dir):
+        spec = _read_spec(path)
+        if spec is None:
+            continue
+        profile = Profile(spec, source=os.path.basename(path))
+        if profile.name in profiles:
+            raise ValueError(f"{profile.source}: duplicate profile name '{profile.name}'")
+        profiles[profile.name] = profile
+    return profiles
+
+
+PROFILES = load_profiles()
+
+
+def get_profile(name):
+    profile = PROFILES.get(name)
+    if profile is None:
+        raise ValueError(f"Unknown layout profile '{name}'")
+    return profile
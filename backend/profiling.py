@@ -0,0 +1,180 @@
+"""
+On-demand profiling of single conversions.
+
+A job is profiled when an admin asks for it on upload, or at random for a
+PROFILE_SAMPLE_RATE share of jobs. The decision is made before the job is
+queued: unprofiled jobs run exactly as before, so profiling costs nothing
+when it's off.
+
+A profiled job runs with a sampler thread that records the converting
+thread's stack every PROFILE_INTERVAL_MS. Unlike cProfile, which slowed
+the openpyxl-heavy writers several-fold, this leaves the job running at
+close to its normal speed. The samples are saved next to the job's output
+in two formats:
+
+    {job_id}.pstats     for pstats / snakeviz: own and cumulative time per
+                        function, with sample counts standing in for call counts
+    {job_id}.collapsed  one "frame;frame;frame count" line per stack, for
+                        flamegraph.pl / speedscope
+
+Work done in page-extraction worker processes (pdf_extract shards) isn't
+captured; set PDF_EXTRACT_WORKERS=1 to profile it in-process.
+"""
+import marshal
+import os
+import random
+import secrets
+import sys
+import threading
+import time
+from collections import Counter
+
+# Share of jobs profiled without being asked (0 to 1), and admin credentials
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_INTERVAL = float(os.environ.get("PROFILE_INTERVAL_MS", "5")) / 1000
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN")
+
+PROFILE_KINDS = {
+    "pstats": (".pstats", "application/octet-stream"),
+    "collapsed": (".collapsed", "text/plain"),
+}
+
+# Functions listed in the job record's summary, by own time
+TOP_FUNCTIONS = 15
+
+
+def is_admin(token):
+    """Whether token is the configured ADMIN_TOKEN (admin features are off without one)."""
+    return bool(ADMIN_TOKEN) and bool(token) and secrets.compare_digest(token, ADMIN_TOKEN)
+
+
+def should_profile(requested):
+    return requested or (PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE)
+
+
+def profile_path(output_dir, job_id, kind):
+    return os.path.join(output_dir, f"{job_id}{PROFILE_KINDS[kind][0]}")
+
+
+def _function(code):
+    return code.co_filename, code.co_firstlineno, code.co_name
+
+
+def _label(code):
+    # ";" separates frames in the collapsed format
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(";", ":")
+
+
+class StackSampler(threading.Thread):
+    """
+    Counts the stacks (tuples of code objects, outermost first) of one
+    thread, sampled every interval seconds. Stacks start at root_frame when
+    given (pool workers forked from the event loop carry its frames below).
+    """
+
+    def __init__(self, thread_id, interval=None, root_frame=None):
+        super().__init__(name="stack-sampler", daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval or PROFILE_INTERVAL
+        self.root_frame = root_frame
+        self.stacks = Counter()
+        self.elapsed = 0.0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        start = time.perf_counter()
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(frame.f_code)
+                if frame is self.root_frame:
+                    break
+                frame = frame.f_back
+            if stack:
+                self.stacks[tuple(reversed(stack))] += 1
+        self.elapsed = time.perf_counter() - start
+
+    @property
+    def sample_seconds(self):
+        # Waking up needs the GIL, so samples come at least interval apart;
+        # spread the measured wall time over them instead
+        samples = sum(self.stacks.values())
+        return self.elapsed / samples if samples else self.interval
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    def write_collapsed(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{';'.join(_label(code) for code in stack)} {count}\n")
+
+    def stats(self):
+        """
+        The samples as a pstats dict: {function: (samples, samples, own
+        seconds, cumulative seconds, {caller: (samples, samples, own, cumulative)})}.
+        """
+        stats = {}
+        sample_seconds = self.sample_seconds
+        for stack, count in self.stacks.items():
+            seconds = count * sample_seconds
+            leaf = len(stack) - 1
+            counted = set()
+            for depth, code in enumerate(stack):
+                function = _function(code)
+                entry = stats.setdefault(function, [0, 0, 0.0, 0.0, {}])
+                own = seconds if depth == leaf else 0.0
+                entry[2] += own
+                # Recursive functions count once per sample towards cumulative time
+                if function not in counted:
+                    counted.add(function)
+                    entry[0] += count
+                    entry[1] += count
+                    entry[3] += seconds
+                if depth:
+                    edge = entry[4].setdefault(_function(stack[depth - 1]), [0, 0, 0.0, 0.0])
+                    edge[0] += count
+                    edge[1] += count
+                    edge[2] += own
+                    edge[3] += seconds
+        return {
+            function: (cc, nc, tt, ct, {caller: tuple(edge) for caller, edge in callers.items()})
+            for function, (cc, nc, tt, ct, callers) in stats.items()
+        }
+
+    def write_pstats(self, path):
+        with open(path, "wb") as f:
+            marshal.dump(self.stats(), f)
+
+
+def top_functions(stats, limit=TOP_FUNCTIONS):
+    """[{"function", "samples", "own", "cumulative"}] for the functions with the most own time."""
+    rows = [
+        {"function": f"{name} ({os.path.basename(filename)}:{line})", "samples": nc, "own": round(tt, 4), "cumulative": round(ct, 4)}
+        for (filename, line, name), (_, nc, tt, ct, _) in stats.items()
+    ]
+    rows.sort(key=lambda row: row["own"], reverse=True)
+    return rows[:limit]
+
+
+def profile_job(job_id, jobs, output_dir, fn, *args):
+    """
+    Runs fn(*args) (a conversion of job_id) under the stack sampler, saves the
+    profiles in output_dir and records them in the job as "profiling".
+    """
+    sampler = StackSampler(threading.get_ident(), root_frame=sys._getframe())
+    sampler.start()
+    try:
+        return fn(*args)
+    finally:
+        sampler.stop()
+        record = {"samples": sum(sampler.stacks.values()), "interval_ms": round(sampler.sample_seconds * 1000, 2)}
+        for kind, write in (("collapsed", sampler.write_collapsed), ("pstats", sampler.write_pstats)):
+            record[kind] = profile_path(output_dir, job_id, kind)
+            write(record[kind])
+        record["top"] = top_functions(sampler.stats())
+        print(f"Job {job_id}: profiled, {record['samples']} stack samples")
+        if job_id in jobs:
+            jobs[job_id].update({"profiling": record})
@@ -0,0 +1,73 @@
+import time
+
+# Slice of the overall progress bar each conversion stage fills. Every
+# conversion path streams: PDF pages, OCR pages and report lines are
+# assembled, cleaned and written as they are read, so "extract" (pages, or a
+# text report's bytes) carries the job and "write" is finishing the file.
+# The assemble and clean stages are timed (metrics.py) but not reported here.
+STAGE_RANGES = {
+    "extract": (10, 90),
+    "write": (90, 99),
+}
+
+STAGE_LABELS = {
+    "extract": "Extracting",
+    "write": "Writing output",
+}
+
+# Minimum seconds between job-record writes within one stage
+PROGRESS_INTERVAL = 0.5
+
+
+def no_progress(stage, done=0, total=0, unit="pages"):
+    pass
+
+
+class ProgressReporter:
+    """
+    Callback passed into the converters as progress(stage, done, total, unit);
+    unit is "pages" or "rows", or "bytes" for a text report read in one pass.
+    Writes to the job record at most every `interval` seconds (plus on every
+    stage change), so calling it per page or per few hundred lines is free.
+    It only holds the job store and job_id, so it works unchanged inside pool
+    worker processes.
+    """
+
+    def __init__(self, jobs, job_id, interval=PROGRESS_INTERVAL):
+        self.jobs = jobs
+        self.job_id = job_id
+        self.interval = interval
+        self._stage = None
+        self._last_write = 0.0
+
+    def __call__(self, stage, done=0, total=0, unit="pages"):
+        now = time.monotonic()
+        if stage == self._stage and now - self._last_write < self.interval and done != total:
+            return
+        self._stage = stage
+        self._last_write = now
+
+        low, high = STAGE_RANGES.get(stage, (10, 99))
+        fraction = min(done / total, 1.0) if total else 0.0
+        label = STAGE_LABELS.get(stage, stage.capitalize())
+        if unit == "bytes" and total:
+            # Byte offsets aren't items; show how far through the file the parse is
+            message = f"Parsing report ({int(100 * fraction)}%)"
+        elif stage == "extract" and total:
+            message = f"Processing page {done} of {total}"
+        elif total and done:
+            message = f"{label} ({done} of {total})"
+        elif total:
+            message = f"{label} ({total} rows)"
+        else:
+            message = f"{label}..."
+
+        self.jobs[self.job_id].update({
+            "progress": low + int((high - low) * fraction),
+            "message": message,
+            "stage": stage,
+            "stage_done": done,
+            "stage_total": total,
+            "stage_unit": unit,
+            "updated_at": time.time()
+        })
@@ -0,0 +1,212 @@
+import functools
+import glob
+import hashlib
+import json
+import os
+import shutil
+import time
+import uuid
+
+# Result cache configuration (override via environment)
+CACHE_ENABLED = os.environ.get("RESULT_CACHE", "1") != "0"
+CACHE_DIR = os.environ.get("RESULT_CACHE_DIR", "cache")
+CACHE_MAX_BYTES = int(os.environ.get("RESULT_CACHE_MAX_MB", "1024")) * 1024 * 1024
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+# Where profiles.py reads layout profiles from. Globbed here rather than via
+# profiles.profile_files(): importing profiles would load numpy into the API process.
+PROFILE_DIR = os.environ.get("LAYOUT_PROFILE_DIR", os.path.join(BACKEND_DIR, "profiles"))
+PROFILE_PATTERNS = ("*.json", "*.yaml", "*.yml")
+
+# Source files whose logic determines conversion output. Any edit to these,
+# to a layout profile or to one of OUTPUT_SETTINGS changes parser_version()
+# and therefore every cache key.
+PARSER_SOURCES = [
+    "processor.py",
+    "jk_processor.py",
+    "rpt_pdf_processor.py",
+    "rpt_parser.py",
+    "pdf_extract.py",
+    "layout.py",
+    "ocr.py",
+    "fingerprint.py",
+    "profiles.py",
+    "phrases.py",
+    "validation.py",
+    "writers.py",
+]
+
+# Environment settings that change what a conversion writes (RPT amount signs,
+# balance-check flags and report, OCR words). Read here by name, like the
+# sources above, so the API process doesn't import the modules that use them.
+OUTPUT_SETTINGS = [
+    "RPT_SIGNED_AMOUNTS",
+    "VALIDATE_BALANCES",
+    "BALANCE_TOLERANCE",
+    "OCR_DPI",
+    "OCR_LANG",
+    "OCR_CONFIG",
+]
+
+
+@functools.lru_cache(maxsize=1)
+def parser_version():
+    digest = hashlib.sha256()
+    profiles = sorted(p for pattern in PROFILE_PATTERNS for p in glob.glob(os.path.join(PROFILE_DIR, pattern)))
+    paths = [os.path.join(BACKEND_DIR, name) for name in PARSER_SOURCES] + profiles
+    for path in paths:
+        with open(path, "rb") as f:
+            digest.update(os.path.basename(path).encode() + b"\0" + f.read())
+    for name in OUTPUT_SETTINGS:
+        digest.update(f"{name}={os.environ.get(name, '')}\0".encode())
+    return digest.hexdigest()[:16]
+
+
+def cache_key(content_sha256, conversion_type, extension="", output_format="xlsx"):
+    # The extension matters for generic conversions, which route on it
+    raw = f"{content_sha256}:{conversion_type}:{extension.lower()}:{output_format}:{parser_version()}"
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def _paths(key, cache_dir):
+    # The data file name is format-agnostic; the output format is part of the key
+    return os.path.join(cache_dir, f"{key}.data"), os.path.join(cache_dir, f"{key}.json")
+
+
+def _report_path(key, cache_dir):
+    # The balance check report of a non-xlsx output, if it had one
+    return os.path.join(cache_dir, f"{key}.report")
+
+
+def lookup(key, cache_dir=None):
+    """Returns the cached entry's metadata (row_count, output columns) or None. A hit refreshes its LRU position."""
+    if not CACHE_ENABLED:
+        return None
+    data_path, meta_path = _paths(key, cache_dir or CACHE_DIR)
+    try:
+        with open(meta_path) as f:
+            meta = json.load(f)
+        now = time.time()
+        os.utime(data_path, (now, now))
+    except (OSError, ValueError):
+        return None
+    return meta
+
+
+def _place(src, dest):
+    try:
+        os.link(src, dest)
+    except OSError:
+        shutil.copyfile(src, dest)
+
+
+def restore(key, dest_path, cache_dir=None, report_suffix=None):
+    """
+    Places the cached output file at dest_path (hard link when possible).
+    report_suffix (the entry's "balance_report_suffix") also places its
+    balance check report, named like dest_path with that suffix; returns its path.
+    Raises OSError, leaving nothing behind, if the entry was evicted meanwhile.
+    """
+    cache_dir = cache_dir or CACHE_DIR
+    data_path, _ = _paths(key, cache_dir)
+    _place(data_path, dest_path)
+    if not report_suffix:
+        return None
+    report_path = os.path.splitext(dest_path)[0] + report_suffix
+    try:
+        _place(_report_path(key, cache_dir), report_path)
+    except OSError:
+        os.remove(dest_path)
+        raise
+    return report_path
+
+
+def store(key, output_path, row_count, cache_dir=None, output_columns=None, output_header=False, profile=None, balance_check=None,
+          balance_report=None, detected_type=None, detection_confidence=None):
+    if not CACHE_ENABLED:
+        return
+    cache_dir = cache_dir or CACHE_DIR
+    os.makedirs(cache_dir, exist_ok=True)
+    data_path, meta_path = _paths(key, cache_dir)
+
+    # Write under temporary names and rename, so concurrent readers never see a partial entry
+    tmp = os.path.join(cache_dir, f".{uuid.uuid4().hex}.tmp")
+    shutil.copyfile(output_path, tmp)
+    os.replace(tmp, data_path)
+    report_suffix = None
+    if balance_report:
+        shutil.copyfile(balance_report, tmp)
+        os.replace(tmp, _report_path(key, cache_dir))
+        # What the report's name adds to the output's ({job_id}.csv -> {job_id}.balance_check.csv)
+        report_suffix = os.path.basename(balance_report)[len(os.path.splitext(os.path.basename(output_path))[0]):]
+    with open(tmp, "w") as f:
+        json.dump({
+            "row_count": row_count,
+            "output_columns": output_columns,
+            "output_header": output_header,
+            "profile": profile,
+            "detected_type": detected_type,
+            "detection_confidence": detection_confidence,
+            "balance_check": balance_check,
+            "balance_report_suffix": report_suffix,
+            "parser_version": parser_version()
+        }, f)
+    os.replace(tmp, meta_path)
+
+    evict(cache_dir=cache_dir)
+
+
+def evict(max_bytes=None, cache_dir=None):
+    """Deletes least recently used entries until the cache fits in max_bytes."""
+    cache_dir = cache_dir or CACHE_DIR
+    max_bytes = CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    evict_lru(cache_dir, ".data", max_bytes, lambda key: _paths(key, cache_dir) + (_report_path(key, cache_dir),))
+
+
+def evict_lru(directory, suffix, max_bytes, paths=None):
+    """
+    Deletes the least recently used (oldest mtime) *suffix files in directory
+    until they add up to max_bytes at most. paths(key) lists the files that
+    go with the entry whose file is key + suffix (just that file by default).
+    Shared by the result cache and the OCR page cache (ocr.py).
+    """
+    entries = []
+    total = 0
+    with os.scandir(directory) as it:
+        for entry in it:
+            if entry.name.endswith(suffix):
+                try:
+                    st = entry.stat()
+                except FileNotFoundError:
+                    # Evicted concurrently
+                    continue
+                entries.append((st.st_mtime, st.st_size, entry.name[:-len(suffix)]))
+                total += st.st_size
+
+    entries.sort()
+    for _, size, key in entries:
+        if total <= max_bytes:
+            break
+        for path in (paths(key) if paths else [os.path.join(directory, key + suffix)]):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        total -= size
+
+
+def convert_with_cache(file_path, job_id, jobs, output_dir, conversion_type, key, output_format="xlsx"):
+    """Runs process_bank_statement and stores a successful result under key."""
+    # The converters load in the pool workers (see worker_pool.preload), never in the API process
+    from processor import process_bank_statement
+
+    process_bank_statement(file_path, job_id, jobs, output_dir, conversion_type, output_format)
+    job = jobs.get(job_id)
+    if job and job.get("status") == "completed":
+        try:
+            store(key, job["output_file"], job.get("row_count"),
+                  output_columns=job.get("output_columns"), output_header=job.get("output_header", False), profile=job.get("profile"),
+                  balance_check=job.get("balance_check"), balance_report=job.get("balance_report_file"),
+                  detected_type=job.get("detected_type"), detection_confidence=job.get("detection_confidence"))
+        except OSError as e:
+            print(f"Result cache store failed for job {job_id}: {e}")
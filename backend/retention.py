@@ -0,0 +1,122 @@
+"""
+Retention of uploads and outputs. Nothing else deletes them, so without
+this the container's disk fills up under sustained load.
+
+Files are handled per owner: the job or batch id their name starts with
+({job_id}_{filename} uploads, and {job_id}.xlsx, {job_id}.csv,
+{job_id}.balance_check.csv, {job_id}.pstats, {batch_id}_zip.zip outputs). A sweep deletes owners whose
+files have not been used for OUTPUT_TTL. If the directories are still over
+STORAGE_MAX_BYTES, it then deletes the least recently used owners until they
+fit. "Used" is the newest mtime among an owner's files; downloads touch
+their file (touch()), as result_cache does for its entries.
+
+The sweep never deletes the files of a job that is still processing, or
+any file written in the last RETENTION_MIN_AGE seconds. The second rule
+covers batch downloads and format conversions that are being written. A
+completed job whose output goes is marked "expired", so /download can
+answer 410 rather than 404.
+"""
+import os
+import re
+import time
+
+# Retention configuration (override via environment)
+OUTPUT_TTL = float(os.environ.get("OUTPUT_TTL_SECONDS", str(12 * 3600)))
+STORAGE_MAX_BYTES = int(os.environ.get("STORAGE_MAX_MB", "2048")) * 1024 * 1024
+RETENTION_INTERVAL = float(os.environ.get("RETENTION_INTERVAL_SECONDS", "300"))
+RETENTION_MIN_AGE = float(os.environ.get("RETENTION_MIN_AGE_SECONDS", "900"))
+
+EXPIRED_MESSAGE = "The converted file has expired and was deleted, please convert the statement again"
+
+OWNER_ID = re.compile(r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}")
+
+
+def owner_of(filename):
+    """The job or batch id a file belongs to (its uuid prefix), or the file name itself."""
+    match = OWNER_ID.match(filename)
+    return match.group(0) if match else filename
+
+
+def touch(path):
+    """Marks a file as just used, moving its owner to the back of the eviction order."""
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+def remove_file(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _owners(directories):
+    """{owner: [(path, size, mtime)]} for the files in directories."""
+    owners = {}
+    for directory in directories:
+        try:
+            with os.scandir(directory) as it:
+                for entry in it:
+                    if not entry.is_file():
+                        continue
+                    st = entry.stat()
+                    owners.setdefault(owner_of(entry.name), []).append((entry.path, st.st_size, st.st_mtime))
+        except FileNotFoundError:
+            continue
+    return owners
+
+
+def expire_job(jobs, job_id, deleted_paths):
+    """Marks a completed job expired if its output file was among deleted_paths."""
+    job = jobs.get(job_id)
+    if job is None or job.get("status") != "completed":
+        return False
+    if os.path.abspath(job.get("output_file") or "") not in deleted_paths:
+        return False
+    jobs.update(job_id, {"status": "expired", "message": EXPIRED_MESSAGE, "expired_at": time.time()})
+    return True
+
+
+def sweep(directories, jobs, ttl=None, max_bytes=None, min_age=None):
+    """
+    One retention pass over directories (the upload and output dirs).
+    Returns {"deleted_files", "deleted_bytes", "expired_jobs", "kept_bytes"}.
+    """
+    ttl = OUTPUT_TTL if ttl is None else ttl
+    max_bytes = STORAGE_MAX_BYTES if max_bytes is None else max_bytes
+    min_age = RETENTION_MIN_AGE if min_age is None else min_age
+    now = time.time()
+
+    candidates = []
+    total = 0
+    for owner, files in _owners(directories).items():
+        size = sum(s for _, s, _ in files)
+        total += size
+        last_used = max(m for _, _, m in files)
+        if now - last_used < min_age:
+            continue
+        job = jobs.get(owner)
+        if job is not None and job.get("status") == "processing":
+            continue
+        candidates.append((last_used, size, owner, files))
+
+    # Expired first, then least recently used while over the quota
+    candidates.sort()
+    deleted = []
+    for last_used, size, owner, files in candidates:
+        if now - last_used < ttl and total <= max_bytes:
+            break
+        for path, _, _ in files:
+            remove_file(path)
+        total -= size
+        deleted.append((owner, size, [os.path.abspath(path) for path, _, _ in files]))
+
+    expired_jobs = sum(expire_job(jobs, owner, set(paths)) for owner, _, paths in deleted)
+    return {
+        "deleted_files": sum(len(paths) for _, _, paths in deleted),
+        "deleted_bytes": sum(size for _, size, _ in deleted),
+        "expired_jobs": expired_jobs,
+        "kept_bytes": total,
+    }
@@ -1,54 +1,63 @@
+import numpy as np
 import pandas as pd
 import re
 import os
+from itertools import chain, islice
+import metrics
+from profiles import get_profile
+from progress import no_progress
+from writers import iter_chunks
 
-def parse_rpt_file(file_path):
-    transactions = []
-    current_tx = None
-    
-    # Default Indices (Fallback)
-    col_indices = {
-        'Date': (0, 11),
-        'Particulars': (11, 45),
-        'Chq/Ref No.': (45, 65),
-        'Withdrawals': (65, 85),
-        'Deposits': (85, 105),
-        'Balance': (105, None)
-    }
+# "text_report" engine. Columns are found by their role (date, withdrawals,
+# deposits, balance); any others are text, joined over continuation lines.
+# profiles/rpt.json is the default layout.
+PROFILE = get_profile("rpt")
 
-    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-        lines = f.readlines()
+COLUMNS = PROFILE.columns
+
+# Default Indices (Fallback)
+DEFAULT_COL_INDICES = PROFILE.column_offsets
+
+# Column markers to help dynamic detection
+markers = PROFILE.header_markers
+
+date_pattern = PROFILE.date_pattern
 
-    # Column markers to help dynamic detection
-    markers = {
-        'DATE': 'Date',
-        'PARTICULARS': 'Particulars',
-        'CHQ.NO': 'Chq/Ref No.',
-        'WITHDRAWALS': 'Withdrawals',
-        'DEPOSITS': 'Deposits',
-        'BALANCE': 'Balance'
-    }
+# Look-ahead window: the header must be in the first HEADER_LOOKAHEAD lines,
+# and a sample date is searched for in the DATE_LOOKAHEAD lines after it
+HEADER_LOOKAHEAD = PROFILE.header_lookahead
+DATE_LOOKAHEAD = PROFILE.date_lookahead
 
-    date_pattern = re.compile(r'\d{2}-\d{2}-\d{4}')
+# Report 'Dr' amounts as negative numbers instead of dropping the marker
+SIGNED_AMOUNTS = os.environ.get("RPT_SIGNED_AMOUNTS", "0") == "1"
+
+def is_header_line(line, profile=PROFILE):
+    return sum(1 for m in profile.header_markers if m in line) >= profile.min_header_markers
+
+def detect_columns(head_lines, profile=PROFILE):
+    """Column slices for the report, from the header found in the look-ahead window."""
+    col_indices = dict(profile.column_offsets)
+    markers = profile.header_markers
+    date_col, particulars_col = profile.column("date"), profile.column("particulars")
 
     # Better Dynamic Detection
-    for line in lines[:20]:
-        if sum(1 for m in markers if m in line) >= 3:
+    for header_index, line in enumerate(head_lines[:profile.header_lookahead]):
+        if is_header_line(line, profile):
             all_found_markers = {m: line.find(m) for m in markers if line.find(m) != -1}
             sorted_markers = sorted([(pos, m) for m, pos in all_found_markers.items()])
-            
+
             new_indices = {}
             for i in range(len(sorted_markers)):
                 start_pos, marker = sorted_markers[i]
                 col_name = markers[marker]
-                
+
                 # col_start
                 if i == 0:
                     col_start = 0
                 else:
                     prev_end = sorted_markers[i-1][0] + len(sorted_markers[i-1][1])
                     col_start = (prev_end + start_pos) // 2
-                    
+
                 # col_end
                 if i == len(sorted_markers) - 1:
                     col_end = None
@@ -56,97 +65,181 @@ def parse_rpt_file(file_path):
                     this_end = start_pos + len(marker)
                     next_start = sorted_markers[i+1][0]
                     col_end = (this_end + next_start) // 2
-                
+
                 new_indices[col_name] = (col_start, col_end)
-            
+
             # Refine Date/Particulars boundary if Date detected at start
-            if 'Date' in new_indices and new_indices['Date'][0] == 0:
+            if date_col in new_indices and new_indices[date_col][0] == 0:
                 # Look for a date in the next few lines to see its actual end
-                for next_line in lines[lines.index(line)+1 : lines.index(line)+10]:
-                    match = date_pattern.search(next_line)
+                for next_line in head_lines[header_index+1 : header_index+1+profile.date_lookahead]:
+                    match = profile.date_pattern.search(next_line)
                     if match:
                         date_end = match.end()
                         # Date column should end slightly after the date match
-                        new_indices['Date'] = (0, date_end + 1)
-                        if 'Particulars' in new_indices:
-                             ps, pe = new_indices['Particulars']
-                             new_indices['Particulars'] = (date_end + 1, pe)
+                        new_indices[date_col] = (0, date_end + 1)
+                        if particulars_col in new_indices:
+                             ps, pe = new_indices[particulars_col]
+                             new_indices[particulars_col] = (date_end + 1, pe)
                         break
-            
+
             col_indices.update(new_indices)
             break
 
-    for line in lines:
-        if not line.strip():
-            continue
-            
-        def get_field(col_name):
-            if col_name not in col_indices:
-                 return ""
-            start, end = col_indices[col_name]
-            val = line[start:end].strip() if end else line[start:].strip()
-            return val
-
-        date_str = get_field('Date')
-        particulars = get_field('Particulars')
-        chq_no = get_field('Chq/Ref No.')
-        withdrawal_str = get_field('Withdrawals')
-        deposit_str = get_field('Deposits')
-        balance_str = get_field('Balance')
-
-        if sum(1 for m in markers if m in line) >= 3:
-            continue
-
-        if date_pattern.match(date_str):
-            if current_tx:
-                transactions.append(current_tx)
-            
-            current_tx = {
-                'Date': date_str,
-                'Particulars': particulars,
-                'Chq/Ref No.': chq_no,
-                'Withdrawals': parse_amount(withdrawal_str),
-                'Deposits': parse_amount(deposit_str),
-                'Balance': parse_amount(balance_str)
-            }
-        else:
-            if current_tx:
-                if particulars:
-                    current_tx['Particulars'] += " " + particulars
-                if chq_no:
-                    if not current_tx['Chq/Ref No.']:
-                        current_tx['Chq/Ref No.'] = chq_no
-                    else:
-                        current_tx['Chq/Ref No.'] += " " + chq_no
-                        
-                if withdrawal_str:
-                    amount = parse_amount(withdrawal_str)
-                    if amount != 0.0:
-                        current_tx['Withdrawals'] += amount
-
-                if deposit_str:
-                    amount = parse_amount(deposit_str)
-                    if amount != 0.0:
-                        current_tx['Deposits'] += amount
-                            
-                if balance_str:
-                    # Update balance (usually the last line of a txn has the correct running balance)
-                    current_tx['Balance'] = parse_amount(balance_str)
+    return col_indices
+
+def iter_raw_transactions(file_path, progress=None, profile=PROFILE):
+    """
+    Yields one raw transaction per entry in the report, reading the file line
+    by line. Only the look-ahead window used for column detection is buffered,
+    so memory stays flat however large the report is.
+    Fields are left as sliced text: amount columns hold the list of strings
+    seen for the entry (Balance keeps the last one); normalize_transactions()
+    turns a batch of them into values.
+    """
+    progress = progress or no_progress
+    file_size = os.path.getsize(file_path)
+    consumed = 0
+    current_tx = None
+    date_col, bal_col = profile.column("date"), profile.column("balance")
+    amount_cols = (profile.column("withdrawals"), profile.column("deposits"))
+    text_cols = [col for col in profile.columns if col not in (date_col, bal_col) + amount_cols]
+
+    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+        window = list(islice(f, profile.header_lookahead + profile.date_lookahead))
+        col_indices = detect_columns(window, profile)
+        # Where each column sits on a line; an undetected column slices to ""
+        spans = {col: slice(start, end or None) for col, (start, end) in col_indices.items()}
+        date_span, bal_span = spans.get(date_col, slice(0, 0)), spans.get(bal_col, slice(0, 0))
+        text_spans = [spans.get(col, slice(0, 0)) for col in text_cols]
+        amount_spans = [spans.get(col, slice(0, 0)) for col in amount_cols]
+
+        for line_index, line in enumerate(chain(window, f)):
+            consumed += len(line)
+            if line_index % 500 == 0:
+                progress("extract", consumed, file_size, "bytes")
+            if not line.strip():
+                continue
+
+            date_str = line[date_span].strip()
+            texts = [line[span].strip() for span in text_spans]
+            amounts = [line[span].strip() for span in amount_spans]
+            balance_str = line[bal_span].strip()
+
+            if is_header_line(line, profile):
+                continue
+
+            if profile.date_pattern.match(date_str):
+                if current_tx:
+                    yield current_tx
+
+                current_tx = dict(zip(text_cols, texts))
+                current_tx[date_col] = date_str
+                current_tx[bal_col] = balance_str
+                for col, value in zip(amount_cols, amounts):
+                    current_tx[col] = [value]
+            else:
+                if current_tx:
+                    for col, value in zip(text_cols, texts):
+                        if value:
+                            current_tx[col] = current_tx[col] + " " + value if current_tx[col] else value
 
+                    # Continuation amounts are added to the entry's totals
+                    for col, value in zip(amount_cols, amounts):
+                        if value:
+                            current_tx[col].append(value)
+
+                    if balance_str:
+                        # Update balance (usually the last line of a txn has the correct running balance)
+                        current_tx[bal_col] = balance_str
+
+    progress("extract", file_size, file_size, "bytes")
     if current_tx:
-        transactions.append(current_tx)
+        yield current_tx
+
+# What float() accepts once everything but digits, dots and minus signs is removed
+NUMBER_PATTERN = r'-?(\d+\.?\d*|\.\d+)'
+
+def parse_amounts(values, signed=False):
+    """
+    Vectorised parse_amount over a Series of strings: keeps digits, dots and
+    minus signs ('1,234.50Cr' -> 1234.5), anything unparseable becomes 0.0.
+    With signed=True, amounts marked 'Dr' come out negative.
+    """
+    values = values.fillna("").astype(str)
+    # Fast path: strip the usual decorations with literal replaces. Anything
+    # still not a plain number gets the full regex clean-up.
+    cleaned = values.str.replace(',', '', regex=False).str.replace('Cr', '', regex=False).str.replace('Dr', '', regex=False)
+    valid = cleaned.str.fullmatch(NUMBER_PATTERN).to_numpy(dtype=bool, copy=True)
+    retry = ~valid & (cleaned != "").to_numpy(dtype=bool)
+    if retry.any():
+        cleaned[retry] = cleaned[retry].str.replace(r'[^\d.-]', '', regex=True)
+        valid[retry] = cleaned[retry].str.fullmatch(NUMBER_PATTERN).to_numpy(dtype=bool)
 
-    df = pd.DataFrame(transactions)
-    columns = ['Date', 'Particulars', 'Chq/Ref No.', 'Withdrawals', 'Deposits', 'Balance']
-    df = df[columns] if not df.empty else pd.DataFrame(columns=columns)
-    
-    if not df.empty:
-        df['Particulars'] = df['Particulars'].apply(lambda x: re.sub(r'\s+', ' ', str(x)).strip() if x else "")
-        df['Chq/Ref No.'] = df['Chq/Ref No.'].apply(lambda x: re.sub(r'\s+', ' ', str(x)).strip() if x else "")
+    # Only strings float() would accept are converted; casting just those is
+    # much cheaper than pd.to_numeric(errors='coerce') over everything
+    amounts = np.zeros(len(values))
+    amounts[valid] = cleaned[valid].astype(float).to_numpy()
+    if signed:
+        is_dr = values.str.contains('Dr', regex=False).to_numpy(dtype=bool)
+        amounts[is_dr] = -np.abs(amounts[is_dr])
+    return amounts
+
+def collapse_whitespace(values):
+    return values.fillna("").astype(str).str.replace(r'\s+', ' ', regex=True).str.strip()
+
+def normalize_transactions(raw_transactions, signed=False, profile=PROFILE):
+    """Turns a batch of raw transactions into a DataFrame of the profile's columns, a column at a time."""
+    date_col, bal_col = profile.column("date"), profile.column("balance")
+    amount_cols = (profile.column("withdrawals"), profile.column("deposits"))
+    df = pd.DataFrame(raw_transactions, columns=profile.columns)
+    if df.empty:
+        return df
+
+    for col in profile.columns:
+        if col not in (date_col, bal_col) + amount_cols:
+            df[col] = collapse_whitespace(df[col])
+    df[bal_col] = parse_amounts(df[bal_col], signed)
+
+    # Entries can carry amounts over several lines: parse them all in one pass,
+    # then add each back onto its entry in line order
+    for col in amount_cols:
+        parts = df[col].explode()
+        amounts = parse_amounts(parts, signed)
+        totals = np.zeros(len(df))
+        np.add.at(totals, parts.index.to_numpy(), amounts)
+        df[col] = totals
 
     return df
 
-def parse_amount(amount_str):
+def iter_rpt_rows(file_path, progress=None, signed=None, profile=PROFILE, validator=None):
+    """
+    Yields one row per entry in the report, as a tuple in the profile's column order.
+    Entries are assembled line by line and normalised CHUNK_SIZE at a time,
+    so memory stays flat. signed defaults to SIGNED_AMOUNTS.
+    A validation.BalanceValidator, if given, checks each chunk on the way.
+    """
+    signed = SIGNED_AMOUNTS if signed is None else signed
+    for chunk in metrics.timed("assemble", iter_chunks(iter_raw_transactions(file_path, progress, profile))):
+        with metrics.span("clean"):
+            df = normalize_transactions(chunk, signed, profile)
+        if validator:
+            with metrics.span("validate"):
+                validator.check_frame(df)
+        yield from df.itertuples(index=False, name=None)
+
+def parse_rpt_file(file_path, progress=None, signed=None, profile=PROFILE):
+    signed = SIGNED_AMOUNTS if signed is None else signed
+    chunks = metrics.timed("assemble", iter_chunks(iter_raw_transactions(file_path, progress, profile)))
+    frames = []
+    for chunk in chunks:
+        with metrics.span("clean"):
+            frames.append(normalize_transactions(chunk, signed, profile))
+    if not frames:
+        return pd.DataFrame(columns=profile.columns)
+    return pd.concat(frames, ignore_index=True)
+
+def parse_amount(amount_str, signed=False):
+    """Single-value form of parse_amounts()."""
     if not amount_str:
         return 0.0
     try:
@@ -154,15 +247,16 @@ def parse_amount(amount_str):
         # Handle Dr/Cr by checking for 'Dr' or 'Cr'
         is_dr = 'Dr' in str(amount_str)
         is_cr = 'Cr' in str(amount_str)
-        
+
         clean_val = re.sub(r'[^\d.-]', '', str(amount_str))
         if not clean_val or clean_val == "." or clean_val == "-":
             return 0.0
-        
+
         val = float(clean_val)
         # Note: In bank statements, Dr usually means negative balance (overdraft) or withdrawal.
-        # But we'll just keep it positive and let the user decide. 
-        # Actually, let's keep it as is for now.
+        # By default we keep it positive and let the user decide; signed=True makes it negative.
+        if signed and is_dr:
+            return -abs(val)
         return val
     except ValueError:
         return 0.0
@@ -1,136 +1,146 @@
-import pdfplumber
 import pandas as pd
-import re
-import os
+from collections import Counter
+from functools import partial
+import layout
+import metrics
+from pdf_extract import iter_page_lines
+from profiles import get_profile
+from progress import no_progress
+from writers import iter_chunks
+from validation import write_checked
+
+# "pdf_report" engine. The date and amount columns are found by their role;
+# words go to columns through bucket_columns. profiles/rpt_pdf.json is the
+# default layout.
+PROFILE = get_profile("rpt_pdf")
+
+COLUMNS = PROFILE.columns
+
+# x0 boundaries: words left of 120 are dropped, then PARTICULARS, WITHDRAWALS,
+# DEPOSITS and BALANCE (column indices 1-4, see the profile's bucket_columns)
+COL_BOUNDS = PROFILE.column_bounds
 
 # Phrases that indicate a line is NOT a valid transaction part
-IGNORE_PHRASES = [
-    "Transaction Details",
-    "Printed By",
-    "TO:",
-    "M/S..",
-    "CITY CHOWK",
-    "POONCH",
-    "cKYC Id",
-    "No Nomination",
-    "STATEMENT OF ACCOUNT",
-    "DATE PARTICULARS",
-    "Unless the constituent",
-    "immediately of any discrepancy",
-    "by him in this statement",
-    "it will be taken that",
-    "the account correct",
-    "JAMMU AND KASHMIR BANK",
-    "IFSC Code",
-    "PHONE Code",
-    "TYPE: CASH CREDIT",
-    "A/C NO:",
-    "https://",
-    "Date Stamp Manager",
-    "----------------"
-]
-
-def is_date(text):
-    return bool(re.match(r'\d{2}-\d{2}-\d{4}', text))
-
-def is_garbage(line_text):
-    for phrase in IGNORE_PHRASES:
-        if phrase in line_text:
-            return True
-    return False
-
-def parse_pdf_rpt_logic(pdf_path):
+IGNORE_PHRASES = PROFILE.garbage_phrases
+
+def is_date(text, profile=PROFILE):
+    return bool(profile.date_pattern.match(text))
+
+def is_garbage(line_text, profile=PROFILE):
+    return profile.is_garbage(line_text)
+
+def page_lines(profile, words):
+    """Per line: (texts, x0s, columns) lists, words in (top, x0) order."""
+    # Sort order: top, then x0; a word within 5px of the previous one continues the line
+    lines = layout.group_lines(words, profile.line_tolerance, anchor=profile.line_anchor, order=profile.line_order)
+    columns = layout.assign_columns(lines.words, profile.column_bounds, edge=profile.column_edge, side="right")
+    text, x0, columns = lines.words.text.tolist(), lines.words.x0.tolist(), columns.tolist()
+    return [(text[span], x0[span], columns[span]) for span in lines]
+
+def iter_pdf_rpt_transactions(pdf_path, progress=None, profile=PROFILE, hits=None):
     """
     RPT IN PDF Logic:
     Takes items or particulars where a date is mentioned.
     If a row starts with a date at the extreme left, it's a new transaction.
     Does NOT stop at 'Page Total' - captures everything with a valid transaction pattern.
+    Yields each transaction as soon as the next one starts.
+    Dropped garbage lines are counted per phrase in hits, if given.
     """
-    transactions = []
+    pages = iter_page_lines(pdf_path, partial(page_lines, profile), progress=progress)
+    return iter_page_transactions(pages, profile, hits)
+
+def iter_page_transactions(pages, profile=PROFILE, hits=None):
+    """Assembles transactions from (page_index, page_lines()) pairs in page order."""
     current_tx = None 
+    date_column = profile.column("date")
+    bf_marker = profile.carry_forward_marker
     
-    with pdfplumber.open(pdf_path) as pdf:
-        for i, page in enumerate(pdf.pages):
-            words = page.extract_words()
-            # Sort order: top, then x0
-            words.sort(key=lambda w: (round(w['top']), w['x0']))
-            
-            # Group into lines
-            lines = []
-            if not words:
+    # Pages may be extracted in parallel, but lines arrive in page order, so a
+    # transaction that continues over a page break is still stitched onto current_tx
+    for page_index, lines in pages:
+        for texts, x0s, columns in lines:
+            line_text = " ".join(texts)
+            if profile.is_garbage(line_text, hits):
                 continue
+
+            # Detect New Transaction based on Date at Extreme Left
+            first_text, first_x0 = texts[0], x0s[0]
+            first_is_date = is_date(first_text, profile)
+            has_date = False
+            is_bf = bool(bf_marker) and bf_marker in line_text and "Balance" not in line_text
+            
+            if (first_x0 < profile.entry_max_x0 and first_is_date) or (is_bf and first_x0 < profile.carry_forward_max_x0):
+                has_date = True
+            
+            if has_date:
+                if current_tx:
+                    yield current_tx
                 
-            current_line = [words[0]]
-            for w in words[1:]:
-                if abs(w['top'] - current_line[-1]['top']) < 5:
-                    current_line.append(w)
-                else:
-                    lines.append(current_line)
-                    current_line = [w]
-            if current_line:
-                lines.append(current_line)
-
-            for line in lines:
-                line_text = " ".join([w['text'] for w in line])
-                if is_garbage(line_text):
-                    continue
-
-                # Detect New Transaction based on Date at Extreme Left
-                first_word = line[0]
-                has_date = False
-                is_bf = "B/F" in line_text and "Balance" not in line_text
-                
-                if (first_word['x0'] < 100 and is_date(first_word['text'])) or (is_bf and first_word['x0'] < 180):
-                    has_date = True
-                
-                if has_date:
-                    if current_tx:
-                        transactions.append(current_tx)
-                    
-                    current_tx = {
-                        "DATE": first_word['text'] if not is_bf else "B/F",
-                        "PARTICULARS": "",
-                        "CHQ/REF": "",
-                        "WITHDRAWALS": "",
-                        "DEPOSITS": "",
-                        "BALANCE": ""
-                    }
-                    start_idx = 1 if is_date(first_word['text']) else 0
-                    process_line_content(line[start_idx:], current_tx)
-                else:
-                    if current_tx:
-                        process_line_content(line, current_tx)
-        
-        if current_tx:
-            transactions.append(current_tx)
-
-    return transactions
-
-def process_line_content(line_words, tx):
-    for w in line_words:
-        x = w['x0']
-        text = w['text']
-        
-        if 120 <= x < 330:
-             tx["PARTICULARS"] += " " + text
-        elif 330 <= x < 410:
-             tx["WITHDRAWALS"] += text
-        elif 410 <= x < 480:
-             tx["DEPOSITS"] += text
-        elif x >= 480:
-             tx["BALANCE"] += text
+                current_tx = dict.fromkeys(profile.columns, "")
+                current_tx[date_column] = first_text if not is_bf else bf_marker
+                start_idx = 1 if first_is_date else 0
+                process_line_content(texts[start_idx:], columns[start_idx:], current_tx, profile)
+            else:
+                if current_tx:
+                    process_line_content(texts, columns, current_tx, profile)
+    
+    if current_tx:
+        yield current_tx
+
+def process_line_content(texts, columns, tx, profile=PROFILE):
+    bucket_columns = profile.bucket_columns
+    text_columns = profile.text_columns
+    for text, column in zip(texts, columns):
+        name = bucket_columns[column]
+        if name is None:
+            continue
+        if name in text_columns:
+             tx[name] += " " + text
+        else:
+             tx[name] += text
             
-    tx["PARTICULARS"] = tx["PARTICULARS"].strip()
+    for name in text_columns:
+        tx[name] = tx[name].strip()
 
-def convert_rpt_pdf_to_excel(pdf_path, excel_path):
-    transactions = parse_pdf_rpt_logic(pdf_path)
-    df = pd.DataFrame(transactions)
-    
-    # Clean Numeric Columns
-    for col in ["WITHDRAWALS", "DEPOSITS", "BALANCE"]:
-        if col in df.columns:
-            df[col] = df[col].astype(str).str.replace(r'Cr', '', regex=False).str.replace(r'Dr', '', regex=False).str.replace(r',', '', regex=False)
-            df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
-
-    df.to_excel(excel_path, index=False)
-    return len(df)
+def iter_clean_rows(transactions, profile=PROFILE, validator=None):
+    """
+    Cleans numeric columns a chunk at a time (vectorised) and yields rows in column order.
+    A validation.BalanceValidator, if given, checks each chunk on the way.
+    """
+    for chunk in iter_chunks(transactions):
+        with metrics.span("clean"):
+            df = pd.DataFrame(chunk, columns=profile.columns)
+
+            # Clean Numeric Columns (withdrawals, deposits, balance)
+            for col in (profile.column("withdrawals"), profile.column("deposits"), profile.column("balance")):
+                df[col] = df[col].astype(str).str.replace(r'Cr', '', regex=False).str.replace(r'Dr', '', regex=False).str.replace(r',', '', regex=False)
+                df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
+
+        if validator:
+            with metrics.span("validate"):
+                validator.check_frame(df)
+        yield from df.itertuples(index=False, name=None)
+
+def convert_rpt_pdf_to_excel(pdf_path, excel_path, progress=None, profile=PROFILE, validator=None, garbage_hits=None):
+    """
+    The output format follows excel_path's extension (.xlsx, .csv, .jsonl, .parquet).
+    A validation.BalanceValidator, if given, checks the rows on the way (see write_checked).
+    The lines each garbage phrase dropped are counted in garbage_hits (a Counter), if given.
+    """
+    progress = progress or no_progress
+    # This job's own counts: the profile's matcher is shared with concurrent jobs
+    hits = Counter() if garbage_hits is None else garbage_hits
+    transactions = metrics.timed("assemble", iter_pdf_rpt_transactions(pdf_path, progress, profile, hits))
+    rows = iter_clean_rows(transactions, profile, validator)
+    with metrics.span("write"):
+        row_count = write_checked(rows, excel_path, columns=profile.columns, progress=progress, validator=validator)
+    log_garbage_hits(profile, hits)
+    return row_count
+
+def log_garbage_hits(profile, hits):
+    report = profile.garbage.report(hits)
+    if not report:
+        return
+    top = ", ".join(f"{phrase!r} x{count}" for phrase, count in report[:5] if count)
+    never = sum(1 for _, count in report if not count)
+    print(f"{profile.name}: dropped {sum(hits.values())} garbage lines ({top or 'none'}); {never} of {len(report)} phrases never fired")
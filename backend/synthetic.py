@@ -0,0 +1,193 @@
+"""
+Synthetic statements for benchmarks, in the layouts the converters read:
+fixed-width .RPT reports, JK Bank PDF statements and RPT-style reports
+printed to PDF. Amounts are random but every running balance adds up, so a
+conversion's balance check (validation.py) must come out valid.
+
+The PDFs are written directly (plain Helvetica text placed at the x/top
+positions the layout profiles bucket by), so no PDF library is needed.
+"""
+import random
+from datetime import date, timedelta
+
+PAYEES = ["SURESH KUMAR", "AJAY GUPTA", "KASHISH TRADERS", "RAMEN STORES", "CHARAN DASS",
+          "CHOLAMANDALAM FINANCE", "GUPTA SHOE CENTRE", "SANDEEP KUMAR", "MUKESH VERMA"]
+MODES = ["UPI/OFUS", "IMPS", "NEFT", "mTFR", "REV"]
+
+OPENING_BALANCE = 500000.0
+START_DATE = date(2025, 4, 1)
+
+# Page geometry (points) and text size of the generated PDFs
+PAGE_WIDTH = 842
+PAGE_HEIGHT = 1191
+FONT_SIZE = 9
+PAGE_TOP = 120
+PAGE_BOTTOM = 1130
+ROW_HEIGHT = 27
+CONTINUATION_OFFSET = 12
+
+# x0 of each column's text; see profiles/jk_bank.json and profiles/rpt_pdf.json
+JK_X = {"date": 37, "particulars": 181, "withdrawals": 470, "deposits": 614, "balance": 711}
+RPT_PDF_X = {"date": 30, "particulars": 125, "withdrawals": 340, "deposits": 415, "balance": 490}
+
+
+def iter_transactions(count, seed=7):
+    """
+    Yields count transactions as dicts: date, particulars, continuation (a
+    second particulars line, or ""), reference, withdrawal, deposit (one of
+    them 0.0) and the balance after it.
+    """
+    rng = random.Random(seed)
+    balance = OPENING_BALANCE
+    day = START_DATE
+    for _ in range(count):
+        if rng.random() < 0.3:
+            day += timedelta(days=1)
+        amount = round(rng.uniform(1, 50000), 2)
+        deposit = amount if rng.random() < 0.5 or balance < amount else 0.0
+        withdrawal = 0.0 if deposit else amount
+        balance = round(balance + deposit - withdrawal, 2)
+        reference = str(rng.randint(10 ** 11, 10 ** 12 - 1))
+        payee = rng.choice(PAYEES)
+        yield {
+            "date": day,
+            "particulars": f"{rng.choice(MODES)}/{reference}/{'CR' if deposit else 'DR'}",
+            "continuation": payee if rng.random() < 0.5 else "",
+            "reference": reference,
+            "withdrawal": withdrawal,
+            "deposit": deposit,
+            "balance": balance,
+        }
+
+
+def _amount(value):
+    return f"{value:,.2f}" if value else ""
+
+
+def make_rpt(path, count, seed=7):
+    """A fixed-width report in profiles/rpt.json's column layout. Returns the line count."""
+    lines = 1
+    with open(path, "w") as f:
+        f.write(f"{'DATE':<11}{'PARTICULARS':<34}{'CHQ.NO':<20}{'WITHDRAWALS':>20}{'DEPOSITS':>20}{'BALANCE':>20}\n")
+        for tx in iter_transactions(count, seed):
+            f.write(f"{tx['date']:%d-%m-%Y} {tx['particulars']:<34}{tx['reference']:<20}"
+                    f"{_amount(tx['withdrawal']):>20}{_amount(tx['deposit']):>20}{tx['balance']:>20,.2f}\n")
+            lines += 1
+            if tx["continuation"]:
+                f.write(f"{'':<11}{tx['continuation']:<34}\n")
+                lines += 1
+    return lines
+
+
+def _paginate(entries):
+    """
+    Lays (height, words, balance) entries out on pages. Yields (words,
+    balance brought forward) per page; words are (x, top, text).
+    """
+    page = []
+    top = PAGE_TOP
+    brought_forward = carried = OPENING_BALANCE
+    for height, words, balance in entries:
+        if page and top + height > PAGE_BOTTOM:
+            yield page, brought_forward
+            page = []
+            top = PAGE_TOP
+            brought_forward = carried
+        page.extend((x, top + dy, text) for x, dy, text in words)
+        top += height
+        carried = balance
+    if page:
+        yield page, brought_forward
+
+
+def _statement_entries(count, seed, x, date_format, balance_suffix):
+    for tx in iter_transactions(count, seed):
+        words = [(x["date"], 0, format(tx["date"], date_format)), (x["particulars"], 0, tx["particulars"])]
+        if tx["withdrawal"]:
+            words.append((x["withdrawals"], 0, _amount(tx["withdrawal"])))
+        if tx["deposit"]:
+            words.append((x["deposits"], 0, _amount(tx["deposit"])))
+        words.append((x["balance"], 0, _amount(tx["balance"]) + balance_suffix))
+        if tx["continuation"]:
+            words.append((x["particulars"], CONTINUATION_OFFSET, tx["continuation"]))
+        yield ROW_HEIGHT, words, tx["balance"]
+
+
+def make_jk_pdf(path, count, seed=7):
+    """A JK Bank statement (profiles/jk_bank.json) with a header row on every page. Returns the page count."""
+    header = [(JK_X[key], PAGE_TOP - 2 * ROW_HEIGHT, text) for key, text in (
+        ("date", "Date"), ("particulars", "Particulars"), ("withdrawals", "Withdrawals"),
+        ("deposits", "Deposits"), ("balance", "Balance"))]
+    opening = [(JK_X["particulars"], PAGE_TOP - ROW_HEIGHT, "Opening Balance"),
+               (JK_X["balance"], PAGE_TOP - ROW_HEIGHT, _amount(OPENING_BALANCE))]
+
+    def pages():
+        entries = _statement_entries(count, seed, JK_X, "%d-%b-%Y", "")
+        for i, (page, _) in enumerate(_paginate(entries)):
+            yield header + (opening if i == 0 else []) + page
+
+    return write_pdf(path, pages())
+
+
+def make_rpt_pdf(path, count, seed=7):
+    """
+    An RPT report printed to PDF (profiles/rpt_pdf.json): bank and column
+    headings on every page (dropped as garbage lines), and each page after
+    the first opening with a B/F carry-forward line. Returns the page count.
+    """
+    header = [(RPT_PDF_X["date"], PAGE_TOP - (4 - i) * ROW_HEIGHT, text) for i, text in enumerate(
+        ("JAMMU AND KASHMIR BANK", "STATEMENT OF ACCOUNT", "DATE PARTICULARS WITHDRAWALS DEPOSITS BALANCE"))]
+
+    def pages():
+        entries = _statement_entries(count, seed, RPT_PDF_X, "%d-%m-%Y", "Cr")
+        for page, brought_forward in _paginate(entries):
+            carry = [(RPT_PDF_X["date"], PAGE_TOP - ROW_HEIGHT, "B/F"),
+                     (RPT_PDF_X["balance"], PAGE_TOP - ROW_HEIGHT, _amount(brought_forward) + "Cr")]
+            yield header + carry + page
+
+    return write_pdf(path, pages())
+
+
+def _pdf_text(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_pdf(path, pages, width=PAGE_WIDTH, height=PAGE_HEIGHT, font_size=FONT_SIZE):
+    """
+    Writes pages (each a list of (x, top, text) words, top measured down from
+    the top edge like pdfplumber's) as a PDF in Helvetica, streaming page by
+    page. Returns the page count.
+    """
+    offsets = {}
+    page_ids = []
+
+    with open(path, "wb") as f:
+        def add(obj_id, body):
+            offsets[obj_id] = f.tell()
+            f.write(f"{obj_id} 0 obj\n".encode() + body + b"\nendobj\n")
+
+        f.write(b"%PDF-1.4\n")
+        add(3, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>")
+
+        next_id = 4
+        for words in pages:
+            content = "".join(
+                f"BT /F1 {font_size} Tf {x:.2f} {height - top - font_size:.2f} Td ({_pdf_text(text)}) Tj ET\n"
+                for x, top, text in words
+            ).encode("latin-1")
+            add(next_id, f"<< /Length {len(content)} >>\nstream\n".encode() + content + b"endstream")
+            add(next_id + 1, (f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {width} {height}] "
+                              f"/Resources << /Font << /F1 3 0 R >> >> /Contents {next_id} 0 R >>").encode())
+            page_ids.append(next_id + 1)
+            next_id += 2
+
+        kids = " ".join(f"{page_id} 0 R" for page_id in page_ids)
+        add(2, f"<< /Type /Pages /Kids [{kids}] /Count {len(page_ids)} >>".encode())
+        add(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+
+        xref = f.tell()
+        f.write(f"xref\n0 {next_id}\n0000000000 65535 f \n".encode())
+        for obj_id in range(1, next_id):
+            f.write(f"{offsets[obj_id]:010d} 00000 n \n".encode())
+        f.write(f"trailer\n<< /Size {next_id} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode())
+    return len(page_ids)
@@ -0,0 +1,50 @@
+import hashlib
+import os
+from starlette.concurrency import run_in_threadpool
+
+# Upload limits (override via environment)
+UPLOAD_CHUNK_SIZE = int(os.environ.get("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+MAX_UPLOAD_BYTES = int(os.environ.get("MAX_UPLOAD_MB", "100")) * 1024 * 1024
+
+
+class UploadTooLargeError(Exception):
+    pass
+
+
+def _write_chunk(buffer, digest, chunk):
+    digest.update(chunk)
+    buffer.write(chunk)
+
+
+async def save_upload(upload, dest_path, max_bytes=None, chunk_size=None):
+    """
+    Streams an UploadFile to dest_path in fixed-size chunks without blocking the
+    event loop, hashing as it goes. Returns (size_bytes, sha256_hex).
+    Raises UploadTooLargeError (and removes the partial file) once more than
+    max_bytes have been read.
+    """
+    max_bytes = MAX_UPLOAD_BYTES if max_bytes is None else max_bytes
+    chunk_size = chunk_size or UPLOAD_CHUNK_SIZE
+
+    # Starlette knows the spooled size up front; refuse before copying anything
+    if upload.size is not None and upload.size > max_bytes:
+        raise UploadTooLargeError(f"File exceeds the {max_bytes // (1024 * 1024)} MB upload limit")
+
+    digest = hashlib.sha256()
+    size = 0
+    buffer = await run_in_threadpool(open, dest_path, "wb")
+    try:
+        while True:
+            chunk = await upload.read(chunk_size)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_bytes:
+                raise UploadTooLargeError(f"File exceeds the {max_bytes // (1024 * 1024)} MB upload limit")
+            await run_in_threadpool(_write_chunk, buffer, digest, chunk)
+    except BaseException:
+        await run_in_threadpool(buffer.close)
+        os.remove(dest_path)
+        raise
+    await run_in_threadpool(buffer.close)
+    return size, digest.hexdigest()
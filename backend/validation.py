@@ -0,0 +1,197 @@
+"""
+Running-balance validation. Every converted statement should satisfy
+Balance[i] = Balance[i-1] - Withdrawals[i] + Deposits[i]; a row that doesn't
+usually means an amount was bucketed into the wrong column.
+
+The check runs on the rows as they stream to the writer, CHUNK_SIZE at a
+time with NumPy. Parsers that already build a DataFrame per chunk hand it to
+check_frame(), so there is no per-row Python work. The output's columns are
+left as they are: mismatched rows, if any, are listed on a "Balance Check"
+sheet in xlsx outputs, and in a report file next to the output ({job_id}.balance_check.csv
+and so on) for the other formats. The job record summarises them either way.
+"""
+import os
+from itertools import chain
+from operator import itemgetter
+import numpy as np
+from writers import iter_chunks, writer_for_path
+
+VALIDATE_BALANCES = os.environ.get("VALIDATE_BALANCES", "1") != "0"
+BALANCE_TOLERANCE = float(os.environ.get("BALANCE_TOLERANCE", "0.01"))
+
+CHECK_SHEET = "Balance Check"
+# Added to the output's name for the report file of formats without sheets
+REPORT_SUFFIX = ".balance_check"
+
+# Mismatches listed in the job record's summary, and on the xlsx sheet
+MAX_REPORTED_MISMATCHES = 20
+MAX_SHEET_MISMATCHES = 100000
+
+
+def _number(value):
+    # Blanks (continuation rows) have no amount
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _amount_columns(chunk, getter):
+    """(n, 3) float array of a chunk's withdrawals, deposits and balance."""
+    values = list(map(getter, chunk))
+    try:
+        # Converters emit floats, which NumPy reads in one C pass
+        return np.fromiter(chain.from_iterable(values), dtype=float, count=3 * len(values)).reshape(-1, 3)
+    except (TypeError, ValueError):
+        return np.array([[_number(v) for v in row] for row in values], dtype=float)
+
+
+class BalanceValidator:
+    """
+    Checks rows in the layout's column order against the running balance.
+
+    Rows without a balance (continuation lines) are not checked; their
+    amounts are carried into the next row that has one, so the check is
+    balance = last balance + sum of changes since, a cumulative sum per chunk.
+    The sign convention (deposits raise the balance, or lower it for
+    overdraft accounts printed as positive Dr balances) is picked once, from
+    whichever fits more rows of the first chunk.
+    """
+
+    def __init__(self, columns, roles, tolerance=None):
+        self.amount_columns = [roles["withdrawals"], roles["deposits"], roles["balance"]]
+        self.amounts = itemgetter(*(columns.index(name) for name in self.amount_columns))
+        self.tolerance = BALANCE_TOLERANCE if tolerance is None else tolerance
+        self.sign = None
+        self.last_balance = np.nan
+        self.pending = 0.0
+        self.rows = 0
+        self.checked = 0
+        self.mismatched = 0
+        # (row number, expected balance, balance, row values) per mismatch
+        self.mismatches = []
+
+    @classmethod
+    def for_profile(cls, profile):
+        """A validator for the profile's output, or None if validation is off or can't apply."""
+        roles = profile.roles if profile else {}
+        if not VALIDATE_BALANCES or not all(r in roles for r in ("withdrawals", "deposits", "balance")):
+            return None
+        return cls(profile.columns, roles)
+
+    def check(self, rows):
+        """Passes rows through unchanged, checking them a chunk at a time."""
+        for chunk in iter_chunks(rows):
+            amounts = _amount_columns(chunk, self.amounts)
+            first = self.rows + 1
+            for row, expected in self._check(amounts):
+                self.mismatches.append((row, expected, amounts[row - first, 2], list(chunk[row - first])))
+            yield from chunk
+
+    def check_frame(self, df):
+        """Checks the next chunk of rows, as a DataFrame in the layout's column order."""
+        amounts = df[self.amount_columns].to_numpy(dtype=float, na_value=np.nan)
+        first = self.rows + 1
+        bad = self._check(amounts)
+        if bad:
+            values = df.iloc[[row - first for row, _ in bad]].itertuples(index=False, name=None)
+            for (row, expected), row_values in zip(bad, values):
+                self.mismatches.append((row, expected, amounts[row - first, 2], list(row_values)))
+
+    def _expected(self, balance, change, sign):
+        # Expected balance of each row from the last known balance before it
+        cumulative = np.cumsum(change) * sign
+        n = len(balance)
+        known = ~np.isnan(balance)
+        last_known = np.maximum.accumulate(np.where(known, np.arange(n), -1))
+        previous = np.concatenate(([-1], last_known[:-1]))
+        from_chunk = previous >= 0
+        safe = np.where(from_chunk, previous, 0)
+        base = np.where(from_chunk, balance[safe] - cumulative[safe], self.last_balance + sign * self.pending)
+        return base + cumulative, known, last_known
+
+    def _check(self, amounts):
+        """
+        amounts: (n, 3) withdrawals, deposits, balance of the next n rows.
+        Returns [(row number, expected balance)] for the rows that don't
+        balance, as many as the sheet still has room for.
+        """
+        balance = amounts[:, 2]
+        change = np.nan_to_num(amounts[:, 1]) - np.nan_to_num(amounts[:, 0])
+
+        if self.sign is None:
+            fits = {}
+            for sign in (1.0, -1.0):
+                expected, _, _ = self._expected(balance, change, sign)
+                fits[sign] = np.count_nonzero(np.abs(expected - balance) <= self.tolerance)
+            self.sign = 1.0 if fits[1.0] >= fits[-1.0] else -1.0
+
+        expected, known, last_known = self._expected(balance, change, self.sign)
+        checkable = known & ~np.isnan(expected)
+        bad = np.flatnonzero(checkable & ~(np.abs(expected - balance) <= self.tolerance))
+
+        self.checked += int(np.count_nonzero(checkable))
+        self.mismatched += len(bad)
+
+        # Carry the last balance, and any amounts on rows after it, into the next chunk
+        if last_known[-1] >= 0:
+            self.last_balance = balance[last_known[-1]]
+            self.pending = float(change[last_known[-1] + 1:].sum())
+        else:
+            self.pending += float(change.sum())
+        first = self.rows + 1
+        self.rows += len(balance)
+
+        room = max(0, MAX_SHEET_MISMATCHES - len(self.mismatches))
+        return [(first + int(i), round(float(expected[i]), 2)) for i in bad[:room]]
+
+    def summary(self):
+        return {
+            "valid": self.mismatched == 0,
+            "checked_rows": self.checked,
+            "mismatched_rows": self.mismatched,
+            "convention": "deposits_decrease" if self.sign == -1.0 else "deposits_increase",
+            "mismatches": [
+                {"row": row, "expected": expected, "balance": float(balance)}
+                for row, expected, balance, _ in self.mismatches[:MAX_REPORTED_MISMATCHES]
+            ],
+        }
+
+    def report_rows(self):
+        """Rows of the Balance Check sheet: row number, the row's values, expected balance."""
+        for row, expected, _, values in self.mismatches:
+            yield [row] + values + [expected]
+
+
+def report_path(path):
+    """Where write_checked() puts the mismatch report of a non-xlsx output at path."""
+    root, ext = os.path.splitext(path)
+    return root + REPORT_SUFFIX + ext
+
+
+def write_checked(rows, path, columns=None, header=True, progress=None, validator=None):
+    """
+    write_output() for rows that stream through validator (if any). If any
+    row is off, an xlsx output gets the Balance Check sheet after the data
+    sheet, and other formats a report file (report_path()) in the same format.
+    Returns the number of data rows.
+    """
+    writer = writer_for_path(path)
+    if validator is None:
+        return writer.write(rows, path, columns=columns, header=header, progress=progress)
+
+    report_columns = ["Row"] + list(columns or []) + ["Expected Balance"]
+    if writer.name != "xlsx":
+        row_count = writer.write(rows, path, columns=columns, header=header, progress=progress)
+        if validator.mismatches:
+            writer.write(validator.report_rows(), report_path(path), columns=report_columns)
+        return row_count
+
+    def sheets():
+        yield ("Sheet1", rows, columns, header)
+        # Sheets are taken one at a time, so this runs once every data row
+        # (and with it every mismatch) has gone through
+        if validator.mismatches:
+            yield (CHECK_SHEET, validator.report_rows(), report_columns, True)
+
+    return writer.write_sheets(sheets(), path, progress)[0]
@@ -0,0 +1,171 @@
+"""
+Golden check for the shared layout engine (layout.py).
+
+Runs every page of the sample statement through each converter's layout
+function and through the dict-based line grouping / column bucketing the
+converters used before, and checks both produce identical lines. Generic
+column detection is checked against the sorted-midpoint gap search too.
+
+    python verify_layout.py [pdf ...]
+"""
+import os
+import sys
+import pdfplumber
+from layout import Words
+from processor import layout_page as generic_layout_page, iter_generic_rows, detect_pdf_columns, DETECT_PAGES
+from jk_processor import page_rows as jk_page_rows, PROFILE as JK_PROFILE, COL_BOUNDS as JK_BOUNDS
+from rpt_pdf_processor import page_lines as rpt_pdf_page_lines, PROFILE as RPT_PDF_PROFILE
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLE_PDFS = [os.path.join(ROOT, "jk bank", "AccountStmt_1761195605574.pdf")]
+
+
+# --- Reference implementations (one dict per word) ---
+
+def legacy_group_first(words, tolerance):
+    words = sorted(words, key=lambda w: w['top'])
+    lines = []
+    current_line = []
+    last_top = 0
+    for word in words:
+        if not current_line:
+            current_line.append(word)
+            last_top = word['top']
+        elif abs(word['top'] - last_top) < tolerance:
+            current_line.append(word)
+        else:
+            lines.append(current_line)
+            current_line = [word]
+            last_top = word['top']
+    if current_line:
+        lines.append(current_line)
+    return lines
+
+
+def legacy_group_previous(words):
+    words = sorted(words, key=lambda w: (round(w['top']), w['x0']))
+    lines = []
+    if not words:
+        return lines
+    current_line = [words[0]]
+    for w in words[1:]:
+        if abs(w['top'] - current_line[-1]['top']) < 5:
+            current_line.append(w)
+        else:
+            lines.append(current_line)
+            current_line = [w]
+    lines.append(current_line)
+    return lines
+
+
+def legacy_detect_columns(pages):
+    x_coords = []
+    for words in pages:
+        for w in words:
+            x_coords.append((w['x0'] + w['x1']) / 2)
+    if not x_coords:
+        return [100, 200, 300, 400]
+    x_coords.sort()
+    gaps = []
+    for i in range(len(x_coords) - 1):
+        gap_size = x_coords[i+1] - x_coords[i]
+        if gap_size > 15:
+            gaps.append((gap_size, (x_coords[i] + x_coords[i+1]) / 2))
+    gaps.sort(reverse=True)
+    return sorted([g[1] for g in gaps[:6]])
+
+
+def legacy_generic(words, col_bounds):
+    rows = []
+    for line_words in legacy_group_first(words, 5):
+        row = [""] * (len(col_bounds) + 1)
+        for word in line_words:
+            x = (word['x0'] + word['x1']) / 2
+            bucket = 0
+            for bound in col_bounds:
+                if x > bound:
+                    bucket += 1
+                else:
+                    break
+            row[bucket] += word['text'] + " "
+        row = [c.strip() for c in row]
+        if any(row):
+            rows.append(row)
+    return rows
+
+
+def legacy_jk(words):
+    rows = []
+    for line_words in legacy_group_first(words, 10):
+        cols = ["", "", "", "", ""]
+        for word in line_words:
+            x = word['x0']
+            if x < JK_BOUNDS[0]:
+                cols[0] += word['text'] + " "
+            elif x < JK_BOUNDS[1]:
+                cols[1] += word['text'] + " "
+            elif x < JK_BOUNDS[2]:
+                cols[2] += word['text'] + " "
+            elif x < JK_BOUNDS[3]:
+                cols[3] += word['text'] + " "
+            else:
+                cols[4] += word['text'] + " "
+        rows.append([c.strip() for c in cols])
+    return rows
+
+
+def legacy_rpt_pdf(words):
+    lines = []
+    for line in legacy_group_previous(words):
+        columns = []
+        for w in line:
+            x = w['x0']
+            if 120 <= x < 330:
+                columns.append(1)
+            elif 330 <= x < 410:
+                columns.append(2)
+            elif 410 <= x < 480:
+                columns.append(3)
+            elif x >= 480:
+                columns.append(4)
+            else:
+                columns.append(0)
+        lines.append(([w['text'] for w in line], [w['x0'] for w in line], columns))
+    return lines
+
+
+def check_pdf(pdf_path):
+    failures = 0
+    with pdfplumber.open(pdf_path) as pdf:
+        head = [page.extract_words() for page in pdf.pages[:DETECT_PAGES]]
+        detected = detect_pdf_columns([Words.from_dicts(words) for words in head])
+        col_bounds = detected["bounds"]
+        if col_bounds != legacy_detect_columns(head):
+            failures += 1
+            print(f"FAILURE: column bounds differ: {col_bounds} vs {legacy_detect_columns(head)}")
+        print(f"{detected['column_count']} columns detected, confidence {detected['confidence']}")
+
+        for page_index, page in enumerate(pdf.pages):
+            words = page.extract_words()
+            array_words = Words.from_dicts(words)
+            generic_rows = list(iter_generic_rows([(page_index, generic_layout_page(array_words))], col_bounds))
+            checks = [
+                ("generic", generic_rows, legacy_generic(words, col_bounds)),
+                ("jk_bank", jk_page_rows(JK_PROFILE, array_words), legacy_jk(words)),
+                ("rpt_pdf", rpt_pdf_page_lines(RPT_PDF_PROFILE, array_words), legacy_rpt_pdf(words)),
+            ]
+            for name, got, expected in checks:
+                if got != expected:
+                    failures += 1
+                    print(f"FAILURE: {name} page {page_index + 1} differs ({len(got)} vs {len(expected)} lines)")
+        print(f"{os.path.basename(pdf_path)}: {len(pdf.pages)} pages checked")
+    return failures
+
+
+if __name__ == "__main__":
+    paths = sys.argv[1:] or SAMPLE_PDFS
+    failures = sum(check_pdf(p) for p in paths)
+    if failures:
+        print(f"FAILURE: {failures} page layouts differ from the reference")
+        sys.exit(1)
+    print("SUCCESS: layout engine matches the reference grouping and bucketing")
@@ -0,0 +1,57 @@
+"""
+Checks statement merging (merge.py) on the sample RPT report.
+
+The parsed report is cut into overlapping "statements" (uploaded out of
+order); merging them must give back the original transactions exactly,
+with every seam continuous. A cut that leaves a gap must be flagged as a
+broken seam.
+
+    python verify_merge.py [report.rpt]
+"""
+import os
+import sys
+from merge import merge_statements, statement_frame
+from rpt_parser import parse_rpt_file, PROFILE
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLE_RPT = os.path.join(ROOT, "rpt converter", "TMPDAAmL1n_dT12.RPT")
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else SAMPLE_RPT
+    df = parse_rpt_file(path)
+    n = len(df)
+    failures = 0
+
+    first, second, third = df.iloc[: n // 2], df.iloc[n // 3: 3 * n // 4], df.iloc[2 * n // 3:]
+    statements = [(name, statement_frame(part.reset_index(drop=True), PROFILE.roles))
+                  for name, part in (("may-jun.rpt", third), ("jan-mar.rpt", first), ("mar-may.rpt", second))]
+    merged, report = merge_statements(statements)
+    print(f"{n} transactions, {report['input_rows']} in overlapping statements, "
+          f"{report['duplicates_dropped']} duplicates dropped, {report['merged_rows']} merged")
+
+    expected = statement_frame(df, PROFILE.roles)
+    if report["merged_rows"] != n or list(merged["Balance"]) != list(expected["balance"]):
+        failures += 1
+        print("FAILURE: merged ledger differs from the original report")
+    if report["statements"] != ["jan-mar.rpt", "mar-may.rpt", "may-jun.rpt"]:
+        failures += 1
+        print(f"FAILURE: statements merged out of date order: {report['statements']}")
+    if not report["continuous"]:
+        failures += 1
+        print(f"FAILURE: overlapping statements reported as discontinuous: {report['seams']}")
+
+    gap = [(name, statement_frame(part.reset_index(drop=True), PROFILE.roles))
+           for name, part in (("jan.rpt", df.iloc[: n // 3]), ("mar.rpt", df.iloc[n // 2:]))]
+    _, gap_report = merge_statements(gap)
+    if gap_report["continuous"]:
+        failures += 1
+        print("FAILURE: missing transactions between statements not detected")
+
+    if failures:
+        sys.exit(1)
+    print("SUCCESS: overlapping statements merge back into the original ledger")
+
+
+if __name__ == "__main__":
+    main()
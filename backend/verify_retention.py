@@ -0,0 +1,134 @@
+"""
+Checks upload/output retention (retention.py). First the sweep on its own:
+- it deletes owners past the TTL
+- it evicts the least recently used owners to fit the quota
+- it spares running jobs, fresh files and files touched by a download
+- it marks completed jobs expired
+Then the API end to end: converted uploads are deleted, and an expired job's
+download answers 410.
+
+    python verify_retention.py
+"""
+import os
+import sys
+import tempfile
+import time
+import uuid
+
+os.environ.setdefault("JOB_STORE", "memory")
+os.environ.setdefault("RESULT_CACHE", "0")
+os.environ.setdefault("RETENTION_INTERVAL_SECONDS", "0")
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BACKEND_DIR)
+os.chdir(tempfile.mkdtemp(prefix="verify_retention_"))
+
+import retention
+from job_store import InMemoryJobStore
+
+HOUR = 3600
+
+
+def make_file(directory, name, size, age):
+    path = os.path.join(directory, name)
+    with open(path, "wb") as f:
+        f.write(b"x" * size)
+    mtime = time.time() - age
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+def check_sweep():
+    failures = []
+    uploads, outputs = tempfile.mkdtemp(), tempfile.mkdtemp()
+    jobs = InMemoryJobStore()
+
+    def job(status, age, size=1000, upload=False):
+        job_id = str(uuid.uuid4())
+        output = make_file(outputs, f"{job_id}.xlsx", size, age)
+        if upload:
+            make_file(uploads, f"{job_id}_statement.pdf", size, age)
+        jobs[job_id] = {"status": status, "output_file": output}
+        return job_id, output
+
+    old, old_output = job("completed", 13 * HOUR, upload=True)
+    running, running_output = job("processing", 13 * HOUR, upload=True)
+    fresh, fresh_output = job("completed", 60)
+    lru_oldest, lru_oldest_output = job("completed", 3 * HOUR, size=4000)
+    lru_newer, lru_newer_output = job("completed", 2 * HOUR, size=4000)
+    downloaded, downloaded_output = job("completed", 4 * HOUR, size=4000)
+    # A derived format of the same job goes with it
+    make_file(outputs, f"{old}.csv", 500, 13 * HOUR)
+    retention.touch(downloaded_output)
+    # Files that aren't a job's are their own owner
+    orphan = make_file(outputs, "stray.tmp", 100, 13 * HOUR)
+
+    # 8000 bytes of the 4000-byte owners must go to fit 10000 (running 2000, fresh 1000 stay)
+    summary = retention.sweep([uploads, outputs], jobs, ttl=12 * HOUR, max_bytes=10000, min_age=900)
+    print(f"Sweep: {summary}")
+
+    gone = lambda *paths: not any(os.path.exists(p) for p in paths)
+    if not gone(old_output, os.path.join(outputs, f"{old}.csv"), os.path.join(uploads, f"{old}_statement.pdf"), orphan):
+        failures.append("files past the TTL were kept")
+    if jobs.get(old)["status"] != "expired":
+        failures.append("a job whose output was deleted was not marked expired")
+    if gone(running_output) or jobs.get(running)["status"] != "processing":
+        failures.append("a running job's files were deleted")
+    if gone(fresh_output):
+        failures.append("a fresh output was deleted")
+    if not gone(lru_oldest_output, lru_newer_output) or jobs.get(lru_newer)["status"] != "expired":
+        failures.append("least recently used outputs were not evicted to fit the quota")
+    if gone(downloaded_output):
+        failures.append("a just-downloaded output was evicted before older ones")
+    if summary["kept_bytes"] > 10000:
+        failures.append(f"{summary['kept_bytes']} bytes kept, over the 10000 quota")
+    return failures
+
+
+def check_api():
+    import synthetic
+    from fastapi.testclient import TestClient
+    import main
+
+    failures = []
+    synthetic.make_rpt("statement.rpt", 50)
+    with TestClient(main.app) as client:
+        with open("statement.rpt", "rb") as f:
+            job_id = client.post("/upload", files={"file": ("statement.rpt", f)}).json()["job_id"]
+        for _ in range(300):
+            status = client.get(f"/status/{job_id}").json()
+            if status["status"] != "processing":
+                break
+            time.sleep(0.1)
+        if status["status"] != "completed":
+            return [f"conversion did not complete: {status.get('message')}"]
+        time.sleep(0.2)
+        if os.listdir(main.UPLOAD_DIR):
+            failures.append(f"upload kept after a successful conversion: {os.listdir(main.UPLOAD_DIR)}")
+        if client.get(f"/download/{job_id}").status_code != 200:
+            failures.append("download of a fresh output failed")
+
+        retention.sweep([main.UPLOAD_DIR, main.OUTPUT_DIR], main.jobs, ttl=0, min_age=0)
+        response = client.get(f"/download/{job_id}")
+        print(f"Download after expiry: {response.status_code} {response.json()['detail']}")
+        if response.status_code != 410:
+            failures.append(f"download of an expired job answered {response.status_code}, not 410")
+        events = client.get(f"/events/{job_id}").text
+        if "event: failed" not in events:
+            failures.append("event stream of an expired job did not end")
+        if client.get(f"/download/{uuid.uuid4()}").status_code != 404:
+            failures.append("download of an unknown job did not answer 404")
+    return failures
+
+
+def main():
+    failures = check_sweep() + check_api()
+    if failures:
+        for failure in failures:
+            print(f"FAILURE: {failure}")
+        sys.exit(1)
+    print("SUCCESS: retention deletes expired and over-quota files, and expired downloads answer 410")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Startup budget for the API process. It has to import fast, and without the
+conversion stack (pandas, numpy, openpyxl, pdfplumber, OCR), so a cold start
+serves requests straight away. The conversion stack loads in the pool workers
+instead, and has to be there before the first job arrives.
+
+Each run starts a fresh interpreter and measures four things:
+- how long importing main takes on top of fastapi, which any API start pays
+- how long until the app (lifespan included) has answered its first request
+- whether the API process is still free of the conversion stack after a
+  statement has been uploaded, converted and downloaded
+- whether a pool worker already has the converters loaded when it gets its first job
+
+The fastest of the runs is compared against the budgets.
+
+    python verify_startup.py [runs]
+"""
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+# Milliseconds; override via environment on slow machines
+APP_IMPORT_BUDGET_MS = float(os.environ.get("APP_IMPORT_BUDGET_MS", "400"))
+FIRST_RESPONSE_BUDGET_MS = float(os.environ.get("FIRST_RESPONSE_BUDGET_MS", "1000"))
+
+# Must not be imported by the API process
+HEAVY_MODULES = ("pandas", "numpy", "openpyxl", "pdfplumber", "pypdfium2", "pytesseract", "PIL", "pyarrow",
+                 "processor", "profiles")
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def _loaded_modules():
+    return [name for name in HEAVY_MODULES if name in sys.modules]
+
+
+async def _first_job():
+    from worker_pool import ConversionPool
+    pool = ConversionPool(max_workers=1)
+    pool.start()
+    # Give the worker the time a real first upload takes to arrive
+    await asyncio.sleep(float(os.environ.get("WORKER_WARM_UP_SECONDS", "5")))
+    start = time.perf_counter()
+    loaded = await pool.submit(_loaded_modules)
+    seconds = time.perf_counter() - start
+    await pool.shutdown()
+    return loaded, seconds
+
+
+def measure():
+    """Child process: prints the measurements of one cold start as JSON."""
+    start = time.perf_counter()
+    import fastapi  # noqa: F401
+    framework = time.perf_counter()
+    import main
+    imported = time.perf_counter()
+    heavy = _loaded_modules()
+
+    import synthetic
+    from fastapi.testclient import TestClient
+    with TestClient(main.app) as client:
+        status = client.get("/metrics").status_code
+        responded = time.perf_counter()
+
+        # A whole job: upload (cache key, lookup), conversion in a worker, download
+        synthetic.make_rpt("statement.rpt", 20)
+        with open("statement.rpt", "rb") as f:
+            job_id = client.post("/upload", files={"file": ("statement.rpt", f)}).json()["job_id"]
+        for _ in range(600):
+            job = client.get(f"/status/{job_id}").json()
+            if job["status"] != "processing":
+                break
+            time.sleep(0.1)
+        downloaded = client.get(f"/download/{job_id}").status_code
+        heavy_after_job = _loaded_modules()
+
+    worker_modules, first_job = asyncio.run(_first_job())
+    print(json.dumps({
+        "framework_ms": round((framework - start) * 1000, 1),
+        "app_import_ms": round((imported - framework) * 1000, 1),
+        "first_response_ms": round((responded - imported) * 1000, 1),
+        "status": status,
+        "api_heavy_modules": heavy,
+        "job_status": job["status"],
+        "download_status": downloaded,
+        "api_heavy_modules_after_job": heavy_after_job,
+        "worker_modules": worker_modules,
+        "first_job_ms": round(first_job * 1000, 1),
+    }))
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        env = dict(os.environ, PYTHONPATH=BACKEND_DIR, JOB_DB_PATH=os.path.join(workdir, "jobs.db"),
+                   RESULT_CACHE_DIR=os.path.join(workdir, "cache"))
+        for _ in range(runs):
+            proc = subprocess.run([sys.executable, "-W", "ignore", os.path.abspath(__file__), "--measure"],
+                                  cwd=workdir, env=env, capture_output=True, text=True)
+            if proc.returncode != 0:
+                print(f"FAILURE: cold start exited with {proc.returncode}:\n{proc.stderr[-2000:]}")
+                sys.exit(1)
+            results.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+
+    best = min(results, key=lambda r: r["app_import_ms"] + r["first_response_ms"])
+    print(f"fastapi import:   {best['framework_ms']:.0f} ms")
+    print(f"main import:      {best['app_import_ms']:.0f} ms (budget {APP_IMPORT_BUDGET_MS:.0f} ms)")
+    print(f"first response:   {best['first_response_ms']:.0f} ms (budget {FIRST_RESPONSE_BUDGET_MS:.0f} ms)")
+    print(f"first job:        {best['first_job_ms']:.0f} ms, worker had {', '.join(best['worker_modules']) or 'nothing'} loaded")
+
+    failures = []
+    if best["app_import_ms"] > APP_IMPORT_BUDGET_MS:
+        failures.append(f"main import took {best['app_import_ms']:.0f} ms")
+    if best["first_response_ms"] > FIRST_RESPONSE_BUDGET_MS:
+        failures.append(f"first response took {best['first_response_ms']:.0f} ms")
+    if best["status"] != 200:
+        failures.append(f"/metrics answered {best['status']}")
+    heavy = sorted(set(m for r in results for m in r["api_heavy_modules"]))
+    if heavy:
+        failures.append(f"API process imported {', '.join(heavy)}")
+    if best["job_status"] != "completed" or best["download_status"] != 200:
+        failures.append(f"test conversion ended {best['job_status']}, download answered {best['download_status']}")
+    heavy = sorted(set(m for r in results for m in r["api_heavy_modules_after_job"]) - set(heavy))
+    if heavy:
+        failures.append(f"API process imported {', '.join(heavy)} while handling a job")
+    if "processor" not in best["worker_modules"]:
+        failures.append("pool worker had not preloaded the converters")
+
+    if failures:
+        print(f"FAILURE: {'; '.join(failures)}")
+        sys.exit(1)
+    print("SUCCESS: API starts within budget; converters load in the workers")
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["--measure"]:
+        measure()
+    else:
+        main()
@@ -0,0 +1,209 @@
+import asyncio
+import importlib
+import os
+import signal
+import threading
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# Pool configuration (override via environment)
+CONVERSION_WORKERS = int(os.environ.get("CONVERSION_WORKERS", os.cpu_count() or 1))
+CONVERSION_QUEUE_SIZE = int(os.environ.get("CONVERSION_QUEUE_SIZE", "32"))
+CONVERSION_TIMEOUT = float(os.environ.get("CONVERSION_TIMEOUT", "900"))
+SHUTDOWN_GRACE = float(os.environ.get("CONVERSION_SHUTDOWN_GRACE", "30"))
+START_METHOD = os.environ.get("CONVERSION_START_METHOD")  # fork / spawn / forkserver
+# Modules each worker process imports as it starts, so the first job doesn't pay
+# for pandas, pdfplumber & co. The API process itself never imports them.
+PRELOAD_MODULES = [m for m in os.environ.get("CONVERSION_PRELOAD", "processor,merge,openpyxl").split(",") if m]
+
+# Extra time the API process waits past the worker-side alarm before giving up on a job
+TIMEOUT_GRACE = 5.0
+
+
+class QueueFullError(Exception):
+    pass
+
+
+class JobTimeoutError(Exception):
+    pass
+
+
+def _raise_timeout(signum, frame):
+    raise JobTimeoutError("Conversion timed out")
+
+
+def preload(modules):
+    """Worker initializer: imports modules. Never raises, as a failing initializer breaks the whole pool."""
+    start = time.perf_counter()
+    for name in modules:
+        try:
+            importlib.import_module(name)
+        except Exception as e:
+            print(f"Worker {os.getpid()}: preloading {name} failed: {e}")
+    print(f"Worker {os.getpid()}: preloaded {', '.join(modules)} in {time.perf_counter() - start:.2f}s")
+
+
+def _warm_up():
+    pass
+
+
+def _run_job(fn, args, timeout):
+    """Runs inside a worker process. Arms a SIGALRM so a stuck conversion raises
+    instead of holding the worker forever (Unix only)."""
+    use_alarm = (
+        bool(timeout)
+        and hasattr(signal, "setitimer")
+        and threading.current_thread() is threading.main_thread()
+    )
+    if use_alarm:
+        previous = signal.signal(signal.SIGALRM, _raise_timeout)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        return fn(*args)
+    finally:
+        if use_alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, previous)
+
+
+class ConversionPool:
+    """
+    Process pool that runs CPU-bound conversions off the event loop.
+    At most `max_workers` jobs run at once, at most `queue_size` more wait for a
+    slot, and anything beyond that is rejected with QueueFullError.
+
+    use_threads=True runs jobs on threads in this process instead, for job
+    stores that can't be shared across processes (tests, local development).
+    The worker-side timeout alarm is not available in that mode.
+
+    Worker processes start (and import PRELOAD_MODULES) in the background
+    when the pool starts, so the API serves requests straight away and the
+    first conversion finds its worker ready. With the forkserver start
+    method the modules load once in the fork server and workers share them.
+    """
+
+    def __init__(self, max_workers=None, queue_size=None, timeout=None, use_threads=False):
+        self.max_workers = max(1, max_workers or CONVERSION_WORKERS)
+        self.queue_size = CONVERSION_QUEUE_SIZE if queue_size is None else queue_size
+        self.timeout = CONVERSION_TIMEOUT if timeout is None else timeout
+        self.use_threads = use_threads
+        self._executor = None
+        self._slots = None
+        self._tasks = set()
+        self._running = 0
+        self._accepting = False
+
+    def _new_executor(self):
+        if self.use_threads:
+            return ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="conversion")
+        ctx = multiprocessing.get_context(START_METHOD) if START_METHOD else None
+        if START_METHOD == "forkserver" and PRELOAD_MODULES:
+            ctx.set_forkserver_preload(PRELOAD_MODULES)
+        executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=ctx,
+                                       initializer=preload if PRELOAD_MODULES else None, initargs=(PRELOAD_MODULES,))
+        # Workers are only spawned on submit; start them now rather than on the first job
+        for _ in range(self.max_workers):
+            executor.submit(_warm_up)
+        return executor
+
+    def start(self):
+        self._executor = self._new_executor()
+        self._slots = asyncio.Semaphore(self.max_workers)
+        self._accepting = True
+
+    @property
+    def in_flight(self):
+        return len(self._tasks)
+
+    @property
+    def running(self):
+        """Jobs holding a worker slot; the rest of in_flight are queued."""
+        return self._running
+
+    @property
+    def is_full(self):
+        return not self._accepting or len(self._tasks) >= self.max_workers + self.queue_size
+
+    @property
+    def free_slots(self):
+        """How many more jobs submit() would accept right now."""
+        if not self._accepting:
+            return 0
+        return max(0, self.max_workers + self.queue_size - len(self._tasks))
+
+    def submit(self, fn, *args, on_error=None):
+        """
+        Schedule fn(*args) in a worker process and return the asyncio task.
+        on_error(message) is called if the job times out or its worker dies.
+        """
+        if not self._accepting:
+            raise QueueFullError("Server is shutting down")
+        if self.is_full:
+            raise QueueFullError("Conversion queue is full, please retry shortly")
+
+        task = asyncio.ensure_future(self._run(fn, args, on_error))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def _run(self, fn, args, on_error):
+        async with self._slots:
+            loop = asyncio.get_running_loop()
+            self._running += 1
+            executor = self._executor
+            try:
+                future = loop.run_in_executor(executor, _run_job, fn, args, self.timeout)
+                wait_for = self.timeout + TIMEOUT_GRACE if self.timeout else None
+                # shield: a timeout here must not detach us from the job, which is still running
+                return await asyncio.wait_for(asyncio.shield(future), wait_for)
+            except asyncio.TimeoutError:
+                if on_error:
+                    on_error(f"Conversion timed out after {int(self.timeout)}s")
+                # The worker ignored its alarm (stuck in native code, or a thread).
+                # Keep the slot until it's really free, so no more than max_workers
+                # jobs ever run at once.
+                await asyncio.wait({future})
+            except BrokenProcessPool:
+                # A worker died (OOM kill, segfault in a native lib). Replace the pool
+                # so later jobs are not stuck behind the broken one.
+                self._restart(executor)
+                if on_error:
+                    on_error("Conversion worker crashed")
+            except asyncio.CancelledError:
+                if on_error:
+                    on_error("Server shutting down")
+                raise
+            except Exception as e:
+                if on_error:
+                    on_error(str(e))
+            finally:
+                self._running -= 1
+
+    def _restart(self, broken):
+        # Every job of a broken pool gets BrokenProcessPool; only the first
+        # replaces it; the others must not shut down its healthy replacement
+        if broken is not self._executor:
+            return
+        self._executor = self._new_executor()
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    async def shutdown(self, grace=None):
+        """Stop accepting jobs, give in-flight ones `grace` seconds, then cancel the rest."""
+        self._accepting = False
+        grace = SHUTDOWN_GRACE if grace is None else grace
+        pending = set()
+        if self._tasks:
+            done, pending = await asyncio.wait(set(self._tasks), timeout=grace)
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+        if self._executor:
+            if pending:
+                # Workers still busy past the grace period would block shutdown; kill them
+                for process in list(getattr(self._executor, "_processes", {}).values()):
+                    process.terminate()
+            self._executor.shutdown(wait=not pending, cancel_futures=True)
+            self._executor = None
@@ -0,0 +1,357 @@
+import csv
+import json
+import math
+import os
+from itertools import islice
+
+# Rows handed to vectorised cleanup stages (and Parquet row groups) at a time
+CHUNK_SIZE = 10000
+
+
+def iter_chunks(iterable, size=CHUNK_SIZE):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _cell_value(value):
+    # NaN would be written as a #NUM! error; pandas left those cells empty
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+
+def _remove_partial(path):
+    # A failed write (parse error, timeout) leaves no half-written output behind
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _discard_workbook(wb):
+    """Removes the temp files a write-only workbook that won't be saved streamed its rows to."""
+    for ws in wb.worksheets:
+        writer = getattr(ws, "_writer", None)
+        if writer is None:
+            continue
+        if ws._rows is not None:
+            ws._rows.close()
+        writer.close()
+        try:
+            writer.cleanup()
+        except (OSError, ValueError):
+            pass
+
+
+def _column_names(columns, first_row):
+    # Headerless outputs (generic PDF, OCR) still need keys for JSONL/Parquet
+    return list(columns) if columns else [str(i) for i in range(len(first_row))]
+
+
+class OutputWriter:
+    """
+    Writes an iterable of row sequences to one output format, streaming.
+    `columns` names the fields; `header` controls whether formats with a
+    header row (xlsx, csv) write one. Formats with keyed records always use
+    the names. write() returns the number of rows written.
+    """
+
+    name = None
+    extension = None
+    media_type = "application/octet-stream"
+
+    def write(self, rows, path, columns=None, header=True, progress=None):
+        raise NotImplementedError
+
+    def read(self, path):
+        """Yields rows back from a file this writer produced (header row included, if written)."""
+        raise NotImplementedError
+
+
+class XlsxWriter(OutputWriter):
+    name = "xlsx"
+    extension = ".xlsx"
+    media_type = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+    def write(self, rows, path, columns=None, header=True, progress=None, sheet_title="Sheet1"):
+        return self.write_sheets([(sheet_title, rows, columns, header)], path, progress)[0]
+
+    def write_sheets(self, sheets, path, progress=None):
+        """
+        One workbook, a sheet per (title, rows, columns, header), written in
+        order. sheets may be a generator: the next sheet is only asked for
+        once the previous one's rows are written. Returns the row count of each sheet.
+        """
+        # Imported here rather than at the top: the API process imports this module
+        # for the format table and shouldn't pay for openpyxl at startup
+        from openpyxl import Workbook
+        from openpyxl.cell import WriteOnlyCell
+        from openpyxl.styles import Font
+
+        # openpyxl's write-only mode streams rows to disk instead of building the workbook in memory
+        wb = Workbook(write_only=True)
+        row_counts = []
+        try:
+            for sheet_title, rows, columns, header in sheets:
+                ws = wb.create_sheet(sheet_title)
+
+                if columns and header:
+                    header_row = []
+                    for name in columns:
+                        cell = WriteOnlyCell(ws, value=name)
+                        cell.font = Font(bold=True)
+                        header_row.append(cell)
+                    ws.append(header_row)
+
+                row_count = 0
+                for row in rows:
+                    ws.append([_cell_value(v) for v in row])
+                    row_count += 1
+                row_counts.append(row_count)
+
+            if progress:
+                progress("write", sum(row_counts), sum(row_counts), "rows")
+            wb.save(path)
+        except BaseException:
+            # Each sheet's rows sit in a temp file until save(); a pool worker
+            # lives on after a failed job, so they would pile up
+            _discard_workbook(wb)
+            _remove_partial(path)
+            raise
+        return row_counts
+
+    def read(self, path):
+        from openpyxl import load_workbook
+        wb = load_workbook(path, read_only=True)
+        try:
+            for row in wb.worksheets[0].iter_rows(values_only=True):
+                yield row
+        finally:
+            wb.close()
+
+
+class CsvWriter(OutputWriter):
+    name = "csv"
+    extension = ".csv"
+    media_type = "text/csv"
+
+    def write(self, rows, path, columns=None, header=True, progress=None):
+        row_count = 0
+        try:
+            with open(path, "w", newline="", encoding="utf-8") as f:
+                writer = csv.writer(f)
+                if columns and header:
+                    writer.writerow(columns)
+                for row in rows:
+                    writer.writerow(["" if v is None else _cell_value(v) for v in row])
+                    row_count += 1
+        except BaseException:
+            _remove_partial(path)
+            raise
+        if progress:
+            progress("write", row_count, row_count, "rows")
+        return row_count
+
+    def read(self, path):
+        with open(path, newline="", encoding="utf-8") as f:
+            yield from csv.reader(f)
+
+
+class JsonlWriter(OutputWriter):
+    name = "jsonl"
+    extension = ".jsonl"
+    media_type = "application/x-ndjson"
+
+    def write(self, rows, path, columns=None, header=True, progress=None):
+        row_count = 0
+        names = None
+        try:
+            with open(path, "w", encoding="utf-8") as f:
+                for row in rows:
+                    if names is None:
+                        names = _column_names(columns, row)
+                    record = {k: _json_value(v) for k, v in zip(names, row)}
+                    f.write(json.dumps(record, ensure_ascii=False))
+                    f.write("\n")
+                    row_count += 1
+        except BaseException:
+            _remove_partial(path)
+            raise
+        if progress:
+            progress("write", row_count, row_count, "rows")
+        return row_count
+
+    def read(self, path):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield tuple(json.loads(line).values())
+
+
+def _json_value(value):
+    value = _cell_value(value)
+    # numpy scalars from the pandas cleanup stages aren't JSON serialisable
+    return value.item() if hasattr(value, "item") else value
+
+
+class ParquetWriter(OutputWriter):
+    name = "parquet"
+    extension = ".parquet"
+    media_type = "application/vnd.apache.parquet"
+
+    def write(self, rows, path, columns=None, header=True, progress=None):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ValueError("Parquet output requires the pyarrow package")
+        import pandas as pd
+
+        writer = None
+        schema = None
+        row_count = 0
+        try:
+            for chunk in iter_chunks(rows):
+                if schema is None:
+                    names = _column_names(columns, chunk[0])
+                df = pd.DataFrame(chunk, columns=names)
+                if schema is None:
+                    # The first row group fixes the column types for the whole file, so
+                    # they are widened to what later chunks may hold: integers to float
+                    # (an amount column of whole numbers), all-empty columns to string
+                    table = pa.Table.from_pandas(df, preserve_index=False)
+                    schema = pa.schema([_parquet_field(f) for f in table.schema])
+                    table = table.cast(schema)
+                    writer = pq.ParquetWriter(path, schema)
+                else:
+                    try:
+                        table = pa.Table.from_pandas(df, schema=schema, preserve_index=False)
+                    except (pa.ArrowInvalid, pa.ArrowTypeError):
+                        # Numbers in a string column (empty in the first chunk)
+                        for field in schema:
+                            if pa.types.is_string(field.type) or pa.types.is_large_string(field.type):
+                                df[field.name] = df[field.name].map(_text_value)
+                        table = pa.Table.from_pandas(df, schema=schema, preserve_index=False)
+                writer.write_table(table)
+                row_count += len(chunk)
+        except BaseException:
+            if writer is not None:
+                writer.close()
+            _remove_partial(path)
+            raise
+        else:
+            if writer is not None:
+                writer.close()
+
+        if writer is None:
+            # No rows: still produce a valid file carrying the column names
+            names = list(columns or [])
+            pq.write_table(pa.table({n: pa.array([], pa.string()) for n in names}), path)
+        if progress:
+            progress("write", row_count, row_count, "rows")
+        return row_count
+
+    def read(self, path):
+        import pyarrow.parquet as pq
+        parquet_file = pq.ParquetFile(path)
+        for batch in parquet_file.iter_batches(batch_size=CHUNK_SIZE):
+            columns = [col.to_pylist() for col in batch.columns]
+            yield from zip(*columns)
+
+
+def _parquet_field(field):
+    import pyarrow as pa
+    if pa.types.is_integer(field.type):
+        return field.with_type(pa.float64())
+    if pa.types.is_null(field.type):
+        return field.with_type(pa.string())
+    return field
+
+
+def _text_value(value):
+    value = _cell_value(value)
+    return None if value is None else str(value)
+
+
+WRITERS = {w.name: w for w in (XlsxWriter(), CsvWriter(), JsonlWriter(), ParquetWriter())}
+OUTPUT_FORMATS = list(WRITERS)
+
+
+def get_writer(output_format):
+    writer = WRITERS.get((output_format or "xlsx").lower())
+    if writer is None:
+        raise ValueError(f"Unsupported output format '{output_format}'. Use one of: {', '.join(OUTPUT_FORMATS)}")
+    return writer
+
+
+def writer_for_path(path):
+    """Picks the writer from the file extension, defaulting to xlsx."""
+    ext = os.path.splitext(path)[1].lower()
+    for writer in WRITERS.values():
+        if writer.extension == ext:
+            return writer
+    return WRITERS["xlsx"]
+
+
+def write_output(rows, path, columns=None, header=True, progress=None):
+    return writer_for_path(path).write(rows, path, columns=columns, header=header, progress=progress)
+
+
+# Column roles whose values are numbers (see profiles.ROLES)
+NUMERIC_ROLES = ("withdrawals", "deposits", "balance")
+
+
+def _number(text):
+    if text == "":
+        return None
+    try:
+        return float(text)
+    except ValueError:
+        return text
+
+
+def _typed_rows(rows, columns, profile_name):
+    """
+    CSV gives back text only: parses the profile's amount columns back into
+    floats, so re-encoding a CSV output doesn't turn its numbers into text cells.
+    """
+    # Loaded here, in the pool worker doing the re-encoding, like batch.build_merged_output
+    from profiles import PROFILES
+    profile = PROFILES.get(profile_name)
+    names = [profile.roles[role] for role in NUMERIC_ROLES if role in profile.roles] if profile else []
+    index = [columns.index(name) for name in names if name in columns]
+    if not index:
+        return rows
+    return (_typed_row(row, index) for row in rows)
+
+
+def _typed_row(row, index):
+    row = list(row)
+    for i in index:
+        if i < len(row):
+            row[i] = _number(row[i])
+    return row
+
+
+def read_output(path, output_format, header=False, columns=None, profile=None):
+    """
+    Data rows of a finished output file, without its header row. Given the
+    output's columns and its layout profile name, a CSV file's amount columns
+    come back as numbers, like the other formats'.
+    """
+    rows = get_writer(output_format).read(path)
+    if header and output_format in ("xlsx", "csv"):
+        next(rows, None)
+    if output_format == "csv" and columns and profile:
+        rows = _typed_rows(rows, list(columns), profile)
+    return rows
+
+
+def convert_output(src_path, src_format, dest_path, dest_format, columns=None, header=False, profile=None):
+    """Re-encodes a finished output file in another format. Returns the row count."""
+    rows = read_output(src_path, src_format, header, columns, profile)
+    return get_writer(dest_format).write(rows, dest_path, columns=columns, header=header)
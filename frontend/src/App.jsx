@@ -13,9 +13,38 @@ function App() {
   const [message, setMessage] = useState('');
   const [conversionType, setConversionType] = useState(null); // null, 'jk_bank', 'rpt', 'rpt_pdf', 'generic'
 
+  const [useEventStream, setUseEventStream] = useState(typeof window !== 'undefined' && 'EventSource' in window);
+
+  // Push updates over Server-Sent Events; falls back to polling if the stream fails
+  useEffect(() => {
+    if (!jobId || status !== 'processing' || !useEventStream) return;
+
+    const source = new EventSource(`${API_URL}/events/${jobId}`);
+    source.addEventListener('progress', (e) => setProgress(JSON.parse(e.data).progress));
+    source.addEventListener('message', (e) => setMessage(JSON.parse(e.data).message));
+    source.addEventListener('complete', (e) => {
+      const data = JSON.parse(e.data);
+      setProgress(100);
+      setMessage(data.message);
+      setStatus('completed');
+      source.close();
+    });
+    source.addEventListener('failed', (e) => {
+      setMessage(JSON.parse(e.data).message);
+      setStatus('failed');
+      source.close();
+    });
+    source.onerror = () => {
+      source.close();
+      setUseEventStream(false);
+    };
+
+    return () => source.close();
+  }, [jobId, status, useEventStream]);
+
   useEffect(() => {
     let interval;
-    if (jobId && status === 'processing') {
+    if (jobId && status === 'processing' && !useEventStream) {
       interval = setInterval(async () => {
         try {
           const res = await fetch(`${API_URL}/status/${jobId}`);
@@ -33,12 +62,12 @@ function App() {
       }, 1000);
     }
     return () => clearInterval(interval);
-  }, [jobId, status]);
+  }, [jobId, status, useEventStream]);
 
   const handleUpload = async (file) => {
     const formData = new FormData();
     formData.append('file', file);
-    formData.append('conversion_type', conversionType || 'generic');
+    formData.append('conversion_type', conversionType || 'auto');
 
     try {
       setStatus('processing');